@@ -1,21 +1,41 @@
 import csv, io
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, TextIO, Tuple
 
 REQUIRED = ["timestamp","QT_ms","RR_ms"]
 
+def _reading(row: Dict[str, str]) -> Dict[str, Any]:
+    return {
+        "timestamp": row["timestamp"],
+        "QT_ms": float(row["QT_ms"]),
+        "RR_ms": float(row["RR_ms"]),
+        "HR_bpm": float(row.get("HR_bpm")) if row.get("HR_bpm") else None,
+        "PR_ms": float(row.get("PR_ms")) if row.get("PR_ms") else None,
+        "QRS_ms": float(row.get("QRS_ms")) if row.get("QRS_ms") else None
+    }
+
+def iter_csv(stream: TextIO) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Parse CSV rows one at a time from a text stream.
+
+    Yields (reading, None) for good rows and (None, message) for bad ones,
+    so memory stays flat however long the file is.
+    """
+    reader = csv.DictReader(stream)
+    i = 0
+    try:
+        for i, row in enumerate(reader, start=1):
+            try:
+                yield _reading(row), None
+            except Exception as e:
+                yield None, f"row {i}: {e}"
+    except (csv.Error, UnicodeDecodeError) as e:
+        yield None, f"row {i + 1}: {e}"
+
 def load_csv(content: str) -> Dict[str, Any]:
-    reader = csv.DictReader(io.StringIO(content))
     readings, errors = [], []
-    for i, row in enumerate(reader, start=1):
-        try:
-            readings.append({
-                "timestamp": row["timestamp"],
-                "QT_ms": float(row["QT_ms"]),
-                "RR_ms": float(row["RR_ms"]),
-                "HR_bpm": float(row.get("HR_bpm")) if row.get("HR_bpm") else None,
-                "PR_ms": float(row.get("PR_ms")) if row.get("PR_ms") else None,
-                "QRS_ms": float(row.get("QRS_ms")) if row.get("QRS_ms") else None
-            })
-        except Exception as e:
-            errors.append(f"row {i}: {e}")
+    for reading, error in iter_csv(io.StringIO(content)):
+        if error is None:
+            readings.append(reading)
+        else:
+            errors.append(error)
     return {"readings": readings, "errors": errors}
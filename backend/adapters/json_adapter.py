@@ -1,26 +1,103 @@
+import io
 import json
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, Optional, TextIO, Tuple
 
-def load_json(content: str) -> Dict[str, Any]:
+CHUNK_CHARS = 64 * 1024
+# Largest single array item we'll buffer while waiting for it to complete
+MAX_ITEM_CHARS = 1024 * 1024
+
+_WS = " \t\r\n"
+NOT_AN_ARRAY = "payload must be a JSON array of readings"
+
+
+def iter_json_array(stream: TextIO, chunk_chars: int = CHUNK_CHARS) -> Iterator[Any]:
+    """
+    Decode the items of a top-level JSON array one at a time.
+
+    Only the item being decoded is buffered, not the whole document.
+    Raises ValueError if the payload isn't an array or is malformed.
+    """
+    decoder = json.JSONDecoder()
+    buf, pos, eof = "", 0, False
+    state = "start"  # start -> open -> item -> sep -> item ... -> ]
+
+    while True:
+        while pos < len(buf) and buf[pos] in _WS:
+            pos += 1
+        if pos == len(buf) and not eof:
+            chunk = stream.read(chunk_chars)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        if pos == len(buf):
+            raise ValueError(NOT_AN_ARRAY if state == "start" else "unexpected end of JSON array")
+
+        c = buf[pos]
+        if state == "start":
+            if c != "[":
+                raise ValueError(NOT_AN_ARRAY)
+            pos += 1
+            state = "open"
+            continue
+        if state in ("open", "sep") and c == "]":
+            return
+        if state == "sep":
+            if c != ",":
+                raise ValueError(f"expected ',' or ']' but found {c!r}")
+            pos += 1
+            state = "item"
+            continue
+
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError as e:
+            if eof or len(buf) - pos > MAX_ITEM_CHARS:
+                raise ValueError(f"invalid JSON: {e.msg}") from None
+            end = None
+        # An item running to the end of the buffer may continue in the next chunk
+        if end is None or (end == len(buf) and not eof):
+            chunk = stream.read(chunk_chars)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = end
+        state = "sep"
+        yield obj
+
+
+def _reading(r: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "timestamp": r["timestamp"],
+        "QT_ms": float(r["QT_ms"]),
+        "RR_ms": float(r["RR_ms"]),
+        "HR_bpm": float(r.get("HR_bpm")) if r.get("HR_bpm") else None,
+        "PR_ms": float(r.get("PR_ms")) if r.get("PR_ms") else None,
+        "QRS_ms": float(r.get("QRS_ms")) if r.get("QRS_ms") else None
+    }
+
+
+def iter_json(stream: TextIO) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[str]]]:
+    """
+    Streaming counterpart of load_json: yields (reading, None) or
+    (None, message) per array item. A malformed document ends the stream
+    with one final error.
+    """
+    i = 0
     try:
-        data = json.loads(content)
-        if not isinstance(data, list):
-            return {"readings": [], "errors": ["payload must be a JSON array of readings"]}
-        # minimal shape check
-        readings = []
-        errors = []
-        for i, r in enumerate(data, start=1):
+        for i, r in enumerate(iter_json_array(stream), start=1):
             try:
-                readings.append({
-                    "timestamp": r["timestamp"],
-                    "QT_ms": float(r["QT_ms"]),
-                    "RR_ms": float(r["RR_ms"]),
-                    "HR_bpm": float(r.get("HR_bpm")) if r.get("HR_bpm") else None,
-                    "PR_ms": float(r.get("PR_ms")) if r.get("PR_ms") else None,
-                    "QRS_ms": float(r.get("QRS_ms")) if r.get("QRS_ms") else None
-                })
+                yield _reading(r), None
             except Exception as e:
-                errors.append(f"item {i}: {e}")
-        return {"readings": readings, "errors": errors}
-    except Exception as e:
-        return {"readings": [], "errors": [str(e)]}
+                yield None, f"item {i}: {e}"
+    except (ValueError, UnicodeDecodeError) as e:
+        yield None, str(e) if i == 0 else f"item {i + 1}: {e}"
+
+
+def load_json(content: str) -> Dict[str, Any]:
+    readings, errors = [], []
+    for reading, error in iter_json(io.StringIO(content)):
+        if error is None:
+            readings.append(reading)
+        else:
+            errors.append(error)
+    return {"readings": readings, "errors": errors}
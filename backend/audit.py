@@ -1,38 +1,966 @@
-import json, os, hashlib, time
-from datetime import datetime
-from typing import Optional
+import json, os, io, hashlib, time, threading, queue, logging, multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from .telemetry import incr, time_block, register_gauge
+from .tracing import traced
+
+try:  # POSIX advisory locks; other platforms fall back to the in-process lock
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
 
 AUDIT_PATH = os.environ.get("ECG_AUDIT_PATH", "audit.jsonl")
 
+# fsync policy for appends:
+#   "off"      - leave flushing to the OS (fastest, previous behaviour)
+#   "always"   - fsync after every append
+#   "interval" - fsync at most once every ECG_AUDIT_FSYNC_INTERVAL_S seconds
+FSYNC_POLICY = os.environ.get("ECG_AUDIT_FSYNC", "off").lower()
+FSYNC_INTERVAL_S = float(os.environ.get("ECG_AUDIT_FSYNC_INTERVAL_S", "1.0"))
+
+# How long a handler waits on a full queue before writing synchronously
+ENQUEUE_TIMEOUT_S = float(os.environ.get("ECG_AUDIT_ENQUEUE_TIMEOUT_S", "0.05"))
+# ...and, writing synchronously, how long it waits for the writer thread to
+# finish its current commit before giving up with an error
+SYNC_WAIT_S = float(os.environ.get("ECG_AUDIT_SYNC_WAIT_S", "5.0"))
+# Backoff between retries of a failed group commit (doubles up to the max)
+RETRY_BASE_S = 0.05
+RETRY_MAX_S = 5.0
+# How often an idle writer thread lets a synchronous write in
+IDLE_POLL_S = 0.1
+
+# Segment rollover: size in bytes and/or age in seconds (0 disables either)
+SEGMENT_BYTES = int(os.environ.get("ECG_AUDIT_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+SEGMENT_SECONDS = float(os.environ.get("ECG_AUDIT_SEGMENT_SECONDS", "86400"))
+# Records between checkpoint digests in a segment manifest
+CHECKPOINT_EVERY = int(os.environ.get("ECG_AUDIT_CHECKPOINT_EVERY", "1000"))
+
+_TAIL_BLOCK = 4096
+
+logger = logging.getLogger(__name__)
+
+# Serialises writers inside this process; the flock below covers other processes
+_lock = threading.Lock()
+# (dev, inode, size) of the log as of our last append, and the chain tail hash.
+# If the file on disk no longer matches, another process appended (or the file
+# was replaced) and the tail is re-read from disk.
+_tail: Optional[Tuple[Tuple[int, int, int], str]] = None
+_last_fsync = 0.0
+# (dev, inode) of the active segment -> timestamp of its first record
+_segment_born: Dict[Tuple[int, int], datetime] = {}
+
+
+def _tail_hash_of(f) -> Optional[str]:
+    """
+    Return the payload_hash of the last complete record by reading backwards
+    from the end of the file in blocks; cost is independent of log size.
+    None if the file holds no complete record.
+    """
+    f.seek(0, os.SEEK_END)
+    pos = f.tell()
+    buf = b""
+    while pos > 0:
+        step = min(_TAIL_BLOCK, pos)
+        pos -= step
+        f.seek(pos)
+        buf = f.read(step) + buf
+        lines = buf.split(b"\n")
+        # lines[0] may be a partial line unless we've reached the start
+        candidates = lines if pos == 0 else lines[1:]
+        for line in reversed(candidates):
+            if not line.strip():
+                continue
+            try:
+                return json.loads(line.decode("utf-8")).get("payload_hash", "GENESIS")
+            except ValueError:
+                continue  # torn write from a crash; look further back
+        if pos > 0:
+            buf = lines[0]
+    return None
+
+
+def _chain_tail(f) -> str:
+    """
+    Tail hash of the whole chain: the active segment's last record or, if
+    the active segment is still empty, the last sealed segment's last hash.
+    """
+    tail = _tail_hash_of(f)
+    if tail is not None:
+        return tail
+    sealed = sealed_segments()
+    if sealed:
+        return _read_manifest(sealed[-1][0]).get("last_hash", "GENESIS")
+    return "GENESIS"
+
+
 def _last_hash() -> str:
     if not os.path.exists(AUDIT_PATH):
-        return "GENESIS"
+        return _chain_tail(io.BytesIO())
     with open(AUDIT_PATH, "rb") as f:
-        last = None
-        for line in f:
-            last = line
-        if not last:
-            return "GENESIS"
-        obj = json.loads(last.decode("utf-8"))
-        return obj.get("payload_hash", "GENESIS")
-
-def _hash_payload(payload: dict, prev_hash: str) -> str:
+        return _chain_tail(f)
+
+
+def _payload_body(payload: dict) -> str:
+    return json.dumps(payload, sort_keys=True)
+
+
+def _hash_payload(payload, prev_hash: str) -> str:
+    # `payload` may already be serialised by _payload_body
+    body = payload if isinstance(payload, str) else _payload_body(payload)
     h = hashlib.sha256()
-    h.update(json.dumps(payload, sort_keys=True).encode("utf-8"))
+    h.update(body.encode("utf-8"))
     h.update(prev_hash.encode("utf-8"))
     return h.hexdigest()
 
-def write_event(user_id: str, action: str, payload: dict):
-    prev = _last_hash()
-    payload_hash = _hash_payload(payload, prev)
-    evt = {
+
+def _maybe_fsync(fd: int):
+    global _last_fsync
+    if FSYNC_POLICY == "always":
+        os.fsync(fd)
+    elif FSYNC_POLICY == "interval":
+        now = time.monotonic()
+        if now - _last_fsync >= FSYNC_INTERVAL_S:
+            os.fsync(fd)
+            _last_fsync = now
+
+
+def _new_event(user_id: str, action: str) -> dict:
+    return {
         "event_id": f"{int(time.time()*1000)}",
         "ts": datetime.utcnow().isoformat() + "Z",
         "user_id": user_id,
         "action": action,
-        "payload_hash": payload_hash,
-        "prev_hash": prev
     }
-    with open(AUDIT_PATH, "ab") as f:
-        f.write((json.dumps(evt) + "\n").encode("utf-8"))
+
+
+# ============================================================
+# Segments
+#
+# AUDIT_PATH is always the active segment. When it reaches
+# SEGMENT_BYTES or SEGMENT_SECONDS of age it is sealed: a manifest with the
+# first/last chain hashes and a checkpoint digest every CHECKPOINT_EVERY
+# records is written next to it, then it is renamed to AUDIT_PATH.<seq>.
+# ============================================================
+
+def _segment_path(seq: int) -> str:
+    return f"{AUDIT_PATH}.{seq:06d}"
+
+
+def _manifest_path(seq: int) -> str:
+    return f"{_segment_path(seq)}.manifest.json"
+
+
+def _state_path() -> str:
+    return f"{AUDIT_PATH}.verified.json"
+
+
+def sealed_segments() -> List[Tuple[int, str]]:
+    """
+    (seq, path) of every sealed segment that has a manifest, oldest first.
+    """
+    folder = os.path.dirname(os.path.abspath(AUDIT_PATH))
+    prefix = os.path.basename(AUDIT_PATH) + "."
+    out = []
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    for name in names:
+        if not name.startswith(prefix) or not name.endswith(".manifest.json"):
+            continue
+        seq = name[len(prefix):-len(".manifest.json")]
+        if seq.isdigit() and os.path.exists(_segment_path(int(seq))):
+            out.append((int(seq), _segment_path(int(seq))))
+    return sorted(out)
+
+
+def _read_manifest(seq: int) -> dict:
+    with open(_manifest_path(seq), "r") as f:
+        return json.load(f)
+
+
+def _write_json_atomic(path: str, obj: dict):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _scan(f, prev_hash: str, offset: int = 0, digest: Optional[str] = None,
+          checkpoint_every: Optional[int] = None) -> dict:
+    """
+    Walk a segment from `offset`, checking that every record links to the
+    previous one and computing chained checkpoint digests:
+
+        digest_k = sha256(digest_{k-1} + raw bytes of the records since k-1)
+
+    seeded with `digest` (or the segment's first prev_hash). Returns the
+    record count, checkpoints, final digest, last hash and any breaks.
+    """
+    every = checkpoint_every or CHECKPOINT_EVERY
+    digest = digest if digest is not None else prev_hash
+    h = hashlib.sha256(digest.encode("utf-8"))
+    pending = 0
+    records = 0
+    errors: List[str] = []
+    checkpoints = []
+    first_ts = last_ts = None
+
+    f.seek(offset)
+    pos = offset
+    for line in f:
+        pos += len(line)
+        if not line.endswith(b"\n"):
+            errors.append(f"offset {pos - len(line)}: torn record at end of segment")
+            break
+        h.update(line)
+        pending += 1
+        records += 1
+        try:
+            rec = json.loads(line.decode("utf-8"))
+        except ValueError:
+            errors.append(f"offset {pos - len(line)}: unparseable record")
+            continue
+        if rec.get("prev_hash") != prev_hash:
+            errors.append(f"offset {pos - len(line)}: chain break (prev_hash mismatch)")
+        prev_hash = rec.get("payload_hash", "")
+        first_ts = first_ts or rec.get("ts")
+        last_ts = rec.get("ts")
+        if records % every == 0:
+            digest = h.hexdigest()
+            checkpoints.append({"records": records, "offset": pos, "digest": digest,
+                                "last_hash": prev_hash, "ts": last_ts})
+            h = hashlib.sha256(digest.encode("utf-8"))
+            pending = 0
+
+    if pending:
+        digest = h.hexdigest()
+        checkpoints.append({"records": records, "offset": pos, "digest": digest,
+                            "last_hash": prev_hash, "ts": last_ts})
+    return {
+        "records": records,
+        "bytes": pos,
+        "checkpoints": checkpoints,
+        "digest": digest,
+        "last_hash": prev_hash,
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "errors": errors,
+    }
+
+
+def _first_prev_hash(f) -> Optional[str]:
+    f.seek(0)
+    line = f.readline()
+    try:
+        return json.loads(line.decode("utf-8")).get("prev_hash")
+    except ValueError:
+        return None
+
+
+def _segment_age_s(f, st) -> float:
+    key = (st.st_dev, st.st_ino)
+    born = _segment_born.get(key)
+    if born is None:
+        f.seek(0)
+        try:
+            ts = json.loads(f.readline().decode("utf-8"))["ts"]
+            born = datetime.fromisoformat(ts.rstrip("Z"))
+        except (ValueError, KeyError, TypeError):
+            born = datetime.utcnow()
+        _segment_born.clear()  # only the active segment matters
+        _segment_born[key] = born
+    return (datetime.utcnow() - born).total_seconds()
+
+
+def _should_seal(f, st) -> bool:
+    if not st.st_size:
+        return False
+    if SEGMENT_BYTES and st.st_size >= SEGMENT_BYTES:
+        return True
+    return bool(SEGMENT_SECONDS) and _segment_age_s(f, st) >= SEGMENT_SECONDS
+
+
+def _seal(f):
+    """
+    Write the manifest for the active segment, then rename it into place.
+    Caller holds the exclusive lock.
+    """
+    sealed = sealed_segments()
+    seq = sealed[-1][0] + 1 if sealed else 1
+    first_prev = _first_prev_hash(f) or "GENESIS"
+    scan = _scan(f, first_prev)
+    manifest = {
+        "segment": os.path.basename(_segment_path(seq)),
+        "seq": seq,
+        "first_prev_hash": first_prev,
+        "sealed_at": datetime.utcnow().isoformat() + "Z",
+        "checkpoint_every": CHECKPOINT_EVERY,
+    }
+    manifest.update({k: scan[k] for k in ("records", "bytes", "first_ts", "last_ts",
+                                          "last_hash", "digest", "checkpoints")})
+    if scan["errors"]:
+        manifest["errors_at_seal"] = scan["errors"][:20]
+    # manifest first so a concurrent writer never sees an empty active
+    # segment without a manifest to chain from
+    _write_json_atomic(_manifest_path(seq), manifest)
+    os.rename(AUDIT_PATH, _segment_path(seq))
+    incr("audit_segments_sealed")
+    logger.info("Sealed audit segment %s (%d records)", manifest["segment"], scan["records"])
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+
+def _unlock_close(f):
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    finally:
+        f.close()
+
+
+def _open_active():
+    """
+    Open and lock the active segment, retrying if another process sealed
+    (renamed) it while we were waiting for the lock.
+    """
+    while True:
+        f = open(AUDIT_PATH, "a+b")
+        _lock_file(f)
+        st = os.fstat(f.fileno())
+        try:
+            cur = os.stat(AUDIT_PATH)
+            if (cur.st_dev, cur.st_ino) == (st.st_dev, st.st_ino):
+                return f, st
+        except FileNotFoundError:
+            pass
+        _unlock_close(f)
+
+
+def _append(batch: List[Tuple[dict, dict]]):
+    """
+    Chain and append a batch of (event, payload) pairs with a single write.
+    Events are completed in place with payload_hash / prev_hash.
+    """
+    global _tail
+    with _lock:
+        f, st = _open_active()
+        try:
+            if _should_seal(f, st):
+                _seal(f)
+                _unlock_close(f)
+                f, st = _open_active()
+
+            key = (st.st_dev, st.st_ino, st.st_size)
+            lead = b""
+            if _tail is not None and _tail[0] == key:
+                prev = _tail[1]
+            else:
+                prev = _chain_tail(f)
+                if st.st_size:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        lead = b"\n"  # don't glue onto a torn last line
+
+            lines = [lead]
+            for evt, payload in batch:
+                evt["payload_hash"] = _hash_payload(payload, prev)
+                evt["prev_hash"] = prev
+                prev = evt["payload_hash"]
+                lines.append((json.dumps(evt) + "\n").encode("utf-8"))
+            data = b"".join(lines)
+            fd = f.fileno()
+            try:
+                # Straight to the fd: nothing is left in a buffer for
+                # close() to write after the truncate below
+                view = memoryview(data)
+                while view:
+                    view = view[os.write(fd, view):]
+                _maybe_fsync(fd)
+            except BaseException:
+                # Take back whatever part of the batch landed, so a retry
+                # doesn't write those events twice
+                _tail = None
+                os.ftruncate(fd, st.st_size)
+                raise
+            _tail = ((st.st_dev, st.st_ino, st.st_size + len(data)), prev)
+        finally:
+            _unlock_close(f)
+
+
+def _landed(batch: List[Tuple[dict, str]]) -> int:
+    """
+    How many leading events of `batch` are on disk after a failed _append:
+    normally none, as _append truncates back, but if that failed too the
+    on-disk tail is the payload_hash of the last one written.
+    """
+    try:
+        with _lock:
+            tail = _last_hash()
+    except OSError:
+        return 0
+    for i in range(len(batch) - 1, -1, -1):
+        if batch[i][0].get("payload_hash") == tail:
+            return i + 1
+    return 0
+
+
+class AuditWriter:
+    """
+    Group-commit writer: handlers enqueue events, one background thread
+    chains and appends them every `batch_max` events or `batch_ms`
+    milliseconds, whichever comes first. Queue order is chain order.
+
+    A failed commit is retried with backoff, as a batch and then event by
+    event, until it lands; queued events are never dropped.
+    """
+
+    def __init__(self, max_queue: int, batch_max: int, batch_ms: float):
+        self.batch_max = batch_max
+        self.batch_s = batch_ms / 1000.0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        # Held while a batch is taken off the queue and committed, so a
+        # synchronous write can't land ahead of events already dequeued
+        self._order = threading.Lock()
+        # Events a failed synchronous write took off the queue; they go
+        # out first in the next commit
+        self._carry: List[Tuple[dict, str]] = []
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def depth(self) -> int:
+        return self._queue.qsize() + len(self._carry)
+
+    def submit(self, evt: dict, payload) -> bool:
+        """
+        Enqueue an event; returns False if the queue stayed full for
+        ENQUEUE_TIMEOUT_S (the caller should then use append_sync).
+        """
+        try:
+            self._queue.put((evt, payload), timeout=ENQUEUE_TIMEOUT_S)
+            return True
+        except queue.Full:
+            incr("audit_queue_full")
+            return False
+
+    def append_sync(self, evt: dict, payload):
+        """
+        Append an event from the calling thread, behind everything already
+        queued: the queue is drained into the same write so the log stays
+        in submission (and so `ts`) order. Raises if the write fails or the
+        writer thread is stuck on a commit for more than SYNC_WAIT_S; the
+        drained events are then left for the writer thread.
+        """
+        if not self._order.acquire(timeout=SYNC_WAIT_S):
+            raise TimeoutError("audit writer is busy retrying a commit; event not recorded")
+        try:
+            drained, self._carry = self._carry, []
+            queued, stop = self._drain()
+            drained += queued
+            try:
+                with time_block("audit_commit_ms"):
+                    _append(drained + [(evt, payload)])
+            except Exception:
+                landed = _landed(drained + [(evt, payload)])
+                for _ in drained[:landed]:
+                    self._queue.task_done()
+                self._carry = drained[landed:]
+                if landed <= len(drained):
+                    raise
+                # everything made it to disk after all
+            else:
+                for _ in drained:
+                    self._queue.task_done()
+            finally:
+                if stop:
+                    self._queue.put_nowait(_STOP)
+            incr("audit_events", len(drained) + 1)
+        finally:
+            self._order.release()
+
+    def _drain(self) -> Tuple[list, bool]:
+        # Everything queued right now, and whether _STOP was among it
+        items, stop = [], False
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return items, stop
+            if item is _STOP:
+                self._queue.task_done()
+                stop = True
+            else:
+                items.append(item)
+
+    def _commit(self, batch: List[Tuple[dict, str]]):
+        # Retry the batch, then each event on its own (in order), until
+        # every one is written. Events are completed in place by _append,
+        # so a retry re-chains them onto the current tail, after dropping
+        # any that a failed attempt did leave on disk.
+        delay, attempts = RETRY_BASE_S, 0
+        pending = batch
+        while pending:
+            try:
+                with time_block("audit_commit_ms"):
+                    if attempts < 2:
+                        _append(pending)
+                        done = len(pending)
+                    else:
+                        _append(pending[:1])
+                        done = 1
+            except Exception as exc:
+                attempts += 1
+                incr("audit_commit_failures")
+                done = _landed(pending)
+                if done:
+                    incr("audit_events", done)
+                    for _ in pending[:done]:
+                        self._queue.task_done()
+                    pending = pending[done:]
+                if attempts == 1:
+                    logger.exception("Audit commit of %d event(s) failed; retrying", len(pending))
+                else:
+                    logger.error("Audit commit retry %d failed (%d event(s) pending): %s",
+                                 attempts, len(pending), exc)
+                time.sleep(delay)
+                delay = min(delay * 2, RETRY_MAX_S)
+                continue
+            incr("audit_commits")
+            incr("audit_events", done)
+            for _ in pending[:done]:
+                self._queue.task_done()
+            pending = pending[done:]
+        if attempts:
+            logger.warning("Audit commit succeeded after %d retr%s", attempts, "y" if attempts == 1 else "ies")
+
+    def _take(self) -> Tuple[list, bool]:
+        # Next batch: carried-over events first, then the queue. Called
+        # under _order; an idle wait gives it up every IDLE_POLL_S.
+        batch, self._carry = self._carry, []
+        deadline = None
+        while len(batch) < self.batch_max:
+            if not batch:
+                timeout = IDLE_POLL_S
+            else:
+                if deadline is None:
+                    deadline = time.monotonic() + self.batch_s
+                timeout = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.task_done()
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            with self._order:
+                batch, stopping = self._take()
+                if batch:
+                    self._commit(batch)
+
+    def start(self):
+        if self.running:
+            return
+        self._thread = threading.Thread(target=self._run, name="audit-writer", daemon=True)
+        self._thread.start()
+
+    def flush(self):
+        """
+        Block until everything enqueued so far has been committed.
+        """
+        if self.running:
+            self._queue.join()
+
+    def stop(self, timeout: float = 5.0):
+        """
+        Drain the queue and stop the writer thread.
+        """
+        if not self.running:
+            return
+        self._queue.put(_STOP)
+        self._thread.join(timeout=timeout)
+        if self._thread.is_alive():
+            logger.error("Audit writer still retrying after %.1fs; %d event(s) not yet written",
+                         timeout, self.depth())
+        self._thread = None
+
+
+_STOP = object()
+
+writer = AuditWriter(
+    max_queue=int(os.environ.get("ECG_AUDIT_QUEUE_MAX", "10000")),
+    batch_max=int(os.environ.get("ECG_AUDIT_BATCH_MAX", "256")),
+    batch_ms=float(os.environ.get("ECG_AUDIT_BATCH_MS", "20")),
+)
+register_gauge("audit_queue_depth", writer.depth)
+
+
+@traced("audit.write_event")
+def write_event(user_id: str, action: str, payload: dict):
+    """
+    Record an audit event.
+
+    With the background writer running the event is queued and its
+    payload_hash / prev_hash are filled into the returned dict once the
+    group commit lands (writer.flush() waits for that). Otherwise, or if
+    the queue is saturated, the event is appended synchronously (behind
+    anything still queued).
+    """
+    evt = _new_event(user_id, action)
+    body = _payload_body(payload)  # a payload that can't be serialised fails here, not in the writer
+    if not writer.running:
+        _append([(evt, body)])
+    elif not writer.submit(evt, body):
+        writer.append_sync(evt, body)
     return evt
+
+
+# ============================================================
+# Querying
+#
+# Each segment gets a sparse index of (ts, offset) pairs: records after
+# `offset` were written no earlier than `ts` (less TS_SKEW_S, since
+# concurrent workers stamp events slightly out of order). Sealed segments
+# reuse their manifest checkpoints; the active segment is indexed
+# incrementally as it grows. Cursors are "<inode>:<offset>", which stay
+# valid when the active segment is sealed (rename keeps the inode).
+# ============================================================
+
+INDEX_EVERY = int(os.environ.get("ECG_AUDIT_INDEX_EVERY", "256"))
+TS_SKEW_S = 5.0
+
+_index_lock = threading.Lock()
+# (dev, inode) of the active segment -> [indexed up to offset, records, entries]
+_active_index: Dict[Tuple[int, int], list] = {}
+
+
+def _parse_ts(ts: Optional[str]) -> Optional[datetime]:
+    if not ts:
+        return None
+    try:
+        return datetime.fromisoformat(ts.rstrip("Z"))
+    except ValueError:
+        return None
+
+
+def _to_naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is None or dt.tzinfo is None:
+        return dt
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _index_active(path: str, st) -> List[Tuple[datetime, int]]:
+    key = (st.st_dev, st.st_ino)
+    with _index_lock:
+        state = _active_index.get(key)
+        if state is None:
+            _active_index.clear()
+            state = _active_index[key] = [0, 0, []]
+        if state[0] < st.st_size:
+            with open(path, "rb") as f:
+                f.seek(state[0])
+                pos = state[0]
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break  # batch still being written
+                    pos += len(line)
+                    state[1] += 1
+                    if state[1] % INDEX_EVERY == 0:
+                        try:
+                            ts = _parse_ts(json.loads(line.decode("utf-8")).get("ts"))
+                        except ValueError:
+                            ts = None
+                        if ts is not None:
+                            state[2].append((ts, pos))
+                state[0] = pos
+        return list(state[2])
+
+
+def _segments_for_query() -> List[dict]:
+    """
+    Every segment (sealed, then active) with its inode, time span and index.
+    """
+    out = []
+    for seq, path in sealed_segments():
+        try:
+            manifest = _read_manifest(seq)
+            ino = os.stat(path).st_ino
+        except (OSError, ValueError):
+            continue
+        out.append({
+            "path": path,
+            "ino": ino,
+            "first_ts": _parse_ts(manifest.get("first_ts")),
+            "last_ts": _parse_ts(manifest.get("last_ts")),
+            "index": [
+                (_parse_ts(c.get("ts")), c["offset"])
+                for c in manifest.get("checkpoints", [])
+                if _parse_ts(c.get("ts")) is not None
+            ],
+        })
+    try:
+        st = os.stat(AUDIT_PATH)
+        out.append({
+            "path": AUDIT_PATH,
+            "ino": st.st_ino,
+            "first_ts": None,
+            "last_ts": None,
+            "index": _index_active(AUDIT_PATH, st),
+        })
+    except FileNotFoundError:
+        pass
+    return out
+
+
+def iter_events(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    action: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+):
+    """
+    Yield (raw_line, cursor_after_line) for matching events, oldest first.
+    """
+    since, until = _to_naive_utc(since), _to_naive_utc(until)
+    skew = timedelta(seconds=TS_SKEW_S)
+    start_ino, start_off = None, 0
+    if cursor:
+        try:
+            a, b = cursor.split(":", 1)
+            start_ino, start_off = int(a), int(b)
+        except ValueError:
+            raise ValueError("invalid cursor")
+
+    segments = _segments_for_query()
+    if start_ino is not None:
+        inos = [seg["ino"] for seg in segments]
+        if start_ino not in inos:
+            raise ValueError("cursor refers to a segment that no longer exists")
+        segments = segments[inos.index(start_ino):]
+
+    action_b = json.dumps(action).encode("utf-8") if action else None
+    user_b = json.dumps(user_id).encode("utf-8") if user_id else None
+
+    for n, seg in enumerate(segments):
+        if since and seg["last_ts"] and seg["last_ts"] < since - skew:
+            continue
+        if until and seg["first_ts"] and seg["first_ts"] > until + skew:
+            break
+        offset = start_off if (n == 0 and start_ino is not None) else 0
+        if since:
+            for ts, off in seg["index"]:
+                if ts >= since - skew:
+                    break
+                offset = max(offset, off)
+        try:
+            f = open(seg["path"], "rb")
+        except FileNotFoundError:
+            continue  # sealed under us; its new name is picked up next query
+        with f:
+            f.seek(offset)
+            pos = offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                pos += len(line)
+                # cheap byte-level prefilter before parsing
+                if action_b and action_b not in line:
+                    continue
+                if user_b and user_b not in line:
+                    continue
+                try:
+                    rec = json.loads(line.decode("utf-8"))
+                except ValueError:
+                    continue
+                if action and rec.get("action") != action:
+                    continue
+                if user_id and rec.get("user_id") != user_id:
+                    continue
+                if since or until:
+                    ts = _parse_ts(rec.get("ts"))
+                    if ts is None or (since and ts < since):
+                        continue
+                    if until and ts > until:
+                        if ts > until + skew:
+                            return
+                        continue
+                yield line.decode("utf-8").rstrip("\n"), f"{seg['ino']}:{pos}"
+
+
+def read_events(limit: int = 1000, **filters) -> Tuple[List[str], Optional[str]]:
+    """
+    One page of iter_events; returns (lines, next_cursor or None).
+    """
+    events: List[str] = []
+    last_cursor = None
+    for line, cur in iter_events(**filters):
+        if len(events) == limit:
+            return events, last_cursor
+        events.append(line)
+        last_cursor = cur
+    return events, None
+
+
+# ============================================================
+# Verification
+# ============================================================
+
+def _verify_sealed(job: Tuple[int, str, str]) -> dict:
+    """
+    Verify one sealed segment against its manifest. Runs in a worker
+    process, so paths are passed in rather than derived from AUDIT_PATH.
+    """
+    seq, segment_path, manifest_path = job
+    out = {"seq": seq, "ok": False, "records": 0, "errors": []}
+    try:
+        with open(manifest_path, "r") as f:
+            manifest = json.load(f)
+        with open(segment_path, "rb") as f:
+            scan = _scan(f, manifest["first_prev_hash"],
+                         checkpoint_every=manifest.get("checkpoint_every"))
+    except (OSError, ValueError, KeyError) as exc:
+        out["errors"].append(f"unreadable segment or manifest: {exc}")
+        return out
+
+    errors = list(scan["errors"])
+    for field in ("records", "bytes", "last_hash", "digest"):
+        if scan[field] != manifest.get(field):
+            errors.append(f"{field} does not match manifest")
+    if scan["checkpoints"] != manifest.get("checkpoints"):
+        bad = next(
+            (m for s_, m in zip(scan["checkpoints"], manifest.get("checkpoints", [])) if s_ != m),
+            None,
+        )
+        where = f" (first at record {bad['records']})" if bad else ""
+        errors.append(f"checkpoint digests do not match manifest{where}")
+    out.update({
+        "ok": not errors,
+        "records": scan["records"],
+        "first_prev_hash": manifest.get("first_prev_hash"),
+        "last_hash": manifest.get("last_hash"),
+        "errors": errors,
+    })
+    return out
+
+
+def verify(resume: bool = False, workers: Optional[int] = None) -> dict:
+    """
+    Verify the whole audit chain.
+
+    Sealed segments are checked against their manifests in parallel
+    (`workers` processes, default one per core) and then stitched together
+    by first/last hash; the active segment is checked sequentially. With
+    `resume`, segments and the active-segment prefix recorded as verified
+    by the previous successful run are skipped.
+    """
+    t0 = time.perf_counter()
+    state = {}
+    if resume:
+        try:
+            with open(_state_path(), "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+    sealed = sealed_segments()
+    done_seq = state.get("sealed_seq", 0)
+    todo = [(seq, path, _manifest_path(seq)) for seq, path in sealed if seq > done_seq]
+    if len(todo) > 1 and workers != 1:
+        # spawn: the server process is multi-threaded, so don't fork it
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            results = list(pool.map(_verify_sealed, todo))
+    else:
+        results = [_verify_sealed(job) for job in todo]
+
+    errors: List[str] = []
+    prev = state.get("last_sealed_hash", "GENESIS") if done_seq else "GENESIS"
+    records = 0
+    for r in results:
+        records += r["records"]
+        errors.extend(f"segment {r['seq']}: {e}" for e in r["errors"])
+        if r.get("first_prev_hash") is not None and r["first_prev_hash"] != prev:
+            errors.append(f"segment {r['seq']}: does not link to the previous segment")
+        prev = r.get("last_hash", prev)
+    sealed_hash = prev
+
+    # Active segment
+    active = {"records": 0, "offset": 0}
+    try:
+        with open(AUDIT_PATH, "rb") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH)  # no half-written batches
+            st = os.fstat(f.fileno())
+            saved = state.get("active") or {}
+            start, digest, expect = 0, None, sealed_hash
+            if (
+                not todo
+                and saved.get("ino") == st.st_ino
+                and saved.get("dev") == st.st_dev
+                and saved.get("offset", 0) <= st.st_size
+            ):
+                start, digest, expect = saved["offset"], saved["digest"], saved["last_hash"]
+            scan = _scan(f, expect, offset=start, digest=digest)
+            records += scan["records"]
+            errors.extend(f"active segment: {e}" for e in scan["errors"])
+            active = {
+                "dev": st.st_dev,
+                "ino": st.st_ino,
+                "offset": scan["bytes"],
+                "digest": scan["digest"],
+                "last_hash": scan["last_hash"],
+                "records": scan["records"],
+                "resumed_at": start,
+            }
+    except FileNotFoundError:
+        pass
+
+    ok = not errors
+    if ok:
+        _write_json_atomic(_state_path(), {
+            "sealed_seq": sealed[-1][0] if sealed else 0,
+            "last_sealed_hash": sealed_hash,
+            "active": active,
+            "verified_at": datetime.utcnow().isoformat() + "Z",
+        })
+    return {
+        "ok": ok,
+        "segments_checked": len(results),
+        "segments_skipped": len(sealed) - len(results),
+        "records_checked": records,
+        "active_resumed_at": active.get("resumed_at", 0),
+        "errors": errors[:100],
+        "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(prog="python -m backend.audit")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_verify = sub.add_parser("verify", help="verify the audit hash chain")
+    p_verify.add_argument("--resume", action="store_true", help="skip what the last run verified")
+    p_verify.add_argument("--workers", type=int, default=None, help="parallel processes")
+    args = parser.parse_args()
+
+    result = verify(resume=args.resume, workers=args.workers)
+    print(json.dumps(result, indent=2))
+    sys.exit(0 if result["ok"] else 1)
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from .telemetry import incr
+
+
+class LRUCache:
+    """
+    Thread-safe mapping holding at most `maxsize` entries, evicting the
+    least recently used. With `ttl_s`, entries also expire that many
+    seconds after being stored. With a `name`, hits, misses, evictions and
+    expirations are counted in telemetry as <name>_cache_hits etc.
+    """
+
+    def __init__(self, maxsize: int, name: Optional[str] = None, ttl_s: Optional[float] = None):
+        self.maxsize = maxsize
+        self.name = name
+        self.ttl_s = ttl_s
+        # key -> (expires_at, value); expires_at is None without a TTL
+        self._data: "OrderedDict[Hashable, Tuple[Optional[float], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        expired = False
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                if entry[0] is not None and entry[0] <= time.monotonic():
+                    del self._data[key]
+                    entry, expired = None, True
+                else:
+                    self._data.move_to_end(key)
+        if self.name:
+            incr(f"{self.name}_cache_misses" if entry is None else f"{self.name}_cache_hits")
+            if expired:
+                incr(f"{self.name}_cache_expirations")
+        return default if entry is None else entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize <= 0:
+            return
+        expires = None if self.ttl_s is None else time.monotonic() + self.ttl_s
+        evicted = 0
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                evicted += 1
+        if evicted and self.name:
+            incr(f"{self.name}_cache_evictions", evicted)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[1]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,302 @@
+import io
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, List, Optional
+
+import numpy as np
+
+from .telemetry import incr, register_gauge
+
+logger = logging.getLogger(__name__)
+
+# Worker processes parsing/scoring uploads (default: one per core)
+IMPORT_WORKERS = int(os.environ.get("ECG_IMPORT_WORKERS", "0")) or (os.cpu_count() or 1)
+# Jobs pending or running in this API process before new ones get a 429
+IMPORT_QUEUE_MAX = int(os.environ.get("ECG_IMPORT_QUEUE_MAX", "16"))
+# One directory per job: upload, status.json, result.ndjson
+JOBS_DIR = os.environ.get("ECG_IMPORT_JOBS_DIR", "import_jobs")
+# Finished jobs older than this are removed when new ones are submitted
+JOB_TTL_S = float(os.environ.get("ECG_IMPORT_JOB_TTL_S", "86400"))
+
+# Readings scored per vectorised batch, and per progress update
+CHUNK_ROWS = 10000
+# Parse errors copied into status.json (the full capped list is in the result)
+STATUS_ERRORS = 20
+
+_FORMATS = {"csv": "CSV", "json": "JSON"}
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+# ============================================================
+# Job directory (shared by the API process and the workers, and by every
+# API worker process, so any of them can answer a status request)
+# ============================================================
+
+def _job_dir(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _write_status(job_dir: str, status: Dict[str, Any]):
+    tmp = os.path.join(job_dir, "status.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(status, f)
+    os.replace(tmp, os.path.join(job_dir, "status.json"))
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def get_status(job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Current ImportJob fields for `job_id`, or None if there is no such job.
+    """
+    try:
+        uuid.UUID(hex=job_id)  # also rules out path tricks
+        with open(os.path.join(_job_dir(job_id), "status.json")) as f:
+            return json.load(f)
+    except (ValueError, OSError):
+        return None
+
+
+def result_path(job_id: str) -> str:
+    return os.path.join(_job_dir(job_id), "result.ndjson")
+
+
+def _prune():
+    try:
+        names = os.listdir(JOBS_DIR)
+    except FileNotFoundError:
+        return
+    cutoff = time.time() - JOB_TTL_S
+    for name in names:
+        status = get_status(name)
+        if status and status["status"] in ("COMPLETED", "FAILED"):
+            path = os.path.join(_job_dir(name), "status.json")
+            if os.stat(path).st_mtime < cutoff:
+                shutil.rmtree(_job_dir(name), ignore_errors=True)
+
+
+# ============================================================
+# Worker side
+# ============================================================
+
+def _score_chunk(out, items: List[Any], age_band, sex, pack):
+    """
+    Score the readings among `items` in one vectorised call and write every
+    item out in input order; str items are parse errors, written as-is.
+    """
+    from .logic import compute_qtc_batch, PERCENTILE_LABELS, QTC_CATEGORIES
+
+    readings = [r for r in items if not isinstance(r, str)]
+    batch = compute_qtc_batch(
+        qt_ms=np.fromiter((r["QT_ms"] for r in readings), dtype=np.float64, count=len(readings)),
+        rr_ms=np.fromiter((r["RR_ms"] for r in readings), dtype=np.float64, count=len(readings)),
+        age_band=age_band,
+        sex=sex,
+        pack=pack,
+    )
+    for r, qtc, pct, cat in zip(
+        readings,
+        batch.primary_qtc_ms.tolist(),
+        batch.percentile.tolist(),
+        batch.category.tolist(),
+    ):
+        r["QTc_ms"] = qtc
+        r["percentile"] = PERCENTILE_LABELS[pct]
+        r["category"] = QTC_CATEGORIES[cat]
+    out.write("".join(
+        json.dumps({"error": r}) + "\n" if isinstance(r, str) else '{"reading":' + json.dumps(r) + "}\n"
+        for r in items
+    ))
+
+
+def _run_job(job_dir: str, kind: str, age_band: Optional[str], sex: Optional[str],
+             max_errors: int, series_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Parse and score one uploaded file, streaming results to result.ndjson
+    and progress to status.json (and readings to the reading store when a
+    series_id is given). Runs in a pool process.
+    """
+    from .adapters.csv_adapter import iter_csv
+    from .adapters.json_adapter import iter_json
+    from .references import current_pack
+    from .store import persist_stream
+
+    with open(os.path.join(job_dir, "status.json")) as f:
+        status = json.load(f)
+    status.update(status="RUNNING", started_at=_now())
+    _write_status(job_dir, status)
+
+    upload = os.path.join(job_dir, "upload")
+    total = os.path.getsize(upload) or 1
+    pack = current_pack()
+    rows = n_errors = 0
+    errors: List[str] = []
+    chunk: List[Any] = []
+
+    with open(upload, "rb") as raw, open(os.path.join(job_dir, "result.ndjson"), "w") as out:
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", newline="")
+        items = iter_csv(text) if kind == "csv" else iter_json(text)
+        if series_id is not None:
+            items = persist_stream(series_id, items)
+        for reading, error in items:
+            if error is None:
+                chunk.append(reading)
+                rows += 1
+            else:
+                n_errors += 1
+                if len(errors) < STATUS_ERRORS:
+                    errors.append(error)
+                if n_errors > max_errors:
+                    continue
+                chunk.append(error)
+            if len(chunk) >= CHUNK_ROWS:
+                _score_chunk(out, chunk, age_band, sex, pack)
+                chunk = []
+                status.update(rows=rows, error_count=n_errors, progress=min(raw.tell() / total, 0.99))
+                _write_status(job_dir, status)
+        if chunk:
+            _score_chunk(out, chunk, age_band, sex, pack)
+        out.write(json.dumps({"summary": {
+            "rows": rows, "errors": n_errors,
+            "errors_truncated": max(0, n_errors - max_errors),
+            "ref_version": pack.version,
+        }}) + "\n")
+
+    status.update(status="COMPLETED", rows=rows, error_count=n_errors, errors=errors,
+                  progress=1.0, finished_at=_now())
+    _write_status(job_dir, status)
+    return status
+
+
+# ============================================================
+# API side
+# ============================================================
+
+_lock = threading.Lock()
+_pool: Optional[ProcessPoolExecutor] = None
+_inflight: Dict[str, Any] = {}
+
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _lock:
+        if _pool is None:
+            # spawn, not fork: the API process has threads (audit writer etc.)
+            ctx = multiprocessing.get_context("spawn")
+            _pool = ProcessPoolExecutor(max_workers=IMPORT_WORKERS, mp_context=ctx)
+        return _pool
+
+
+def _discard(pool: ProcessPoolExecutor):
+    # A worker died (e.g. OOM-killed) and broke `pool`: every job on it
+    # fails, and the next submit gets a fresh pool
+    global _pool
+    with _lock:
+        if _pool is not pool:
+            return  # already replaced
+        _pool = None
+    logger.error("Import worker process died; replacing the pool")
+    incr("import_pool_broken")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def inflight() -> int:
+    return len(_inflight)
+
+
+register_gauge("import_jobs_inflight", inflight)
+
+
+def submit(kind: str, upload: BinaryIO, age_band: Optional[str] = None,
+           sex: Optional[str] = None, max_errors: int = 1000,
+           series_id: Optional[str] = None, on_done=None) -> Dict[str, Any]:
+    """
+    Copy `upload` into a new job directory and queue it on the pool.
+    Returns the PENDING status; raises JobQueueFull at IMPORT_QUEUE_MAX.
+    `on_done(status)` is called in this process when the job finishes.
+    """
+    with _lock:
+        if len(_inflight) >= IMPORT_QUEUE_MAX:
+            incr("import_jobs_rejected")
+            raise JobQueueFull(f"{len(_inflight)} import jobs already queued")
+        job_id = uuid.uuid4().hex
+        _inflight[job_id] = None  # reserve the slot before the (slow) copy
+
+    try:
+        _prune()
+        job_dir = os.path.abspath(_job_dir(job_id))
+        os.makedirs(job_dir)
+        with open(os.path.join(job_dir, "upload"), "wb") as f:
+            shutil.copyfileobj(upload, f, 1024 * 1024)
+        status = {
+            "job_id": job_id,
+            "format": _FORMATS[kind],
+            "status": "PENDING",
+            "errors": [],
+            "progress": 0.0,
+            "rows": 0,
+            "error_count": 0,
+            "age_band": age_band,
+            "sex": sex,
+            "series_id": series_id,
+            "created_at": _now(),
+        }
+        _write_status(job_dir, status)
+        job = (_run_job, job_dir, kind, age_band, sex, max_errors, series_id)
+        pool = _executor()
+        try:
+            fut = pool.submit(*job)
+        except BrokenProcessPool:  # broke before its jobs' callbacks ran
+            _discard(pool)
+            pool = _executor()
+            fut = pool.submit(*job)
+    except BaseException:
+        with _lock:
+            _inflight.pop(job_id, None)
+        raise
+
+    with _lock:
+        _inflight[job_id] = fut
+    incr("import_jobs_submitted")
+
+    def _finished(f):
+        with _lock:
+            _inflight.pop(job_id, None)
+        exc = f.exception()
+        if exc is None:
+            final = f.result()
+            incr("import_jobs_completed")
+        else:
+            if isinstance(exc, BrokenProcessPool):
+                _discard(pool)
+            logger.warning("Import job %s failed: %s", job_id, exc)
+            final = get_status(job_id) or status
+            final.update(status="FAILED", errors=[f"{type(exc).__name__}: {exc}"], finished_at=_now())
+            _write_status(job_dir, final)
+            incr("import_jobs_failed")
+        if on_done is not None:
+            on_done(final)
+
+    fut.add_done_callback(_finished)
+    return status
+
+
+def shutdown(wait: bool = True):
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=wait, cancel_futures=not wait)
+        _pool = None
@@ -1,9 +1,18 @@
 import os
+import copy
 import json
+import time
+import asyncio
 import logging
-from typing import Dict, Any
+from collections import deque
+from typing import Any, AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
 
-from openai import OpenAI
+from openai import APIStatusError, AsyncOpenAI
+
+from . import narrative_cache
+from .telemetry import incr, register_gauge
+from .term_scanner import Match, TermScanner
+from .tracing import span, traced
 
 logger = logging.getLogger(__name__)
 
@@ -13,18 +22,319 @@ logger = logging.getLogger(__name__)
 
 OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-5.1-2025-11-13")
 _API_KEY = os.environ.get("OPENAI_API_KEY")
+_BASE_URL = os.environ.get("OPENAI_BASE_URL")
+
+# Time a narrative may spend on the model, including the wait for a
+# concurrency slot; past it the deterministic fallback is returned
+LLM_BUDGET_S = float(os.environ.get("ECG_LLM_BUDGET_S", "8"))
+# Upstream calls in flight at once in this worker
+LLM_MAX_CONCURRENCY = int(os.environ.get("ECG_LLM_MAX_CONCURRENCY", "8"))
+
+# Circuit breaker, see CircuitBreaker: over the last BREAKER_WINDOW calls,
+# once BREAKER_FAILURE_RATE of them failed or took over BREAKER_SLOW_S the
+# upstream is skipped for BREAKER_OPEN_S, then probed
+BREAKER_WINDOW = int(os.environ.get("ECG_LLM_BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.environ.get("ECG_LLM_BREAKER_MIN_CALLS", "5"))
+BREAKER_FAILURE_RATE = float(os.environ.get("ECG_LLM_BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_SLOW_S = float(os.environ.get("ECG_LLM_BREAKER_SLOW_S", "5"))
+BREAKER_OPEN_S = float(os.environ.get("ECG_LLM_BREAKER_OPEN_S", "30"))
+
+# Async client and semaphore belong to the event loop that created them
+_client: Optional[AsyncOpenAI] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_inflight = 0
+# cache key -> upstream call in progress, see generate_qtc_narrative
+_pending: Dict[str, "asyncio.Task"] = {}
+
+register_gauge("llm_inflight", lambda: _inflight)
+register_gauge("llm_circuit_state", lambda: breaker.state_code)  # 0 closed, 1 half-open, 2 open
+
+
+def configure(api_key: Optional[str] = None, base_url: Optional[str] = None,
+              budget_s: Optional[float] = None, max_concurrency: Optional[int] = None,
+              model: Optional[str] = None):
+    """
+    Override the environment settings (e.g. to point at a stub server in
+    tests). Arguments left as None keep their current value.
+    """
+    global _API_KEY, _BASE_URL, LLM_BUDGET_S, LLM_MAX_CONCURRENCY, OPENAI_MODEL, _client
+    if api_key is not None:
+        _API_KEY = api_key or None
+    if base_url is not None:
+        _BASE_URL = base_url or None
+    if budget_s is not None:
+        LLM_BUDGET_S = budget_s
+    if max_concurrency is not None:
+        LLM_MAX_CONCURRENCY = max_concurrency
+    if model is not None:
+        OPENAI_MODEL = model
+    _client = None  # rebuilt on next use
+    breaker.reset()
+
+
+def _client_for_loop():
+    global _client, _semaphore, _loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _loop is not loop:
+        # Retries would only eat into the budget
+        _client = AsyncOpenAI(api_key=_API_KEY, base_url=_BASE_URL, timeout=LLM_BUDGET_S, max_retries=0)
+        _semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _pending.clear()
+        _loop = loop
+    return _client, _semaphore
+
+# ============================================================
+# Circuit breaker
+# ============================================================
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+
+
+class CircuitBreaker:
+    """
+    Stops calling the model while it is failing. Closed, every call goes
+    through and its outcome is recorded; once `failure_rate` of the last
+    `window` calls (at least `min_calls`) failed or took longer than
+    `slow_s`, it opens and narratives go straight to the fallback. After
+    `open_s` a background probe is sent (half-open): success closes the
+    breaker, failure keeps it open for another `open_s`. User requests are
+    never used as probes.
+    """
+
+    def __init__(self, window: int = BREAKER_WINDOW, min_calls: int = BREAKER_MIN_CALLS,
+                 failure_rate: float = BREAKER_FAILURE_RATE, slow_s: float = BREAKER_SLOW_S,
+                 open_s: float = BREAKER_OPEN_S):
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_s = slow_s
+        self.open_s = open_s
+        self.reset()
+
+    def reset(self):
+        self.state = CLOSED
+        self._outcomes: "deque[bool]" = deque(maxlen=self.window)  # True = failed
+        self._retry_at = 0.0
+        # a probe still running notices it has been dropped and stops
+        self._probe: Optional["asyncio.Task"] = None
+
+    @property
+    def state_code(self) -> int:
+        return {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}[self.state]
+
+    def allow(self) -> bool:
+        """
+        True if the model may be called now.
+        """
+        if self.state == CLOSED:
+            return True
+        self._ensure_probe()
+        return False
+
+    def record(self, ok: bool, elapsed_s: float = 0.0):
+        if self.state != CLOSED:
+            return  # a call that started before the breaker opened
+        self._outcomes.append(not ok or elapsed_s > self.slow_s)
+        n = len(self._outcomes)
+        if n >= self.min_calls and sum(self._outcomes) >= self.failure_rate * n:
+            self._open()
+
+    def health(self) -> Dict[str, Any]:
+        n = len(self._outcomes)
+        out = {
+            "state": self.state,
+            "failure_rate": round(sum(self._outcomes) / n, 3) if n else 0.0,
+            "calls": n,
+        }
+        if self.state != CLOSED:
+            out["retry_in_s"] = round(max(self._retry_at - time.monotonic(), 0.0), 1)
+        return out
+
+    def _open(self):
+        if self.state != OPEN:
+            incr("llm_circuit_opened")
+            logger.warning("AI narrative: LLM upstream failing, circuit open for %.0fs.", self.open_s)
+        self.state = OPEN
+        self._retry_at = time.monotonic() + self.open_s
+        self._ensure_probe()
+
+    def _close(self):
+        incr("llm_circuit_closed")
+        logger.info("AI narrative: LLM upstream recovered, circuit closed.")
+        self.reset()
+
+    def _ensure_probe(self):
+        # The probe task belongs to the loop that was running when the
+        # breaker opened; if that loop has gone, start another one here
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        probe = self._probe
+        if probe is not None and not probe.done() and probe.get_loop() is loop:
+            return
+        self._probe = loop.create_task(self._run_probe())
+
+    async def _run_probe(self):
+        me = asyncio.current_task()
+        while self.state != CLOSED:
+            await asyncio.sleep(max(self._retry_at - time.monotonic(), 0.0))
+            if self._probe is not me:
+                return
+            self.state = HALF_OPEN
+            incr("llm_circuit_probes")
+            client, _ = _client_for_loop()
+            try:
+                # Costs no tokens and takes no model-specific parameters
+                async with asyncio.timeout(min(LLM_BUDGET_S, self.slow_s)):
+                    await client.models.retrieve(OPENAI_MODEL)
+            except APIStatusError as exc:
+                # 404/405: the upstream is up but doesn't serve /models.
+                # 401/403/429 (bad key, no quota, rate limited) fail every
+                # completion too, so those keep the circuit open.
+                reachable = exc.status_code in (404, 405)
+                failure = exc
+            except Exception as exc:
+                reachable, failure = False, exc
+            else:
+                reachable, failure = True, None
+            if self._probe is not me:
+                return
+            if reachable:
+                self._close()
+            else:
+                logger.info("AI narrative: circuit probe failed (%s).", _describe(failure))
+                self.state = OPEN
+                self._retry_at = time.monotonic() + self.open_s
+
+
+def _describe(exc: BaseException) -> str:
+    # One line for the logs; an upstream outage shouldn't fill them with tracebacks
+    return f"{type(exc).__name__}: {exc}" if str(exc) else type(exc).__name__
+
+
+breaker = CircuitBreaker()
+
+
+def llm_health() -> Dict[str, Any]:
+    """
+    For /healthz: whether a model is configured and the breaker's state.
+    """
+    return {"configured": is_llm_configured(), "circuit": breaker.health()}
 
-# Client uses env var OPENAI_API_KEY
-_client = OpenAI() if _API_KEY else None
 
 DEMO_DISCLAIMER = "DEMONSTRATION ONLY — NOT FOR CLINICAL USE."
 
+# ============================================================
+# Prompt
+# ============================================================
+
+# Bump whenever the prompts below change so cached narratives are not reused
+PROMPT_VERSION = "qtc-narrative-2"
+
+# Everything before the input JSON is the same bytes on every call, so the
+# upstream's prompt caching can reuse it; only the payload at the end varies
+_SYSTEM_PROMPT = (
+    "You are assisting with an ECG INTERVAL INTERPRETATION DEMO. "
+    "You are NOT providing diagnosis. You are NOT screening. "
+    "You are NOT making treatment decisions or management suggestions. "
+    "You ONLY explain the interval and QT/QTc context using neutral, generic language. "
+    "You must never:\n"
+    "- name a specific diagnosis (e.g. bradycardia, long QT syndrome, AV block, myocardial infarction, heart failure, etc.),\n"
+    "- describe risk level (e.g. high risk, low risk, reassuring),\n"
+    "- give any advice about treatment, referral, admission, or emergency care.\n"
+    "You MAY:\n"
+    "- restate the measured values (HR, PR, QRS, QT, RR, QTc),\n"
+    "- state whether they fall within, below, or above the reference ranges used by this tool,\n"
+    "- mention the percentile band provided by the tool,\n"
+    "- use neutral phrases such as 'within the reference range used by this tool' or "
+    "'values outside the reference range are noted for awareness.'\n"
+    "All content must be non-diagnostic and non-directive, suitable for documentation and teaching only."
+)
+
+_USER_PREFIX = (
+    "Summarise the de-identified ECG interval data below as a short, neutral narrative plus key bullet points.\n"
+    "Required output JSON with this exact schema:\n"
+    "{\n"
+    '  "narrative": "one or two sentences of plain English describing the intervals and QTc in relation to the reference ranges used by this tool",\n'
+    '  "key_points": ["short bullet point", "..."],\n'
+    '  "caution_flags": ["if any values lie outside the reference range, you may include a neutral note such as '
+    "'Values outside the reference range are noted for awareness.'\"],\n"
+    '  "disclaimer": "must explicitly state: DEMONSTRATION ONLY — NOT FOR CLINICAL USE."\n'
+    "}\n"
+    "Do NOT include any other top-level fields. "
+    "Do NOT mention diagnosis, prognosis, risk, or treatment.\n"
+    "vs_reference gives each value's position against the reference range used by this tool.\n"
+    "Input JSON:\n"
+)
+
+
+def _prompt_payload(structured: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The part of `structured` the model needs: labels, values to one decimal
+    place and where each sits against its reference range. Missing values
+    and empty fields are left out. Narratives are cached by this too, so
+    requests that only differ elsewhere share one.
+    """
+    def num(v):
+        return None if v is None or v != v else round(float(v), 1)
+
+    intervals = {k: num(v) for k, v in (structured.get("intervals_ms") or {}).items()}
+    flags = structured.get("reference_flags") or {}
+    payload = {
+        "age_band": structured.get("age_band_label"),
+        "sex": structured.get("sex_label"),
+        "intervals_ms": {k: v for k, v in intervals.items() if v is not None},
+        "qtc_ms": num(structured.get("qtc_ms")),
+        "vs_reference": {k: f["position"] for k, f in flags.items() if f.get("position") not in (None, "unknown")},
+        "percentile_band": structured.get("percentile_band"),
+        "red_flags": structured.get("red_flags"),
+        "trend_comment": structured.get("trend_comment"),
+    }
+    return {k: v for k, v in payload.items() if v not in (None, "", [], {})}
+
+
+def _prompts(payload: Dict[str, Any]) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": _USER_PREFIX + narrative_cache.canonical_json(payload)},
+    ]
+
+
+def _cache_key(payload: Dict[str, Any], ref_version: Optional[str]) -> str:
+    return narrative_cache.cache_key(payload, OPENAI_MODEL, PROMPT_VERSION, ref_version)
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 bytes per token for English text and JSON; good enough for
+    # tracking cost trends, and needs no tokenizer
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def _record_tokens(messages: List[Dict[str, str]], completion: str, usage=None) -> Tuple[int, int]:
+    """
+    Count a call's prompt and completion tokens in telemetry, from the
+    API's usage report when it has one, else estimated.
+    """
+    prompt_tokens = getattr(usage, "prompt_tokens", None) or \
+        sum(estimate_tokens(m["content"]) for m in messages)
+    completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(completion)
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    incr("llm_prompt_tokens", prompt_tokens)
+    incr("llm_completion_tokens", completion_tokens)
+    if cached:
+        incr("llm_cached_prompt_tokens", cached)
+    return prompt_tokens, completion_tokens
+
 # ============================================================
 # Guardrail configuration
 # ============================================================
 
 # These are phrases we NEVER want in the narrative because they imply
-# diagnosis, risk, or management. Keep this tight.
+# diagnosis, risk, or management. Keep this tight. Matched case-insensitively
+# anywhere in the text ("discontinue" also catches "discontinued"); a trailing
+# space means whole words only (see term_scanner), so "vt " doesn't hit "pivot".
 BANNED_TERMS = [
     # Explicit diagnoses / conditions
     "long qt syndrome",
@@ -78,21 +388,27 @@ def is_llm_configured() -> bool:
     """
     Returns True only if an OpenAI API key is present.
     """
-    return bool(_API_KEY) and _client is not None
+    return bool(_API_KEY)
+
+
+_BANNED = TermScanner(BANNED_TERMS)
+
+
+def banned_matches(text: str) -> List[Match]:
+    """
+    Every banned phrase in `text`, with where it occurs.
+    """
+    return _BANNED.find_all(text) if text else []
 
 
 def _contains_banned(text: str) -> bool:
     """
-    Very simple substring scanner for obviously banned phrases.
+    Scanner for obviously banned phrases, compiled once from BANNED_TERMS.
     Applied only to the free-text parts of the response.
     """
     if not text:
         return False
-    lowered = text.lower()
-    for term in BANNED_TERMS:
-        if term in lowered:
-            return True
-    return False
+    return _BANNED.search(text) is not None
 
 
 def _deterministic_fallback(structured: Dict[str, Any]) -> Dict[str, Any]:
@@ -145,95 +461,399 @@ def _deterministic_fallback(structured: Dict[str, Any]) -> Dict[str, Any]:
     }
 
 
-def generate_qtc_narrative(structured: Dict[str, Any]) -> Dict[str, Any]:
+@traced("llm.generate_qtc_narrative")
+async def generate_qtc_narrative(structured: Dict[str, Any], ref_version: Optional[str] = None) -> Dict[str, Any]:
     """
     Call OpenAI GPT-5.1 to generate a non-diagnostic narrative for the
     ECG intervals / QTc context we pass in.
 
     `structured` should already be de-identified and purely numeric / categorical.
+    Identical requests (same payload, model, PROMPT_VERSION and reference
+    version) are answered from the narrative cache. At most
+    LLM_MAX_CONCURRENCY calls run at once, and one that can't finish within
+    LLM_BUDGET_S (queueing included) gives the deterministic fallback, as
+    does any request while the circuit breaker is open.
     """
+    return (await _generate(structured, ref_version))[0]
+
+
+async def _generate(structured: Dict[str, Any],
+                    ref_version: Optional[str]) -> Tuple[Dict[str, Any], str, Optional[str]]:
+    # (narrative, source, fallback reason); source is "llm", "cache" or "fallback"
+
     # Fallback if there is no API key configured
     if not is_llm_configured():
         logger.info(
             "AI narrative: using deterministic fallback (no OPENAI_API_KEY or client unavailable)."
         )
-        return _deterministic_fallback(structured)
-
-    # Prompt: strict instructions + JSON response format
-    system_prompt = (
-        "You are assisting with an ECG INTERVAL INTERPRETATION DEMO. "
-        "You are NOT providing diagnosis. You are NOT screening. "
-        "You are NOT making treatment decisions or management suggestions. "
-        "You ONLY explain the interval and QT/QTc context using neutral, generic language. "
-        "You must never:\n"
-        "- name a specific diagnosis (e.g. bradycardia, long QT syndrome, AV block, myocardial infarction, heart failure, etc.),\n"
-        "- describe risk level (e.g. high risk, low risk, reassuring),\n"
-        "- give any advice about treatment, referral, admission, or emergency care.\n"
-        "You MAY:\n"
-        "- restate the measured values (HR, PR, QRS, QT, RR, QTc),\n"
-        "- state whether they fall within, below, or above the reference ranges used by this tool,\n"
-        "- mention the percentile band provided by the tool,\n"
-        "- use neutral phrases such as 'within the reference range used by this tool' or "
-        "'values outside the reference range are noted for awareness.'\n"
-        "All content must be non-diagnostic and non-directive, suitable for documentation and teaching only."
-    )
+        return _deterministic_fallback(structured), "fallback", "not_configured"
+
+    payload = _prompt_payload(structured)
+    cache_key = _cache_key(payload, ref_version)
+    cached = await _cached(cache_key)
+    if cached is not None:
+        return cached, "cache", None
+    if not breaker.allow():
+        incr("llm_circuit_rejected")
+        return _deterministic_fallback(structured), "fallback", "circuit_open"
+
+    # Single flight: identical requests already in progress share one
+    # upstream call. The call runs as its own task so a caller going away
+    # doesn't cancel it for the others.
+    _client_for_loop()
+    task = _pending.get(cache_key)
+    if task is None:
+        task = asyncio.ensure_future(_generate_uncached(structured, payload, cache_key))
+        _pending[cache_key] = task
+        task.add_done_callback(lambda _t: _pending.pop(cache_key, None))
+    else:
+        incr("llm_coalesced")
+    narrative, reason = await asyncio.shield(task)
+    # Each caller gets its own copy; the handler appends to caution_flags
+    return copy.deepcopy(narrative), "llm" if reason is None else "fallback", reason
+
+
+class BatchNarrative(NamedTuple):
+    narrative: Dict[str, Any]
+    source: str                    # "llm", "cache" or "fallback"
+    fallback_reason: Optional[str]
+    duplicate_of: Optional[int]    # index of the identical item answered
+    elapsed_ms: float
+
+
+@traced("llm.generate_narrative_batch")
+async def generate_narrative_batch(items: List[Dict[str, Any]], ref_version: Optional[str] = None,
+                                   max_concurrency: Optional[int] = None) -> List[BatchNarrative]:
+    """
+    Narratives for many payloads, in input order. Identical payloads are
+    generated once and the answer shared. At most `max_concurrency`
+    (default LLM_MAX_CONCURRENCY) items are in progress at a time, and an
+    item's LLM_BUDGET_S starts when it does rather than with the batch, so
+    items waiting their turn don't time out. Each item is guarded and falls
+    back to the deterministic template on its own.
+    """
+    first: Dict[str, int] = {}
+    duplicate_of: List[Optional[int]] = []
+    for i, structured in enumerate(items):
+        j = first.setdefault(narrative_cache.canonical_json(_prompt_payload(structured)), i)
+        duplicate_of.append(None if j == i else j)
+
+    gate = asyncio.Semaphore(max_concurrency or LLM_MAX_CONCURRENCY)
+
+    async def one(i: int) -> BatchNarrative:
+        async with gate:
+            t0 = time.perf_counter()
+            narrative, source, reason = await _generate(items[i], ref_version)
+            return BatchNarrative(narrative, source, reason, None, (time.perf_counter() - t0) * 1000.0)
+
+    unique = list(first.values())
+    done = dict(zip(unique, await asyncio.gather(*(one(i) for i in unique))))
+    incr("llm_batch_duplicates", len(items) - len(unique))
+    return [
+        done[i] if j is None else done[j]._replace(narrative=copy.deepcopy(done[j].narrative), duplicate_of=j)
+        for i, j in enumerate(duplicate_of)
+    ]
 
-    user_prompt = (
-        "You are given de-identified ECG interval data and derived QTc metrics.\n"
-        "Summarise this as a short, neutral narrative plus key bullet points.\n\n"
-        "Input JSON:\n"
-        f"{structured}\n\n"
-        "Required output JSON with this exact schema:\n"
-        "{\n"
-        '  \"narrative\": \"one or two sentences of plain English describing the intervals and QTc in relation to the reference ranges used by this tool\",\n'
-        '  \"key_points\": [\"short bullet point\", \"...\"],\n'
-        '  \"caution_flags\": [\"if any values lie outside the reference range, you may include a neutral note such as '
-        '                        \'Values outside the reference range are noted for awareness.\'\"] ,\n'
-        '  \"disclaimer\": \"must explicitly state: DEMONSTRATION ONLY — NOT FOR CLINICAL USE.\"\n'
-        "}\n"
-        "Do NOT include any other top-level fields. "
-        "Do NOT mention diagnosis, prognosis, risk, or treatment.\n"
-    )
 
+# Model output fields the guardrail scans besides the narrative; the
+# disclaimer is left alone, as it must carry fixed wording
+_SCANNED_FIELDS = ("key_points", "caution_flags")
+
+
+def _scan_text(parsed: Dict[str, Any]) -> str:
+    # Guardrail: scan only the free-text bits
+    return " ".join([
+        parsed.get("narrative") or "",
+        *(" ".join(parsed.get(field) or []) for field in _SCANNED_FIELDS),
+    ])
+
+
+def _checked_result(parsed: Dict[str, Any], structured: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    The model's answer in response shape, or None if the guardrail blocks it.
+    """
+    with span("llm.guardrail_scan"):
+        banned = banned_matches(_scan_text(parsed))
+    if banned:
+        logger.info("AI narrative: banned language detected in LLM output (%s), using fallback.",
+                    ", ".join(sorted({m.term for m in banned})))
+        return None
+
+    # Ensure mandatory fields and disclaimer
+    return {
+        "narrative": parsed.get("narrative") or "",
+        "key_points": parsed.get("key_points") or [],
+        "caution_flags": parsed.get("caution_flags") or [],
+        "disclaimer": parsed.get("disclaimer") or DEMO_DISCLAIMER,
+    }
+
+
+async def _cached(cache_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Cached narrative, re-checked against the current BANNED_TERMS: the
+    cache key doesn't cover the term list, so an entry stored before a
+    term was added is treated as a miss (and overwritten by the next
+    clean answer).
+    """
+    cached = await asyncio.to_thread(narrative_cache.get, cache_key)
+    if cached is None:
+        return None
+    banned = banned_matches(_scan_text(cached))
+    if banned:
+        incr("narrative_cache_banned")
+        logger.info("AI narrative: cached narrative now contains banned language (%s), ignoring it.",
+                    ", ".join(sorted({m.term for m in banned})))
+        return None
+    return cached
+
+
+async def _generate_uncached(structured: Dict[str, Any], payload: Dict[str, Any],
+                             cache_key: str) -> Tuple[Dict[str, Any], Optional[str]]:
+    # (narrative, fallback reason or None)
+    global _inflight
+    client, semaphore = _client_for_loop()
+    messages = _prompts(payload)
+    started = None  # when the upstream call began, once it has
     try:
         logger.info("AI narrative: calling OpenAI model %s", OPENAI_MODEL)
-        resp = _client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.2,
-        )
-        data = resp.choices[0].message.content
-        parsed = json.loads(data)
-
-        # Guardrail: scan only the free-text bits
-        text_for_scan_parts = [
-            parsed.get("narrative") or "",
-            " ".join(parsed.get("key_points") or []),
-            " ".join(parsed.get("caution_flags") or []),
-        ]
-        text_for_scan = " ".join(text_for_scan_parts)
-
-        if _contains_banned(text_for_scan):
-            logger.info("AI narrative: banned language detected in LLM output, using fallback.")
-            return _deterministic_fallback(structured)
-
-        # Ensure mandatory fields and disclaimer
-        narrative = parsed.get("narrative") or ""
-        key_points = parsed.get("key_points") or []
-        caution_flags = parsed.get("caution_flags") or []
-        disclaimer = parsed.get("disclaimer") or DEMO_DISCLAIMER
-
-        return {
-            "narrative": narrative,
-            "key_points": key_points,
-            "caution_flags": caution_flags,
-            "disclaimer": disclaimer,
-        }
+        async with asyncio.timeout(LLM_BUDGET_S):
+            async with semaphore:
+                _inflight += 1
+                try:
+                    started = time.monotonic()
+                    with span("llm.chat_completion", model=OPENAI_MODEL) as sp:
+                        resp = await client.chat.completions.create(
+                            model=OPENAI_MODEL,
+                            messages=messages,
+                            response_format={"type": "json_object"},
+                            temperature=0.2,
+                        )
+                        content = resp.choices[0].message.content
+                        prompt_tokens, completion_tokens = _record_tokens(messages, content or "", resp.usage)
+                        sp.set("prompt_tokens", prompt_tokens)
+                        sp.set("completion_tokens", completion_tokens)
+                finally:
+                    _inflight -= 1
+    except TimeoutError:
+        if started is not None:
+            breaker.record(False)
+        incr("llm_budget_exceeded")
+        logger.warning("AI narrative: no answer within %.1fs, using deterministic fallback.", LLM_BUDGET_S)
+        return _deterministic_fallback(structured), "budget"
+    except Exception as exc:
+        breaker.record(False)
+        incr("llm_errors")
+        logger.warning("AI narrative: OpenAI call failed (%s), using deterministic fallback.", _describe(exc))
+        return _deterministic_fallback(structured), "error"
+    breaker.record(True, time.monotonic() - started)
+    incr("llm_calls")
+
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError) as exc:
+        logger.warning("AI narrative: unusable model output (%s), using deterministic fallback.", _describe(exc))
+        return _deterministic_fallback(structured), "error"
+
+    result = _checked_result(parsed, structured)
+    if result is None:
+        return _deterministic_fallback(structured), "guardrail"
+    await asyncio.to_thread(narrative_cache.put, cache_key, result)
+    return result, None
+
 
+# ============================================================
+# Streaming
+# ============================================================
+
+class _JsonStrings:
+    """
+    Incremental reader for the model's (flat) JSON object. feed() takes raw
+    chunks and returns the decoded string values as they arrive, as
+    (key, text, done) pieces, `done` marking the end of a string. The full
+    object is still parsed with json.loads once complete.
+    """
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self):
+        self._stack: List[str] = []   # open "{" / "["
+        self._in_str = False
+        self._is_key = False
+        self._expect_key = False
+        self._esc: Optional[str] = None  # "" after a backslash, "u..." inside \uXXXX
+        self._high: Optional[int] = None  # first half of a surrogate pair
+        self._chars: List[str] = []
+        self.key: Optional[str] = None    # key of the value being read
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], str, bool]]:
+        out = []
+        for ch in chunk:
+            if not self._in_str:
+                if ch == '"':
+                    self._in_str = True
+                    self._is_key = self._expect_key and self._stack[-1:] == ["{"]
+                    self._expect_key = False
+                elif ch in "{[":
+                    self._stack.append(ch)
+                    self._expect_key = ch == "{"
+                elif ch in "}]":
+                    if self._stack:
+                        self._stack.pop()
+                elif ch == ",":
+                    self._expect_key = self._stack[-1:] == ["{"]
+                continue
+
+            if self._esc is not None:
+                if self._esc == "" and ch == "u":
+                    self._esc = "u"
+                    continue
+                if self._esc == "":
+                    self._esc = None
+                    self._chars.append(self._ESCAPES.get(ch, ch))
+                    continue
+                self._esc += ch
+                if len(self._esc) < 5:
+                    continue
+                code, self._esc = int(self._esc[1:], 16), None
+                if 0xD800 <= code < 0xDC00:
+                    self._high = code
+                    continue
+                if 0xDC00 <= code < 0xE000 and self._high is not None:
+                    code = 0x10000 + ((self._high - 0xD800) << 10) + (code - 0xDC00)
+                self._high = None
+                self._chars.append(chr(code))
+            elif ch == "\\":
+                self._esc = ""
+            elif ch == '"':
+                self._in_str = False
+                text, self._chars = "".join(self._chars), []
+                if self._is_key:
+                    self.key = text
+                else:
+                    out.append((self.key, text, True))
+            else:
+                self._chars.append(ch)
+
+        if self._in_str and not self._is_key and self._chars:
+            out.append((self.key, "".join(self._chars), False))
+            self._chars = []
+        return out
+
+
+async def stream_qtc_narrative(structured: Dict[str, Any],
+                               ref_version: Optional[str] = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of generate_qtc_narrative. Yields ("delta", text) as
+    the narrative arrives, then one ("result", narrative) or ("fallback",
+    narrative) with the complete response; on "fallback" any deltas already
+    shown should be replaced.
+
+    The guardrail runs on the tokens as they arrive: narrative text that
+    could still turn out to be part of a banned term is held back, and the
+    moment one appears anywhere in the output the stream is abandoned and
+    the deterministic fallback sent. Cache, budget and concurrency limit
+    are as for generate_qtc_narrative; streams are not coalesced, as each
+    caller needs its own tokens.
+    """
+    if not is_llm_configured():
+        yield "fallback", _deterministic_fallback(structured)
+        return
+
+    payload = _prompt_payload(structured)
+    cache_key = _cache_key(payload, ref_version)
+    cached = await _cached(cache_key)
+    if cached is not None:
+        yield "result", cached
+        return
+    if not breaker.allow():
+        incr("llm_circuit_rejected")
+        yield "fallback", _deterministic_fallback(structured)
+        return
+
+    global _inflight
+    client, semaphore = _client_for_loop()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + LLM_BUDGET_S
+    messages = _prompts(payload)
+    strings = _JsonStrings()
+    # what the user sees, and the other scanned fields
+    shown, unseen = _BANNED.stream(), _BANNED.stream()
+    raw: List[str] = []
+    stream, acquired = None, False
+    # when the upstream call began, and how long until its first token
+    started = first_token_s = None
+    try:
+        logger.info("AI narrative: streaming from OpenAI model %s", OPENAI_MODEL)
+        await asyncio.wait_for(semaphore.acquire(), deadline - loop.time())
+        acquired = True
+        _inflight += 1
+        started = time.monotonic()
+        with span("llm.chat_completion", model=OPENAI_MODEL, stream=True):
+            stream = await asyncio.wait_for(client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.2,
+                stream=True,
+            ), deadline - loop.time())
+        chunks = stream.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+            except StopAsyncIteration:
+                break
+            if first_token_s is None:
+                first_token_s = time.monotonic() - started
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if not text:
+                continue
+            raw.append(text)
+            for key, piece, done in strings.feed(text):
+                if key == "narrative":
+                    safe = shown.feed(piece) + (shown.close() if done else "")
+                elif key in _SCANNED_FIELDS:
+                    unseen.feed(piece + (" " if done else ""))
+                    safe = ""
+                else:
+                    continue
+                match = shown.match or unseen.match
+                if match is not None:
+                    breaker.record(True, first_token_s)
+                    _record_tokens(messages, "".join(raw))
+                    incr("llm_stream_guardrail_aborts")
+                    logger.info("AI narrative: banned language in streamed LLM output (%s), using fallback.",
+                                match.term)
+                    yield "fallback", _deterministic_fallback(structured)
+                    return
+                if safe:
+                    yield "delta", safe
+        breaker.record(True, first_token_s or 0.0)
+        started = None
+        incr("llm_calls")
+        _record_tokens(messages, "".join(raw))
+        result = _checked_result(json.loads("".join(raw)), structured)
+        if result is None:
+            yield "fallback", _deterministic_fallback(structured)
+            return
+        await asyncio.to_thread(narrative_cache.put, cache_key, result)
+        yield "result", result
+
+    except TimeoutError:
+        if started is not None:
+            breaker.record(False)
+        incr("llm_budget_exceeded")
+        logger.warning("AI narrative: stream not finished within %.1fs, using deterministic fallback.",
+                       LLM_BUDGET_S)
+        yield "fallback", _deterministic_fallback(structured)
     except Exception as exc:
-        logger.exception("AI narrative: OpenAI call failed, using deterministic fallback: %s", exc)
-        return _deterministic_fallback(structured)
+        if started is not None:  # else the model wasn't reached, or its output was unusable
+            breaker.record(False)
+            incr("llm_errors")
+        logger.warning("AI narrative: OpenAI stream failed (%s), using deterministic fallback.", _describe(exc))
+        yield "fallback", _deterministic_fallback(structured)
+    finally:
+        if stream is not None:
+            await stream.close()
+        if acquired:
+            _inflight -= 1
+            semaphore.release()
@@ -1,7 +1,10 @@
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Mapping, NamedTuple, Tuple, Optional, Any
 from math import pow, sqrt
 
-from .references import load_ranges, active_version
+import numpy as np
+
+from .references import ReferencePack, current_pack
+from .tracing import traced
 
 
 # ============================================================
@@ -63,6 +66,12 @@ def hr_from_rr(rr_ms: float) -> float:
     return 60000.0 / rr_ms
 
 
+RATE_WARNING = (
+    "Heart rate outside 60–100 bpm; using Fridericia as primary QTc. "
+    "Bazett tends to over-correct at rate extremes."
+)
+
+
 def compute_qtc_multi(
     qt_ms: float,
     hr_bpm: Optional[float] = None,
@@ -136,10 +145,7 @@ def compute_qtc_multi(
     else:
         primary_formula = "fridericia"
         primary_qtc = frid
-        rate_warning = (
-            "Heart rate outside 60–100 bpm; using Fridericia as primary QTc. "
-            "Bazett tends to over-correct at rate extremes."
-        )
+        rate_warning = RATE_WARNING
 
     result["qtc"]["primary_formula"] = primary_formula
     result["qtc"]["primary_qtc_ms"] = primary_qtc
@@ -152,20 +158,25 @@ def compute_qtc_multi(
 # Reference ranges and percentiles
 # ============================================================
 
-def _range_for(metric: str, age_band: str, sex: str) -> Tuple[float, float]:
-    data = load_ranges(active_version())
-    key = f"{age_band}:{sex}:{metric}"
-    rng = data.get(key)
-    if not rng:
-        return (float("nan"), float("nan"))
-    return (rng.get("low"), rng.get("high"))
+_MISSING_RANGE = (float("nan"), float("nan"))
 
 
-def _percentile_for(metric: str, age_band: str, sex: str) -> Dict[str, float]:
-    data = load_ranges(active_version())
-    key = f"{age_band}:{sex}:{metric}"
-    rng = data.get(key, {})
-    return rng.get("percentiles", {})
+def _range_for(
+    metric: str, age_band: str, sex: str, pack: Optional[ReferencePack] = None
+) -> Tuple[float, float]:
+    rec = (pack or current_pack()).index.get((age_band, sex, metric))
+    if rec is None:
+        return _MISSING_RANGE
+    return (rec.low, rec.high)
+
+
+def _percentile_for(
+    metric: str, age_band: str, sex: str, pack: Optional[ReferencePack] = None
+) -> Mapping[str, float]:
+    rec = (pack or current_pack()).index.get((age_band, sex, metric))
+    if rec is None:
+        return {}
+    return rec.percentiles
 
 
 def assess_interval(metric: str, value: float, low: float, high: float) -> Tuple[str, str]:
@@ -193,14 +204,16 @@ def assess_interval(metric: str, value: float, low: float, high: float) -> Tuple
     return ("GREEN", f"{metric} within {low}–{high}")
 
 
-def percentile_label(qtc: float, age_band: str, sex: str) -> Optional[str]:
+def percentile_label(
+    qtc: float, age_band: str, sex: str, pack: Optional[ReferencePack] = None
+) -> Optional[str]:
     """
     Very lightweight labelling of QTc percentile band based on stored percentiles.
 
     Uses 50th, 90th, and 99th centiles if available and returns one of:
         "<50th", "~50th+", "~95th+", ">=99th"
     """
-    p = _percentile_for("QTc_ms", age_band, sex)
+    p = _percentile_for("QTc_ms", age_band, sex, pack)
     if not p:
         return None
 
@@ -218,6 +231,21 @@ def percentile_label(qtc: float, age_band: str, sex: str) -> Optional[str]:
     return "<50th"
 
 
+def _qtc_thresholds(sex: Optional[str]) -> Tuple[float, float, float, float]:
+    """
+    (short_qt_cutoff, normal_upper, borderline_upper, high_risk) in ms.
+    """
+    sex_norm = (sex or "").strip().lower()
+    if sex_norm.startswith("m"):
+        # Typical adult male thresholds
+        return (350.0, 440.0, 449.0, 500.0)
+    if sex_norm.startswith("f"):
+        # Typical adult female thresholds
+        return (360.0, 460.0, 469.0, 500.0)
+    # Generic thresholds if sex unknown
+    return (350.0, 450.0, 479.0, 500.0)
+
+
 def qtc_classification(qtc_ms: float, sex: Optional[str] = None) -> Dict[str, Any]:
     """
     Classify QTc into clinically meaningful buckets using sex-specific thresholds
@@ -240,25 +268,7 @@ def qtc_classification(qtc_ms: float, sex: Optional[str] = None) -> Dict[str, An
             "thresholds_used": None,
         }
 
-    sex_norm = (sex or "").strip().lower()
-    if sex_norm.startswith("m"):
-        # Typical adult male thresholds
-        short_qt_cutoff = 350.0
-        normal_upper = 440.0
-        borderline_upper = 449.0
-        high_risk = 500.0
-    elif sex_norm.startswith("f"):
-        # Typical adult female thresholds
-        short_qt_cutoff = 360.0
-        normal_upper = 460.0
-        borderline_upper = 469.0
-        high_risk = 500.0
-    else:
-        # Generic thresholds if sex unknown
-        short_qt_cutoff = 350.0
-        normal_upper = 450.0
-        borderline_upper = 479.0
-        high_risk = 500.0
+    short_qt_cutoff, normal_upper, borderline_upper, high_risk = _qtc_thresholds(sex)
 
     short_qt = False
     category: str
@@ -287,12 +297,14 @@ def qtc_classification(qtc_ms: float, sex: Optional[str] = None) -> Dict[str, An
     }
 
 
+@traced("logic.describe_qtc_for_patient")
 def describe_qtc_for_patient(
     qt_ms: float,
     hr_bpm: Optional[float],
     rr_ms: Optional[float],
     age_band: str,
     sex: str,
+    pack: Optional[ReferencePack] = None,
 ) -> Dict[str, Any]:
     """
     High-level helper that pulls together:
@@ -302,15 +314,17 @@ def describe_qtc_for_patient(
         - categorical risk classification.
 
     This is the function you should be using in Tab 1 / Tab 2 rather than
-    hand-rolling QTc logic in the API layer.
+    hand-rolling QTc logic in the API layer. Pass `pack` to pin every
+    lookup to one reference snapshot.
     """
+    pack = pack or current_pack()
     qtc_block = compute_qtc_multi(qt_ms=qt_ms, hr_bpm=hr_bpm, rr_ms=rr_ms)
     primary_qtc = qtc_block["qtc"]["primary_qtc_ms"]
 
-    low, high = _range_for("QTc_ms", age_band, sex)
+    low, high = _range_for("QTc_ms", age_band, sex, pack)
     status, range_msg = assess_interval("QTc_ms", primary_qtc, low, high)
 
-    pct_label = percentile_label(primary_qtc, age_band, sex)
+    pct_label = percentile_label(primary_qtc, age_band, sex, pack)
     classification = qtc_classification(primary_qtc, sex)
 
     return {
@@ -332,10 +346,230 @@ def describe_qtc_for_patient(
     }
 
 
+# ============================================================
+# Vectorised (columnar) QTc engine
+# ============================================================
+
+# Code tables for the integer columns of QtcBatch. A code of -1 means "None"
+# and, because the tables end in None, `TABLE[code]` decodes it directly.
+PRIMARY_FORMULAS: Tuple[Optional[str], ...] = ("bazett", "fridericia", None)
+PERCENTILE_LABELS: Tuple[Optional[str], ...] = ("<50th", "~50th+", "~95th+", ">=99th", None)
+QTC_CATEGORIES: Tuple[str, ...] = (
+    "unknown",
+    "short_qt",
+    "normal",
+    "borderline_prolonged",
+    "prolonged",
+    "high_risk",
+)
+
+
+class QtcBatch(NamedTuple):
+    """
+    Columnar result of compute_qtc_batch; every field is a 1-D array with
+    one entry per input reading.
+    """
+    rr_ms: np.ndarray             # derived RR (NaN where no usable rate)
+    hr_bpm: np.ndarray            # derived HR (NaN where no usable rate)
+    bazett_ms: np.ndarray
+    fridericia_ms: np.ndarray
+    framingham_ms: np.ndarray
+    primary_formula: np.ndarray   # int8 code into PRIMARY_FORMULAS
+    primary_qtc_ms: np.ndarray
+    rate_warning: np.ndarray      # bool; True where RATE_WARNING applies
+    percentile: np.ndarray        # int8 code into PERCENTILE_LABELS
+    category: np.ndarray          # int8 code into QTC_CATEGORIES
+
+
+def _as_float_array(values: Any, n: Optional[int] = None) -> np.ndarray:
+    """
+    Float64 copy of `values`. None entries become 0.0, which the scalar
+    functions treat exactly like None (both fail `not x`).
+    """
+    if values is None:
+        return np.zeros(n or 0, dtype=np.float64)
+    if isinstance(values, np.ndarray):
+        return values.astype(np.float64, copy=False)
+    return np.array([0.0 if v is None else v for v in values], dtype=np.float64)
+
+
+def percentile_codes(
+    qtc_ms: np.ndarray, age_band: str, sex: str, pack: Optional[ReferencePack] = None
+) -> np.ndarray:
+    """
+    Vectorised percentile_label; returns codes into PERCENTILE_LABELS.
+    """
+    p = _percentile_for("QTc_ms", age_band, sex, pack)
+    if not p:
+        return np.full(qtc_ms.shape, -1, dtype=np.int8)
+
+    codes = np.zeros(qtc_ms.shape, dtype=np.int8)
+    # Ascending order so the highest satisfied centile wins, as in the scalar
+    for code, key in ((1, "50"), (2, "90"), (3, "99")):
+        cut = p.get(key)
+        if cut is not None and str(cut) != "nan":
+            codes[qtc_ms >= cut] = code
+    return codes
+
+
+def classification_codes(qtc_ms: np.ndarray, sex: Optional[str] = None) -> np.ndarray:
+    """
+    Vectorised qtc_classification(...)["category"]; codes into QTC_CATEGORIES.
+    """
+    short_qt_cutoff, normal_upper, borderline_upper, high_risk = _qtc_thresholds(sex)
+    return np.select(
+        [
+            np.isnan(qtc_ms),
+            qtc_ms <= short_qt_cutoff,
+            qtc_ms < normal_upper,
+            qtc_ms <= borderline_upper,
+            qtc_ms < high_risk,
+        ],
+        [0, 1, 2, 3, 4],
+        default=5,
+    ).astype(np.int8)
+
+
+@traced("logic.compute_qtc_batch")
+def compute_qtc_batch(
+    qt_ms: Any,
+    rr_ms: Any = None,
+    hr_bpm: Any = None,
+    age_band: Optional[str] = None,
+    sex: Optional[str] = None,
+    pack: Optional[ReferencePack] = None,
+) -> QtcBatch:
+    """
+    compute_qtc_multi + percentile_label + qtc_classification over whole
+    arrays in one pass.
+
+    Per element the result matches the scalar functions exactly, including
+    NaN handling: RR is used where RR > 0, otherwise HR where HR > 0;
+    QT <= 0 or no usable rate gives NaN values and no primary formula.
+    Percentile codes are only computed when `age_band` is given (else -1).
+    """
+    qt = _as_float_array(qt_ms)
+    n = qt.shape[0]
+    rr_in = _as_float_array(rr_ms, n)
+    hr_in = _as_float_array(hr_bpm, n)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        use_rr = rr_in > 0
+        use_hr = ~use_rr & (hr_in > 0)
+        ok = (~(qt <= 0)) & (use_rr | use_hr)
+
+        rr = np.where(use_rr, rr_in, 60000.0 / hr_in)
+        hr = np.where(use_rr, 60000.0 / rr_in, hr_in)
+        rr = np.where(ok, rr, np.nan)
+        hr = np.where(ok, hr, np.nan)
+
+        # qtc_* return NaN for rr <= 0 (e.g. 60000 / inf)
+        rr_s = np.where(rr > 0, rr / 1000.0, np.nan)
+        bazett = np.round(qt / np.sqrt(rr_s), 0)
+        frid = np.round(qt / np.power(rr_s, 1.0 / 3.0), 0)
+        fram = np.round((qt / 1000.0 + 0.154 * (1.0 - rr_s)) * 1000.0, 0)
+
+    in_band = (hr >= 60.0) & (hr <= 100.0)
+    use_bazett = in_band & ~np.isnan(bazett)
+    primary_formula = np.where(ok, np.where(use_bazett, 0, 1), -1).astype(np.int8)
+    primary = np.where(use_bazett, bazett, frid)
+    primary = np.where(ok, primary, np.nan)
+
+    if age_band is not None:
+        pct = percentile_codes(primary, age_band, sex or "", pack)
+    else:
+        pct = np.full(n, -1, dtype=np.int8)
+
+    return QtcBatch(
+        rr_ms=rr,
+        hr_bpm=hr,
+        bazett_ms=bazett,
+        fridericia_ms=frid,
+        framingham_ms=fram,
+        primary_formula=primary_formula,
+        primary_qtc_ms=primary,
+        rate_warning=ok & ~in_band,
+        percentile=pct,
+        category=classification_codes(primary, sex),
+    )
+
+
+@traced("logic.describe_qtc_batch")
+def describe_qtc_batch(
+    qt_ms: List[Optional[float]],
+    hr_bpm: Optional[List[Optional[float]]],
+    rr_ms: Optional[List[Optional[float]]],
+    age_band: str,
+    sex: str,
+    pack: Optional[ReferencePack] = None,
+) -> List[Dict[str, Any]]:
+    """
+    describe_qtc_for_patient for many readings sharing one age_band/sex.
+
+    The numeric work runs through compute_qtc_batch and the reference
+    records are looked up once for the whole group; only the per-reading
+    dict assembly remains a Python loop. Output is identical to calling
+    describe_qtc_for_patient on each reading.
+    """
+    pack = pack or current_pack()
+    n = len(qt_ms)
+    hr_in = hr_bpm if hr_bpm is not None else [None] * n
+    rr_in = rr_ms if rr_ms is not None else [None] * n
+    b = compute_qtc_batch(qt_ms, rr_ms=rr_in, hr_bpm=hr_in, age_band=age_band, sex=sex, pack=pack)
+
+    low, high = _range_for("QTc_ms", age_band, sex, pack)
+    thresholds = dict(zip(
+        ("short_qt_cutoff_ms", "normal_upper_ms", "borderline_upper_ms", "high_risk_ms"),
+        _qtc_thresholds(sex),
+    ))
+
+    out: List[Dict[str, Any]] = []
+    columns = zip(
+        qt_ms, hr_in, rr_in,
+        b.rr_ms.tolist(), b.hr_bpm.tolist(),
+        b.bazett_ms.tolist(), b.fridericia_ms.tolist(), b.framingham_ms.tolist(),
+        b.primary_formula.tolist(), b.primary_qtc_ms.tolist(), b.rate_warning.tolist(),
+        b.percentile.tolist(), b.category.tolist(),
+    )
+    for qt, hr, rr, d_rr, d_hr, baz, frid, fram, formula, primary, warn, pct, cat in columns:
+        formula_name = PRIMARY_FORMULAS[formula]
+        status, range_msg = assess_interval("QTc_ms", primary, low, high)
+        out.append({
+            "input": {"qt_ms": qt, "hr_bpm": hr, "rr_ms": rr},
+            "derived": {"rr_ms": d_rr, "hr_bpm": d_hr} if formula_name else {},
+            "qtc": {
+                "primary_formula": formula_name,
+                "primary_qtc_ms": primary,
+                "bazett_ms": baz,
+                "fridericia_ms": frid,
+                "framingham_ms": fram,
+                "rate_warning": RATE_WARNING if warn else None,
+            },
+            "range_assessment": {
+                "status": status,
+                "message": range_msg,
+                "reference_low_ms": low,
+                "reference_high_ms": high,
+            },
+            "percentile": {
+                "label": PERCENTILE_LABELS[pct],
+                "age_band": age_band,
+                "sex": sex,
+            },
+            "classification": {
+                "category": QTC_CATEGORIES[cat],
+                "short_qt": cat == 1,
+                "thresholds_used": dict(thresholds) if cat else None,
+            },
+        })
+    return out
+
+
 # ============================================================
 # Red-flag heuristics (educational, non-diagnostic)
 # ============================================================
 
+@traced("logic.red_flags")
 def red_flags(payload: Dict) -> List[str]:
     """
     Very simple, explicitly non-diagnostic red-flagging.
@@ -90,6 +90,14 @@ class ScoreResponse(BaseModel):
     disclaimer: str
 
 
+class ScoreBatchResponse(BaseModel):
+    results: List[ScoreResponse]            # same order as the request items
+    count: int
+    ref_version: Optional[str] = None
+    elapsed_ms: float
+    records_per_s: float
+
+
 class TrendReading(BaseModel):
     timestamp: datetime
     QT_ms: float
@@ -101,6 +109,9 @@ class TrendSeriesRequest(BaseModel):
     sex: Sex
     qtc_method: QTcMethod = "auto"
     readings: List[TrendReading]
+    # Downsample long series to about this many points (high-risk points
+    # and category changes are always kept)
+    max_points: Optional[int] = Field(default=None, ge=16)
 
 
 class TrendPoint(BaseModel):
@@ -114,14 +125,24 @@ class TrendPoint(BaseModel):
 class TrendSeriesResponse(BaseModel):
     series: List[TrendPoint]
     bands: Dict[str, List[Dict[str, float]]]
+    total_points: Optional[int] = None  # before downsampling
     disclaimer: str
 
 
 class ImportJob(BaseModel):
     job_id: str
     format: Literal["CSV", "JSON"]
-    status: Literal["PENDING", "COMPLETED", "FAILED"]
+    status: Literal["PENDING", "RUNNING", "COMPLETED", "FAILED"]
     errors: List[str] = Field(default_factory=list)
+    progress: float = 0.0  # fraction of the upload parsed
+    rows: int = 0
+    error_count: int = 0
+    age_band: Optional[str] = None
+    sex: Optional[Sex] = None
+    series_id: Optional[str] = None
+    created_at: Optional[datetime] = None
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 class AuditEntry(BaseModel):
@@ -133,9 +154,27 @@ class AuditEntry(BaseModel):
     prev_hash: str
 
 
+class LatencyStats(BaseModel):
+    count: int = 0
+    mean: Optional[float] = None
+    p50: Optional[float] = None
+    p95: Optional[float] = None
+    p99: Optional[float] = None
+    max: Optional[float] = None
+
+
+class LatencySummary(LatencyStats):
+    # Same statistics restricted to the last `window_s` seconds
+    window: LatencyStats
+    window_s: float
+
+
 class MetricsResponse(BaseModel):
     counters: Dict[str, int]
-    timings_ms: Dict[str, float]
+    timings_ms: Dict[str, float]                     # last sample per timer
+    gauges: Dict[str, float] = Field(default_factory=dict)  # sampled at request time
+    latency_ms: Dict[str, LatencySummary] = Field(default_factory=dict)
+    workers: int = 1                                 # worker stores aggregated
 
 class NarrativeRequest(BaseModel):
     age_band: str
@@ -152,3 +191,21 @@ class NarrativeResponse(BaseModel):
     key_points: List[str]
     caution_flags: List[str]
     disclaimer: str
+
+
+class NarrativeBatchItem(NarrativeResponse):
+    source: Literal["llm", "cache", "fallback"]
+    # why the deterministic template was used: not_configured,
+    # circuit_open, budget, guardrail or error
+    fallback_reason: Optional[str] = None
+    duplicate_of: Optional[int] = None  # index of the identical item answered
+    elapsed_ms: float
+
+
+class NarrativeBatchResponse(BaseModel):
+    results: List[NarrativeBatchItem]   # same order as the request items
+    count: int
+    unique: int                         # distinct payloads generated
+    sources: Dict[str, int]             # count per source
+    ref_version: Optional[str] = None
+    elapsed_ms: float
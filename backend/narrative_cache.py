@@ -0,0 +1,153 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+from .telemetry import incr
+from .tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# On-disk cache of LLM narratives, shared by every uvicorn worker on the host
+# and kept across restarts. Only genuine model output is cached; fallbacks
+# are cheap and caching them would pin a transient failure.
+CACHE_PATH = os.environ.get("ECG_NARRATIVE_CACHE_PATH", "narratives.db")
+TTL_S = float(os.environ.get("ECG_NARRATIVE_CACHE_TTL_S", str(7 * 86400)))
+MAX_BYTES = int(os.environ.get("ECG_NARRATIVE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# last_used is only rewritten when older than this, so hits stay read-only
+TOUCH_EVERY_S = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS narratives (
+    key       TEXT    PRIMARY KEY,  -- sha256 of the canonical request, see cache_key
+    value     TEXT    NOT NULL,     -- JSON narrative
+    size      INTEGER NOT NULL,
+    created   REAL    NOT NULL,
+    last_used REAL    NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS narratives_last_used ON narratives (last_used);
+-- running total of narratives.size, kept by the triggers below so a write
+-- doesn't have to SUM the table
+CREATE TABLE IF NOT EXISTS narratives_bytes (total INTEGER NOT NULL);
+CREATE TRIGGER IF NOT EXISTS narratives_bytes_ins AFTER INSERT ON narratives
+BEGIN UPDATE narratives_bytes SET total = total + NEW.size; END;
+CREATE TRIGGER IF NOT EXISTS narratives_bytes_del AFTER DELETE ON narratives
+BEGIN UPDATE narratives_bytes SET total = total - OLD.size; END;
+CREATE TRIGGER IF NOT EXISTS narratives_bytes_upd AFTER UPDATE OF size ON narratives
+BEGIN UPDATE narratives_bytes SET total = total + NEW.size - OLD.size; END;
+-- caches created before the total existed are counted once
+INSERT INTO narratives_bytes SELECT COALESCE(SUM(size), 0) FROM narratives
+WHERE NOT EXISTS (SELECT 1 FROM narratives_bytes);
+"""
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == CACHE_PATH:
+        return conn
+    conn = sqlite3.connect(CACHE_PATH, timeout=5.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript("BEGIN IMMEDIATE;" + _SCHEMA + "COMMIT;")
+    _local.conn, _local.path = conn, CACHE_PATH
+    return conn
+
+
+def canonical_json(obj: Any) -> str:
+    """
+    One byte-exact serialisation per logical value: sorted keys, no
+    whitespace, and floats that are whole numbers written as ints (so
+    400 and 400.0 hash the same).
+    """
+    def norm(v):
+        if isinstance(v, float) and v.is_integer():
+            return int(v)
+        if isinstance(v, dict):
+            return {str(k): norm(x) for k, x in v.items()}
+        if isinstance(v, (list, tuple)):
+            return [norm(x) for x in v]
+        return v
+
+    return json.dumps(norm(obj), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def cache_key(structured: Dict[str, Any], model: str, prompt_version: str,
+              ref_version: Optional[str]) -> str:
+    body = canonical_json({
+        "payload": structured,
+        "model": model,
+        "prompt_version": prompt_version,
+        "ref_version": ref_version,
+    })
+    return hashlib.sha256(body.encode("utf-8")).hexdigest()
+
+
+@traced("narrative_cache.get")
+def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Cached narrative for `key`, or None if absent or older than TTL_S.
+    Never raises: a broken cache just means calling the model.
+    """
+    now = time.time()
+    try:
+        conn = _connect()
+        row = conn.execute(
+            "SELECT value, last_used FROM narratives WHERE key = ? AND created > ?",
+            (key, now - TTL_S),
+        ).fetchone()
+        if row is None:
+            incr("narrative_cache_misses")
+            return None
+        if now - row[1] > TOUCH_EVERY_S:
+            conn.execute("UPDATE narratives SET last_used = ? WHERE key = ?", (now, key))
+    except sqlite3.Error as exc:
+        logger.warning("Narrative cache read failed: %s", exc)
+        return None
+    incr("narrative_cache_hits")
+    return json.loads(row[0])
+
+
+@traced("narrative_cache.put")
+def put(key: str, narrative: Dict[str, Any]):
+    """
+    Store a narrative, then drop expired entries and, past MAX_BYTES, the
+    least recently used ones.
+    """
+    value = json.dumps(narrative, ensure_ascii=False)
+    now = time.time()
+    try:
+        conn = _connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # an upsert rather than INSERT OR REPLACE: REPLACE's implicit
+            # delete doesn't fire triggers, which would skew the total
+            conn.execute(
+                "INSERT INTO narratives VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, created = excluded.created, "
+                "last_used = excluded.last_used",
+                (key, value, len(value), now, now),
+            )
+            conn.execute("DELETE FROM narratives WHERE created <= ?", (now - TTL_S,))
+            total = conn.execute("SELECT total FROM narratives_bytes").fetchone()[0]
+            if total > MAX_BYTES:
+                evicted = _evict(conn, total - MAX_BYTES)
+                incr("narrative_cache_evictions", evicted)
+    except sqlite3.Error as exc:
+        logger.warning("Narrative cache write failed: %s", exc)
+
+
+def _evict(conn: sqlite3.Connection, excess: int) -> int:
+    freed, keys = 0, []
+    for key, size in conn.execute("SELECT key, size FROM narratives ORDER BY last_used"):
+        keys.append((key,))
+        freed += size
+        if freed >= excess:
+            break
+    conn.executemany("DELETE FROM narratives WHERE key = ?", keys)
+    return len(keys)
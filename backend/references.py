@@ -1,7 +1,9 @@
 import json
 import os
 import logging
-from typing import Dict, Any, List
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Dict, List, Mapping, NamedTuple, Optional, Tuple
 from functools import lru_cache
 
 logger = logging.getLogger(__name__)
@@ -14,6 +16,10 @@ DEFAULT_BASE_PATH = os.path.join(
 )
 BASE_PATH = os.environ.get("ECG_REF_BASE_PATH", DEFAULT_BASE_PATH)
 
+# How often (seconds) the pack watcher polls the pack directory for changes.
+# Request-path lookups never touch the filesystem.
+VERSION_RECHECK_S = float(os.environ.get("ECG_REF_RECHECK_S", "5"))
+
 
 def _pack_dir(version: str) -> str:
     """
@@ -70,6 +76,45 @@ def load_metadata(version: str) -> Dict[str, Any]:
         return {}
 
 
+class RangeRecord(NamedTuple):
+    """
+    Immutable, pre-compiled reference entry for one age_band × sex × metric.
+    """
+    low: Any
+    high: Any
+    percentiles: Mapping[str, Any]
+
+
+IndexKey = Tuple[str, str, str]  # (age_band, sex, metric)
+
+_EMPTY_PERCENTILES: Mapping[str, Any] = MappingProxyType({})
+
+
+def compile_index(ranges: Dict[str, Any]) -> Mapping[IndexKey, RangeRecord]:
+    """
+    Turn the flat "<age_band>:<sex>:<metric>" dict from ranges.json into a
+    read-only mapping keyed by (age_band, sex, metric) tuples.
+
+    Malformed keys (not exactly three ":"-separated parts) or non-dict
+    entries are skipped with a warning rather than failing the whole pack.
+    """
+    index: Dict[IndexKey, RangeRecord] = {}
+    for key, rng in ranges.items():
+        if not rng:
+            continue
+        parts = key.split(":")
+        if len(parts) != 3 or not isinstance(rng, dict):
+            logger.warning("Skipping malformed reference entry %r", key)
+            continue
+        pct = rng.get("percentiles")
+        index[(parts[0], parts[1], parts[2])] = RangeRecord(
+            low=rng.get("low"),
+            high=rng.get("high"),
+            percentiles=MappingProxyType(dict(pct)) if pct else _EMPTY_PERCENTILES,
+        )
+    return MappingProxyType(index)
+
+
 def list_versions() -> Dict[str, List[str]]:
     """
     Return all available reference-pack versions as a sorted list.
@@ -85,9 +130,9 @@ def list_versions() -> Dict[str, List[str]]:
     return {"versions": versions}
 
 
-def active_version() -> str:
+def _resolve_active_version(env_ver: Optional[str]) -> str:
     """
-    Determine the active reference version.
+    Determine the active reference version from disk.
 
     Priority:
       1) ECG_REF_VERSION env var, if it exists AND is a known version
@@ -97,7 +142,6 @@ def active_version() -> str:
     This keeps you safe if someone sets a junk env var or if new
     reference packs are added over time.
     """
-    env_ver = os.environ.get("ECG_REF_VERSION")
     versions_info = list_versions()
     versions = versions_info.get("versions", [])
 
@@ -111,3 +155,246 @@ def active_version() -> str:
 
     # Absolute fallback: keep old behaviour for very early/demo setups
     return env_ver or "1.0.0"
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def validate_ranges(ranges: Any) -> List[str]:
+    """
+    Sanity-check a parsed ranges.json before it is allowed to go live.
+    Returns a list of problems (empty if the pack is usable).
+    """
+    if not isinstance(ranges, dict):
+        return ["ranges.json must be a JSON object"]
+    problems: List[str] = []
+    for key, rng in ranges.items():
+        if len(key.split(":")) != 3:
+            problems.append(f"{key}: key must be <age_band>:<sex>:<metric>")
+            continue
+        if not isinstance(rng, dict):
+            problems.append(f"{key}: entry must be an object")
+            continue
+        low, high = rng.get("low"), rng.get("high")
+        for name, val in (("low", low), ("high", high)):
+            if val is not None and not isinstance(val, (int, float)):
+                problems.append(f"{key}: {name} must be numeric")
+        if isinstance(low, (int, float)) and isinstance(high, (int, float)) and low > high:
+            problems.append(f"{key}: low > high")
+        pct = rng.get("percentiles") or {}
+        if not isinstance(pct, dict) or any(
+            v is not None and not isinstance(v, (int, float)) for v in pct.values()
+        ):
+            problems.append(f"{key}: percentiles must map centile -> number")
+    return problems
+
+
+class ReferencePack(NamedTuple):
+    """
+    One fully loaded, validated and compiled reference pack.
+
+    Snapshots are never mutated; a reload builds a new one and swaps it in,
+    so a request that grabs current_pack() once sees a single version
+    throughout.
+    """
+    version: str
+    ranges: Mapping[str, Any]
+    metadata: Mapping[str, Any]
+    index: Mapping[IndexKey, RangeRecord]
+
+
+def _stat_key(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class ReferencePackManager:
+    """
+    Owns the live ReferencePack and swaps it atomically on change.
+
+    A background thread (start/stop) polls the pack directory every
+    `poll_s` seconds. When the resolved version or the active pack's files
+    change, the new pack is loaded, validated and compiled on that thread,
+    then published with a single reference assignment. Readers only ever do
+    an attribute read, so a reload costs them nothing.
+    """
+
+    def __init__(self, poll_s: float = VERSION_RECHECK_S):
+        self.poll_s = poll_s
+        self._pack: Optional[ReferencePack] = None
+        self._fingerprint: Optional[Tuple[Any, ...]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._listeners: List[Callable[[ReferencePack], None]] = []
+
+    # ---- read path ----
+
+    def current(self) -> ReferencePack:
+        pack = self._pack
+        if pack is None:
+            with self._lock:
+                if self._pack is None:
+                    self._swap(*self._build(self._resolve()))
+                pack = self._pack
+        return pack
+
+    # ---- change detection / loading (never called per request) ----
+
+    def _resolve(self) -> Tuple[Tuple[Any, ...], str]:
+        env_ver = os.environ.get("ECG_REF_VERSION")
+        version = _resolve_active_version(env_ver)
+        pack_dir = _pack_dir(version)
+        fingerprint = (
+            env_ver,
+            BASE_PATH,
+            _stat_key(BASE_PATH),
+            version,
+            _stat_key(os.path.join(pack_dir, "ranges.json")),
+            _stat_key(os.path.join(pack_dir, "metadata.json")),
+        )
+        return fingerprint, version
+
+    def _build(self, resolved: Tuple[Tuple[Any, ...], str]) -> Tuple[Tuple[Any, ...], Optional[ReferencePack]]:
+        fingerprint, version = resolved
+        pack_dir = _pack_dir(version)
+        ranges_path = os.path.join(pack_dir, "ranges.json")
+        meta_path = os.path.join(pack_dir, "metadata.json")
+
+        try:
+            ranges = _read_json(ranges_path)
+        except FileNotFoundError:
+            # e.g. a new pack directory whose files haven't been copied in yet
+            logger.error("Reference pack %s rejected: ranges.json not found at %s", version, ranges_path)
+            return fingerprint, None
+        except Exception as exc:
+            logger.error("Reference pack %s rejected: unreadable ranges.json (%s)", version, exc)
+            return fingerprint, None
+        if not ranges:
+            logger.error("Reference pack %s rejected: ranges.json is empty", version)
+            return fingerprint, None
+
+        problems = validate_ranges(ranges)
+        if problems:
+            logger.error(
+                "Reference pack %s rejected: %d problem(s), first: %s",
+                version, len(problems), problems[0],
+            )
+            return fingerprint, None
+
+        try:
+            metadata = _read_json(meta_path)
+        except FileNotFoundError:
+            logger.warning("metadata.json not found for version %s at %s", version, meta_path)
+            metadata = {}
+        except Exception as exc:
+            logger.warning("Failed to load metadata for version %s: %s", version, exc)
+            metadata = {}
+
+        pack = ReferencePack(
+            version=version,
+            ranges=MappingProxyType(ranges),
+            metadata=MappingProxyType(metadata if isinstance(metadata, dict) else {}),
+            index=compile_index(ranges),
+        )
+        return fingerprint, pack
+
+    def _swap(self, fingerprint: Tuple[Any, ...], pack: Optional[ReferencePack]) -> None:
+        self._fingerprint = fingerprint
+        if pack is None:
+            if self._pack is not None:
+                return  # keep serving the last good pack
+            # Nothing usable on disk at all: keep the old empty-pack behaviour
+            pack = ReferencePack(fingerprint[3], _EMPTY_PERCENTILES, _EMPTY_PERCENTILES, MappingProxyType({}))
+        previous = self._pack
+        self._pack = pack
+        load_ranges.cache_clear()
+        load_metadata.cache_clear()
+        if previous is None or previous.version != pack.version:
+            logger.info("Reference pack %s is now active", pack.version)
+        else:
+            logger.info("Reference pack %s reloaded", pack.version)
+        for listener in list(self._listeners):
+            try:
+                listener(pack)
+            except Exception:
+                logger.exception("Reference pack listener failed")
+
+    def poll(self) -> bool:
+        """
+        Check for changes and swap in a new pack if needed.
+        Returns True if a new pack was published.
+        """
+        with self._lock:
+            resolved = self._resolve()
+            if self._pack is not None and resolved[0] == self._fingerprint:
+                return False
+            before = self._pack
+            self._swap(*self._build(resolved))
+            return self._pack is not before
+
+    def reload(self) -> ReferencePack:
+        """
+        Unconditionally rebuild from disk (e.g. admin-triggered reload).
+        """
+        with self._lock:
+            self._swap(*self._build(self._resolve()))
+        return self.current()
+
+    def on_swap(self, listener: Callable[[ReferencePack], None]) -> None:
+        """
+        Register a callback invoked (on the loader thread) after each swap.
+        """
+        self._listeners.append(listener)
+
+    # ---- background watcher ----
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_s):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception("Reference pack poll failed")
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ref-pack-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_s + 1.0)
+            self._thread = None
+
+
+manager = ReferencePackManager()
+
+
+def current_pack() -> ReferencePack:
+    """
+    The live reference snapshot. Grab it once per request and pass it down.
+    """
+    return manager.current()
+
+
+def active_version() -> str:
+    return manager.current().version
+
+
+def active_index() -> Mapping[IndexKey, RangeRecord]:
+    return manager.current().index
+
+
+def reload() -> str:
+    """
+    Re-read the pack directory and publish the result; returns the version.
+    """
+    return manager.reload().version
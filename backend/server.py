@@ -1,21 +1,42 @@
-from fastapi import FastAPI, Header, HTTPException, UploadFile, File, Request
+from fastapi import FastAPI, Header, HTTPException, UploadFile, File, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import TypeAdapter, ValidationError
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import io
+import json
 import os
+import time
+
+import numpy as np
 
 # --- Models ---
 from .models import (
-    ScoreRequest, ScoreResponse,
+    ScoreRequest, ScoreResponse, ScoreBatchResponse,
     TrendSeriesRequest, TrendSeriesResponse,
-    MetricsResponse,
-    NarrativeRequest, NarrativeResponse,
+    MetricsResponse, ImportJob, Sex,
+    NarrativeRequest, NarrativeResponse, NarrativeBatchResponse,
 )
 
 # --- RBAC, Audit, Telemetry ---
 from .rbac import role_from_token
-from .audit import write_event
-from .telemetry import incr, time_block, snapshot
+from .audit import (
+    write_event,
+    writer as audit_writer,
+    verify as verify_audit,
+    iter_events,
+    read_events,
+)
+from .telemetry import incr, time_block, snapshot, prometheus_text, register_gauge
+from .cache import LRUCache
+from .tracing import TracingMiddleware, span, start_exporter, stop_exporter
+from . import jobs as import_jobs
+from . import store as reading_store
+from . import trends
 
 # --- Core Logic ---
 from .logic import (
@@ -23,22 +44,32 @@ from .logic import (
     _range_for,
     assess_interval,
     red_flags,
-    percentile_label,
     _percentile_for,
-    compute_qtc_multi,
+    compute_qtc_batch,
     describe_qtc_for_patient,
-    qtc_classification,
+    describe_qtc_batch,
+    PERCENTILE_LABELS,
+    QTC_CATEGORIES,
 )
 
 # --- References ---
-from .references import active_version, load_ranges, load_metadata, list_versions
+from .references import (
+    current_pack,
+    load_ranges,
+    load_metadata,
+    list_versions,
+    manager as reference_manager,
+    reload as reload_references,
+)
 
 # --- Adapters ---
-from .adapters.csv_adapter import load_csv
-from .adapters.json_adapter import load_json
+from .adapters.csv_adapter import iter_csv
+from .adapters.json_adapter import iter_json
 
 # --- LLM Client ---
-from .llm_client import generate_qtc_narrative, is_llm_configured
+from .llm_client import (
+    generate_narrative_batch, generate_qtc_narrative, is_llm_configured, llm_health, stream_qtc_narrative,
+)
 
 
 AGE_BAND_LABELS = {
@@ -81,7 +112,22 @@ def _qtc_reliability_note(hr_bpm: Optional[float]) -> Optional[str]:
     return None
 
 
-app = FastAPI(title="ECG-Assist Platform API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    reference_manager.current()  # load the pack before the first request
+    reference_manager.start()
+    audit_writer.start()
+    start_exporter()
+    try:
+        yield
+    finally:
+        import_jobs.shutdown()  # finish running jobs; their audit events go below
+        audit_writer.stop()  # drains queued events before exit
+        stop_exporter()
+        reference_manager.stop()
+
+
+app = FastAPI(title="ECG-Assist Platform API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -96,6 +142,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so the root span covers body parsing and validation too
+app.add_middleware(TracingMiddleware)
+
 DEMO_DISCLAIMER = "DEMONSTRATION ONLY — SYNTHETIC DATA — NOT FOR CLINICAL USE."
 
 
@@ -113,60 +162,122 @@ def require_role(token: Optional[str], allowed):
 
 @app.get("/healthz")
 def healthz():
-    return {"ok": True, "version": app.version}
+    # Narratives degrade to the deterministic template while the LLM
+    # circuit is open, so that doesn't make the API unhealthy
+    return {"ok": True, "version": app.version, "llm": llm_health()}
 
 
 # ============================================================
 #   /guardrail/score
 # ============================================================
-@app.post("/guardrail/score", response_model=ScoreResponse)
-def score(req: ScoreRequest, authorization: Optional[str] = Header(default=None)):
-    role = require_role(authorization, ["admin", "clinician", "observer"])
+SCORE_METRICS = ("HR_bpm", "PR_ms", "QRS_ms", "QTc_ms")
+SCORE_BATCH_MAX = int(os.environ.get("ECG_SCORE_BATCH_MAX", "50000"))
+_SCORE_LIST = TypeAdapter(List[ScoreRequest])
 
-    with time_block("score_ms"):
-        vr = active_version()
 
-        # --- QTc summary ---
-        qtc_summary = describe_qtc_for_patient(
-            qt_ms=req.intervals.QT_ms,
-            hr_bpm=None,
-            rr_ms=req.intervals.RR_ms,
-            age_band=req.age_band,
-            sex=req.sex,
-        )
-        primary_qtc = qtc_summary["qtc"]["primary_qtc_ms"]
+def _score_result(
+    req: ScoreRequest,
+    qtc_summary: dict,
+    ranges: Dict[str, tuple],
+    ref_version: str,
+) -> dict:
+    """
+    Assemble one ScoreResponse body from a QTc summary and the (low, high)
+    reference range of each metric in SCORE_METRICS.
+    """
+    primary_qtc = qtc_summary["qtc"]["primary_qtc_ms"]
+
+    # --- HR / PR / QRS / QTc assessments ---
+    assessments = []
+
+    for metric in ["HR_bpm", "PR_ms", "QRS_ms"]:
+        val = getattr(req.intervals, metric, None)
+        low, high = ranges[metric]
+        status, rationale = assess_interval(metric, val, low, high)
+        assessments.append({"metric": metric, "status": status, "rationale": rationale})
 
-        # --- HR / PR / QRS / QTc assessments ---
-        assessments = []
+    if primary_qtc and str(primary_qtc) != "nan":
+        low, high = ranges["QTc_ms"]
+        status, rationale = assess_interval("QTc_ms", primary_qtc, low, high)
+        class_label = qtc_summary["classification"].get("category")
+        if class_label and status != "GREEN":
+            rationale = f"{rationale} (classification: {class_label})"
 
-        for metric in ["HR_bpm", "PR_ms", "QRS_ms"]:
-            val = getattr(req.intervals, metric, None)
-            low, high = _range_for(metric, req.age_band, req.sex)
-            status, rationale = assess_interval(metric, val, low, high)
-            assessments.append({"metric": metric, "status": status, "rationale": rationale})
+        assessments.append({"metric": "QTc_ms", "status": status, "rationale": rationale})
 
-        if primary_qtc and str(primary_qtc) != "nan":
-            low, high = _range_for("QTc_ms", req.age_band, req.sex)
-            status, rationale = assess_interval("QTc_ms", primary_qtc, low, high)
-            qt_class = qtc_classification(primary_qtc, req.sex)
-            class_label = qt_class.get("category")
-            if class_label and status != "GREEN":
-                rationale = f"{rationale} (classification: {class_label})"
+    payload = {
+        "QTc_ms": primary_qtc,
+        "PR_ms": req.intervals.PR_ms,
+        "QRS_ms": req.intervals.QRS_ms,
+    }
+    flags = red_flags(payload)
 
-            assessments.append({"metric": "QTc_ms", "status": status, "rationale": rationale})
+    pct_label = (
+        qtc_summary["percentile"]["label"]
+        if qtc_summary.get("percentile")
+        else None
+    )
 
-        payload = {
+    return {
+        "computed": {
             "QTc_ms": primary_qtc,
-            "PR_ms": req.intervals.PR_ms,
-            "QRS_ms": req.intervals.QRS_ms,
-        }
-        flags = red_flags(payload)
+            "percentile": pct_label,
+            "ref_version": ref_version,
+            "qtc_detail": qtc_summary,
+        },
+        "assessments": assessments,
+        "red_flags": flags,
+        "disclaimer": DEMO_DISCLAIMER,
+    }
 
-        pct_label = (
-            qtc_summary["percentile"]["label"]
-            if qtc_summary.get("percentile")
-            else None
-        )
+# Identical requests (ward polling, retries, several viewers) are served
+# from here; cleared whenever the reference pack changes
+SCORE_CACHE_SIZE = int(os.environ.get("ECG_SCORE_CACHE_SIZE", "4096"))
+SCORE_CACHE_TTL_S = float(os.environ.get("ECG_SCORE_CACHE_TTL_S", "300"))
+_score_cache = LRUCache(SCORE_CACHE_SIZE, name="score", ttl_s=SCORE_CACHE_TTL_S)
+reference_manager.on_swap(lambda _pack: _score_cache.clear())
+register_gauge("score_cache_entries", lambda: len(_score_cache))
+
+
+def _score_key(req: ScoreRequest, ref_version: str) -> tuple:
+    # float() so 400 and 400.0 share an entry. qtc_method isn't used by
+    # the scoring logic, so it isn't part of the key.
+    iv = req.intervals
+    return (
+        req.age_band,
+        req.sex,
+        tuple(None if v is None else float(v) for v in (iv.HR_bpm, iv.PR_ms, iv.QRS_ms, iv.QT_ms, iv.RR_ms)),
+        ref_version,
+    )
+
+
+@app.post("/guardrail/score", response_model=ScoreResponse)
+def score(req: ScoreRequest, authorization: Optional[str] = Header(default=None)):
+    role = require_role(authorization, ["admin", "clinician", "observer"])
+
+    with time_block("score_ms"), span("handler"):
+        # One snapshot for the whole request so a pack swap can't mix versions
+        pack = current_pack()
+        vr = pack.version
+
+        key = _score_key(req, vr)
+        result = _score_cache.get(key)
+        if result is None:
+            # --- QTc summary ---
+            qtc_summary = describe_qtc_for_patient(
+                qt_ms=req.intervals.QT_ms,
+                hr_bpm=None,
+                rr_ms=req.intervals.RR_ms,
+                age_band=req.age_band,
+                sex=req.sex,
+                pack=pack,
+            )
+
+            with span("references.lookup", ref_version=vr):
+                ranges = {m: _range_for(m, req.age_band, req.sex, pack) for m in SCORE_METRICS}
+            with span("score.assemble"):
+                result = _score_result(req, qtc_summary, ranges, vr)
+            _score_cache.put(key, result)
 
         write_event(
             user_id=role,
@@ -175,66 +286,273 @@ def score(req: ScoreRequest, authorization: Optional[str] = Header(default=None)
         )
         incr("score_requests")
 
-        return {
-            "computed": {
-                "QTc_ms": primary_qtc,
-                "percentile": pct_label,
-                "ref_version": vr,
-                "qtc_detail": qtc_summary,
+        return result
+
+
+@app.post("/guardrail/score/batch", response_model=ScoreBatchResponse)
+async def score_batch(request: Request, authorization: Optional[str] = Header(default=None)):
+    """
+    Score many interval sets in one call.
+
+    Body is either a JSON array of ScoreRequest objects or, with
+    Content-Type application/x-ndjson, one ScoreRequest per line.
+    Results come back in input order.
+    """
+    role = require_role(authorization, ["admin", "clinician", "observer"])
+    body = await request.body()
+    with span("score_batch.parse", bytes=len(body)):
+        items = _parse_score_batch(body, request.headers.get("content-type", ""))
+    return await run_in_threadpool(_score_batch, items, role)
+
+
+def _parse_score_batch(body: bytes, content_type: str) -> List[ScoreRequest]:
+    try:
+        if "ndjson" in content_type:
+            items = []
+            for lineno, line in enumerate(body.splitlines(), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    items.append(ScoreRequest.model_validate_json(line))
+                except ValidationError as exc:
+                    raise HTTPException(
+                        status_code=422,
+                        detail={"line": lineno, "errors": jsonable_encoder(exc.errors())},
+                    )
+        else:
+            items = _SCORE_LIST.validate_json(body)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail=jsonable_encoder(exc.errors()))
+
+    if len(items) > SCORE_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch of {len(items)} exceeds limit of {SCORE_BATCH_MAX}",
+        )
+    return items
+
+
+def _score_batch(items: List[ScoreRequest], role: str) -> dict:
+    t0 = time.perf_counter()
+    with time_block("score_batch_ms"), span("handler", records=len(items)):
+        pack = current_pack()
+        vr = pack.version
+
+        # Group by (age_band, sex) so reference lookups and the QTc engine
+        # run once per group instead of once per record
+        groups: Dict[tuple, List[int]] = {}
+        for i, req in enumerate(items):
+            groups.setdefault((req.age_band, req.sex), []).append(i)
+
+        results: List[Optional[dict]] = [None] * len(items)
+        for (age_band, sex), idx in groups.items():
+            ranges = {m: _range_for(m, age_band, sex, pack) for m in SCORE_METRICS}
+            summaries = describe_qtc_batch(
+                qt_ms=[items[i].intervals.QT_ms for i in idx],
+                hr_bpm=None,
+                rr_ms=[items[i].intervals.RR_ms for i in idx],
+                age_band=age_band,
+                sex=sex,
+                pack=pack,
+            )
+            for i, qtc_summary in zip(idx, summaries):
+                results[i] = _score_result(items[i], qtc_summary, ranges, vr)
+
+        write_event(
+            user_id=role,
+            action="guardrail_score_batch",
+            payload={
+                "n": len(items),
+                "groups": {f"{a}:{s}": len(idx) for (a, s), idx in groups.items()},
             },
-            "assessments": assessments,
-            "red_flags": flags,
-            "disclaimer": DEMO_DISCLAIMER,
-        }
+        )
+        incr("score_batch_requests")
+        incr("score_batch_records", len(items))
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "results": results,
+        "count": len(items),
+        "ref_version": vr,
+        "elapsed_ms": elapsed * 1000.0,
+        "records_per_s": len(items) / elapsed if elapsed > 0 else 0.0,
+    }
 
 
 # ============================================================
 #   /trend/series
 # ============================================================
+TREND_MIN_POINTS = 16
+
+
+def _trend_result(timestamps: list, qtc_ms: np.ndarray, percentile: np.ndarray,
+                  category: np.ndarray, age_band: str, sex: str, pack,
+                  max_points: Optional[int] = None, ts_us: Optional[np.ndarray] = None) -> dict:
+    """
+    TrendSeriesResponse body for points already in time order. With
+    `max_points` (and the points' `ts_us`), long series are downsampled
+    by trends.downsample.
+    """
+    total = len(timestamps)
+    if max_points is not None and total > max_points:
+        idx = trends.downsample(ts_us, qtc_ms, category, max_points)
+        timestamps = [timestamps[i] for i in idx.tolist()]
+        qtc_ms, percentile, category = qtc_ms[idx], percentile[idx], category[idx]
+
+    points = [
+        {
+            "timestamp": ts,
+            "QTc_ms": qtc,
+            "percentile": PERCENTILE_LABELS[pct],
+            "category": QTC_CATEGORIES[cat],
+        }
+        for ts, qtc, pct, cat in zip(
+            timestamps,
+            qtc_ms.tolist(),
+            percentile.tolist(),
+            category.tolist(),
+        )
+    ]
+
+    p = _percentile_for("QTc_ms", age_band, sex, pack)
+    bands = {"p50": [], "p90": [], "p99": []}
+    if p:
+        for key in ["50", "90", "99"]:
+            if key in p:
+                bands[f"p{key}"] = [{"y": p[key]}]
+
+    return {
+        "series": points,
+        "bands": bands,
+        "total_points": total,
+        "disclaimer": DEMO_DISCLAIMER,
+    }
+
+
+def _series_trend_result(series: "trends.SeriesTrend", since_us: Optional[int],
+                         until_us: Optional[int], age_band: str, sex: str, pack,
+                         max_points: Optional[int] = None) -> dict:
+    sl = trends.window(series, since_us, until_us)
+    ts_us, qtc, pct, cat = series.ts_us[sl], series.qtc_ms[sl], series.percentile[sl], series.category[sl]
+    total = len(ts_us)
+    if max_points is not None and total > max_points:
+        # Pick the points first so only those get converted to datetimes
+        idx = trends.downsample(ts_us, qtc, cat, max_points)
+        ts_us, qtc, pct, cat = ts_us[idx], qtc[idx], pct[idx], cat[idx]
+    result = _trend_result(
+        [reading_store.from_us(us) for us in ts_us.tolist()], qtc, pct, cat, age_band, sex, pack,
+    )
+    result["total_points"] = total
+    return result
+
+
 @app.post("/trend/series", response_model=TrendSeriesResponse)
 def trend(req: TrendSeriesRequest, authorization: Optional[str] = Header(default=None)):
     role = require_role(authorization, ["admin", "clinician", "observer"])
 
-    with time_block("trend_ms"):
-        points = []
+    with time_block("trend_ms"), span("handler"):
+        pack = current_pack()
+        readings = sorted(req.readings, key=lambda x: x.timestamp)
 
-        for r in sorted(req.readings, key=lambda x: x.timestamp):
-            qtc_block = compute_qtc_multi(
-                qt_ms=r.QT_ms,
-                hr_bpm=None,
-                rr_ms=r.RR_ms,
-            )
-            primary_qtc = qtc_block["qtc"]["primary_qtc_ms"]
+        batch = compute_qtc_batch(
+            qt_ms=np.fromiter((r.QT_ms for r in readings), dtype=np.float64, count=len(readings)),
+            rr_ms=np.fromiter((r.RR_ms for r in readings), dtype=np.float64, count=len(readings)),
+            age_band=req.age_band,
+            sex=req.sex,
+            pack=pack,
+        )
+        ts_us = None
+        if req.max_points is not None and len(readings) > req.max_points:
+            ts_us = np.fromiter((reading_store.to_us(r.timestamp) for r in readings), dtype=np.int64, count=len(readings))
+        result = _trend_result(
+            [r.timestamp for r in readings],
+            batch.primary_qtc_ms,
+            batch.percentile,
+            batch.category,
+            req.age_band,
+            req.sex,
+            pack,
+            max_points=req.max_points,
+            ts_us=ts_us,
+        )
+
+        write_event(
+            user_id=role,
+            action="trend_series",
+            payload={"n": len(result["series"])},
+        )
+        incr("trend_requests")
 
-            pct = percentile_label(primary_qtc, req.age_band, req.sex)
-            classification = qtc_classification(primary_qtc, req.sex)
+        return result
 
-            points.append({
-                "timestamp": r.timestamp,
-                "QTc_ms": primary_qtc,
-                "percentile": pct,
-                "category": classification["category"],
-            })
 
-        p = _percentile_for("QTc_ms", req.age_band, req.sex)
-        bands = {"p50": [], "p90": [], "p99": []}
-        if p:
-            for key in ["50", "90", "99"]:
-                if key in p:
-                    bands[f"p{key}"] = [{"y": p[key]}]
+@app.get("/trend/series/{series_id}", response_model=TrendSeriesResponse)
+def trend_stored(
+    series_id: str,
+    age_band: str,
+    sex: Sex,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    max_points: Optional[int] = Query(default=None, ge=TREND_MIN_POINTS),
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Trend for readings already in the reading store (see ?series_id= on
+    the import endpoints), optionally limited to [since, until] and
+    downsampled to about `max_points`.
+    """
+    role = require_role(authorization, ["admin", "clinician", "observer"])
+    if not reading_store.valid_series_id(series_id):
+        raise HTTPException(status_code=400, detail="Invalid series_id")
+
+    with time_block("trend_ms"), span("handler"):
+        pack = current_pack()
+        series = trends.series_trend(series_id, age_band, sex, pack)
+        result = _series_trend_result(
+            series, since and reading_store.to_us(since), until and reading_store.to_us(until),
+            age_band, sex, pack, max_points,
+        )
 
         write_event(
             user_id=role,
             action="trend_series",
-            payload={"n": len(points)},
+            payload={"n": len(result["series"]), "series_id": series_id},
         )
         incr("trend_requests")
 
-        return {
-            "series": points,
-            "bands": bands,
-            "disclaimer": DEMO_DISCLAIMER,
-        }
+        return result
+
+
+@app.post("/trend/series/{series_id}/readings", response_model=TrendSeriesResponse)
+def trend_append(
+    series_id: str,
+    req: TrendSeriesRequest,
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Add readings to a stored series and return its trend from the earliest
+    new reading onwards. Only the new readings are computed when the
+    series' trend is cached, so a bedside refresh costs O(new readings).
+    """
+    role = require_role(authorization, ["admin", "clinician"])
+    if not reading_store.valid_series_id(series_id):
+        raise HTTPException(status_code=400, detail="Invalid series_id")
+
+    with time_block("trend_append_ms"), span("handler", readings=len(req.readings)):
+        pack = current_pack()
+        readings = [r.model_dump() for r in req.readings]
+        series = trends.append(series_id, readings, req.age_band, req.sex, pack)
+        since = min((reading_store.to_us(r["timestamp"]) for r in readings), default=None)
+        result = _series_trend_result(series, since, None, req.age_band, req.sex, pack, req.max_points)
+
+        write_event(
+            user_id=role,
+            action="trend_append",
+            payload={"n": len(readings), "series_id": series_id},
+        )
+        incr("trend_requests")
+
+        return result
 
 
 # ============================================================
@@ -248,8 +566,10 @@ def get_ranges(
     authorization: Optional[str] = Header(default=None),
 ):
     require_role(authorization, ["admin", "clinician", "observer"])
-    v = version or active_version()
-    return {"version": v, "ranges": load_ranges(v), "metadata": load_metadata(v)}
+    pack = current_pack()
+    if version is None or version == pack.version:
+        return {"version": pack.version, "ranges": dict(pack.ranges), "metadata": dict(pack.metadata)}
+    return {"version": version, "ranges": load_ranges(version), "metadata": load_metadata(version)}
 
 
 @app.get("/references/versions")
@@ -258,66 +578,292 @@ def versions(authorization: Optional[str] = Header(default=None)):
     return list_versions()
 
 
+@app.post("/references/reload")
+def references_reload(authorization: Optional[str] = Header(default=None)):
+    role = require_role(authorization, ["admin"])
+    v = reload_references()
+    write_event(user_id=role, action="references_reload", payload={"version": v})
+    return {"version": v}
+
+
 # ============================================================
 #   Imports (CSV / JSON)
 # ============================================================
+IMPORT_MAX_ERRORS = int(os.environ.get("ECG_IMPORT_MAX_ERRORS", "1000"))
+IMPORT_FLUSH_BYTES = 64 * 1024
+
+
+def _wants_ndjson(request: Request, format: Optional[str]) -> bool:
+    return format == "ndjson" or (
+        format is None and "application/x-ndjson" in request.headers.get("accept", "")
+    )
+
+
+def _stream_import(kind: str, items, role: str, ndjson: bool, series_id: Optional[str] = None):
+    """
+    Serialise parsed readings as they arrive, in chunks of about
+    IMPORT_FLUSH_BYTES. Only the first IMPORT_MAX_ERRORS error messages
+    are kept; the rest are just counted.
+
+    JSON mode keeps the {"readings": [...], "errors": [...]} shape. Errors
+    go last so that only they need buffering. NDJSON mode writes one line
+    per reading or error, then a closing {"summary": ...} line.
+
+    The response has started by the time parsing or storage can fail, so a
+    failure part-way ends the body with an error record instead: a
+    closing "error" field in JSON mode, an {"error": ..., "fatal": true}
+    line (and no summary) in NDJSON mode.
+    """
+    rows = n_errors = 0
+    failed = False
+    errors: List[str] = []
+    out: List[str] = []
+    size = 0
+    if not ndjson:
+        out.append('{"readings":[')
+    try:
+        for reading, error in items:
+            if error is None:
+                if ndjson:
+                    line = '{"reading":' + json.dumps(reading) + "}\n"
+                else:
+                    line = ("," if rows else "") + json.dumps(reading)
+                rows += 1
+            else:
+                n_errors += 1
+                if n_errors > IMPORT_MAX_ERRORS:
+                    continue
+                if ndjson:
+                    line = json.dumps({"error": error}) + "\n"
+                else:
+                    errors.append(error)
+                    continue
+            out.append(line)
+            size += len(line)
+            if size >= IMPORT_FLUSH_BYTES:
+                yield "".join(out)
+                out, size = [], 0
+
+        truncated = max(0, n_errors - IMPORT_MAX_ERRORS)
+        if ndjson:
+            out.append(json.dumps({"summary": {
+                "rows": rows, "errors": n_errors, "errors_truncated": truncated,
+            }}) + "\n")
+        else:
+            out.append('],"errors":' + json.dumps(errors) + ',"errors_truncated":' + str(truncated) + "}")
+        yield "".join(out)
+    except Exception as exc:  # same detail the 500 handler would have sent
+        incr(f"imports_{kind}_failed")
+        failed = True
+        message = f"import aborted after {rows} row(s): {exc}"
+        if ndjson:
+            out.append(json.dumps({"error": message, "fatal": True}) + "\n")
+        else:
+            out.append('],"errors":' + json.dumps(errors) + ',"error":' + json.dumps(message) + "}")
+        yield "".join(out)
+    finally:
+        payload = {"rows": rows, "errors": n_errors}
+        if failed:
+            payload["failed"] = True
+        if series_id:
+            payload["series_id"] = series_id
+        write_event(user_id=role, action=f"import_{kind}", payload=payload)
+        incr(f"imports_{kind}")
+
+
+def _submit_import_job(kind: str, file: UploadFile, age_band, sex, series_id, role: str) -> JSONResponse:
+    def finished(status):
+        write_event(
+            user_id=role,
+            action=f"import_{kind}_job",
+            payload={"job_id": status["job_id"], "status": status["status"],
+                     "rows": status["rows"], "errors": status["error_count"]},
+        )
+
+    try:
+        status = import_jobs.submit(kind, file.file, age_band, sex, IMPORT_MAX_ERRORS,
+                                    series_id=series_id, on_done=finished)
+    except import_jobs.JobQueueFull as exc:
+        raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "5"})
+    incr(f"imports_{kind}")
+    return JSONResponse(status_code=202, content=jsonable_encoder(ImportJob(**status)))
+
+
+def _upload_text(file: UploadFile) -> io.TextIOWrapper:
+    # Decoded incrementally as the parser reads from the spooled upload
+    return io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+
+
+def _import(kind: str, parse, request: Request, file: UploadFile, format, job, age_band, sex,
+            series_id, role: str):
+    if series_id is not None and not reading_store.valid_series_id(series_id):
+        raise HTTPException(status_code=400, detail="Invalid series_id")
+    if job:
+        return _submit_import_job(kind, file, age_band, sex, series_id, role)
+    items = parse(_upload_text(file))
+    if series_id is not None:
+        items = reading_store.persist_stream(series_id, items)
+    ndjson = _wants_ndjson(request, format)
+    return StreamingResponse(
+        _stream_import(kind, items, role, ndjson, series_id),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+    )
+
+
 @app.post("/imports/csv")
-async def import_csv(
+def import_csv(
+    request: Request,
     file: UploadFile = File(...),
+    format: Optional[str] = Query(default=None, pattern="^(json|ndjson)$"),
+    job: bool = False,
+    age_band: Optional[str] = None,
+    sex: Optional[Sex] = None,
+    series_id: Optional[str] = None,
     authorization: Optional[str] = Header(default=None)
 ):
+    """
+    Parse an uploaded CSV of readings as a stream. Same response body as
+    before by default; ?format=ndjson (or Accept: application/x-ndjson)
+    streams one line per row instead. With ?job=true the file is parsed
+    and scored (for age_band/sex) by a background import job instead; the
+    202 response is the ImportJob to poll at /imports/jobs/{job_id}.
+    With ?series_id=... readings are also saved to the reading store.
+    """
     role = require_role(authorization, ["admin", "clinician"])
-    content = (await file.read()).decode("utf-8")
-    out = load_csv(content)
-
-    write_event(
-        user_id=role,
-        action="import_csv",
-        payload={"rows": len(out["readings"]), "errors": len(out["errors"])},
-    )
-    incr("imports_csv")
-    return out
+    return _import("csv", iter_csv, request, file, format, job, age_band, sex, series_id, role)
 
 
 @app.post("/imports/json")
-async def import_json(
+def import_json(
+    request: Request,
     file: UploadFile = File(...),
+    format: Optional[str] = Query(default=None, pattern="^(json|ndjson)$"),
+    job: bool = False,
+    age_band: Optional[str] = None,
+    sex: Optional[Sex] = None,
+    series_id: Optional[str] = None,
     authorization: Optional[str] = Header(default=None)
 ):
+    """
+    Parse an uploaded JSON array of readings item by item; see import_csv
+    for the response formats.
+    """
     role = require_role(authorization, ["admin", "clinician"])
-    content = (await file.read()).decode("utf-8")
-    out = load_json(content)
+    return _import("json", iter_json, request, file, format, job, age_band, sex, series_id, role)
 
-    write_event(
-        user_id=role,
-        action="import_json",
-        payload={"rows": len(out["readings"]), "errors": len(out["errors"])},
-    )
-    incr("imports_json")
-    return out
+
+@app.get("/imports/jobs/{job_id}", response_model=ImportJob)
+def import_job_status(job_id: str, authorization: Optional[str] = Header(default=None)):
+    require_role(authorization, ["admin", "clinician"])
+    status = import_jobs.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown import job")
+    return status
+
+
+@app.get("/imports/jobs/{job_id}/result")
+def import_job_result(job_id: str, authorization: Optional[str] = Header(default=None)):
+    """
+    NDJSON result of a completed job: one {"reading": ...} (with QTc_ms,
+    percentile and category) or {"error": ...} line per input record, then
+    a {"summary": ...} line.
+    """
+    require_role(authorization, ["admin", "clinician"])
+    status = import_jobs.get_status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Unknown import job")
+    if status["status"] != "COMPLETED":
+        raise HTTPException(status_code=409, detail=f"Import job is {status['status']}")
+
+    def lines():
+        with open(import_jobs.result_path(job_id), "rb") as f:
+            while chunk := f.read(IMPORT_FLUSH_BYTES):
+                yield chunk
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 
 # ============================================================
 #  Audit
 # ============================================================
+AUDIT_PAGE_DEFAULT = 1000
+AUDIT_PAGE_MAX = 10000
+
 @app.get("/audit/events")
-def audit_dump(authorization: Optional[str] = Header(default=None)):
+def audit_dump(
+    request: Request,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    action: Optional[str] = None,
+    user_id: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(default=None, ge=1, le=AUDIT_PAGE_MAX),
+    format: Optional[str] = Query(default=None, pattern="^(json|ndjson)$"),
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Audit events, oldest first, filtered by time range / action / user.
+
+    JSON mode returns one page (`limit`, default AUDIT_PAGE_DEFAULT) plus a
+    `next_cursor` to pass back for the following page. NDJSON mode
+    (?format=ndjson or Accept: application/x-ndjson) streams every match,
+    or at most `limit`, without buffering.
+    """
     require_role(authorization, ["admin"])
+    filters = {"since": since, "until": until, "action": action, "user_id": user_id, "cursor": cursor}
+    stream = _wants_ndjson(request, format)
     try:
-        with open("audit.jsonl", "r") as f:
-            return JSONResponse(
-                content={"events": [json_line.strip() for json_line in f.readlines()]}
-            )
-    except FileNotFoundError:
-        return {"events": []}
+        if stream:
+            rows = iter_events(**filters)
+            first = next(rows, None)  # surface a bad cursor as 400, not a broken stream
+        else:
+            events, next_cursor = read_events(limit=limit or AUDIT_PAGE_DEFAULT, **filters)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    if not stream:
+        return JSONResponse(content={"events": events, "next_cursor": next_cursor})
+
+    def lines():
+        if first is None:
+            return
+        yield first[0] + "\n"
+        for n, (line, _) in enumerate(rows, start=2):
+            if limit and n > limit:
+                break
+            yield line + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/audit/verify")
+def audit_verify(
+    resume: bool = False,
+    workers: Optional[int] = None,
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Verify the audit hash chain across all segments. `resume` skips what the
+    last successful verification already covered.
+    """
+    role = require_role(authorization, ["admin"])
+    audit_writer.flush()  # include everything queued so far
+    result = verify_audit(resume=resume, workers=workers)
+    write_event(
+        user_id=role,
+        action="audit_verify",
+        payload={"ok": result["ok"], "records": result["records_checked"]},
+    )
+    return result
 
 
 # ============================================================
 #   NEW ENDPOINT â€” /ai/narrative (UPDATED)
 # ============================================================
 @app.post("/ai/narrative", response_model=NarrativeResponse)
-def ai_narrative(
+async def ai_narrative(
     req: NarrativeRequest,
+    request: Request,
     authorization: Optional[str] = Header(default=None),
 ):
     """
@@ -325,9 +871,44 @@ def ai_narrative(
     using an LLM (GPT-5.1), strictly for demonstration.
 
     This endpoint expects that Tab 1/2 have already computed intervals and QTc.
+
+    With Accept: text/event-stream the narrative is streamed as server-sent
+    events while the model writes it: "delta" events carry narrative text,
+    then one "result" (or "fallback", replacing any text shown so far)
+    carries the full response.
     """
     role = require_role(authorization, ["admin", "clinician", "observer"])
+    pack = current_pack()
+    payload_for_llm, reliability_note = _narrative_payload(req, pack)
+
+    await run_in_threadpool(
+        write_event,
+        user_id=role,
+        action="ai_narrative_request",
+        payload={
+            "age_band": req.age_band,
+            "sex": req.sex,
+            "llm_enabled": is_llm_configured(),
+        },
+    )
+    incr("ai_narrative_requests")
+
+    if "text/event-stream" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            _narrative_events(payload_for_llm, pack.version, reliability_note),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
 
+    out = await generate_qtc_narrative(payload_for_llm, ref_version=pack.version)
+    return _narrative_response(out, reliability_note)
+
+
+def _narrative_payload(req: NarrativeRequest, pack) -> Tuple[Dict, Optional[str]]:
+    """
+    The de-identified payload sent to the model, and the QTc reliability
+    note to add to its caution flags (if any).
+    """
     qtc = req.qtc_ms
     if qtc is None and req.intervals.QT_ms and req.intervals.RR_ms:
         qtc = qtc_fridericia(req.intervals.QT_ms, req.intervals.RR_ms)
@@ -343,7 +924,7 @@ def ai_narrative(
     reference_flags = {}
 
     for metric_name, value in metrics.items():
-        low, high = _range_for(metric_name, req.age_band, req.sex)
+        low, high = _range_for(metric_name, req.age_band, req.sex, pack)
         reference_ranges[metric_name] = {"low": low, "high": high}
 
         status, message = assess_interval(metric_name, value, low, high)
@@ -394,20 +975,10 @@ def ai_narrative(
         "llm_model": os.environ.get("OPENAI_MODEL", "gpt-5.1-2025-11-13"),
         "llm_enabled": is_llm_configured(),
     }
+    return payload_for_llm, reliability_note
 
-    write_event(
-        user_id=role,
-        action="ai_narrative_request",
-        payload={
-            "age_band": req.age_band,
-            "sex": req.sex,
-            "llm_enabled": is_llm_configured(),
-        },
-    )
-    incr("ai_narrative_requests")
-
-    out = generate_qtc_narrative(payload_for_llm)
 
+def _narrative_response(out: Dict, reliability_note: Optional[str]) -> Dict:
     narrative = out.get("narrative") or "Narrative unavailable."
     key_points = out.get("key_points") or []
     caution_flags = out.get("caution_flags") or []
@@ -426,10 +997,88 @@ def ai_narrative(
     }
 
 
+async def _narrative_events(payload_for_llm: Dict, ref_version: str, reliability_note: Optional[str]):
+    async for event, data in stream_qtc_narrative(payload_for_llm, ref_version=ref_version):
+        if event == "delta":
+            data = {"text": data}
+        else:
+            data = _narrative_response(data, reliability_note)
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+NARRATIVE_BATCH_MAX = int(os.environ.get("ECG_NARRATIVE_BATCH_MAX", "500"))
+
+
+@app.post("/ai/narrative/batch", response_model=NarrativeBatchResponse)
+async def ai_narrative_batch(
+    reqs: List[NarrativeRequest],
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Narratives for many cases in one call (e.g. cohort reports). Identical
+    cases are generated once; model calls run concurrently, each with its
+    own time budget, and any item that can't get a clean model answer gets
+    the deterministic template. Results come back in input order, each
+    saying where it came from.
+    """
+    role = require_role(authorization, ["admin", "clinician", "observer"])
+    if len(reqs) > NARRATIVE_BATCH_MAX:
+        raise HTTPException(
+            status_code=413,
+            detail=f"batch of {len(reqs)} exceeds limit of {NARRATIVE_BATCH_MAX}",
+        )
+
+    t0 = time.perf_counter()
+    pack = current_pack()
+    prepared = [_narrative_payload(req, pack) for req in reqs]
+    with span("handler", records=len(reqs)):
+        outs = await generate_narrative_batch([p for p, _ in prepared], ref_version=pack.version)
+
+    results, sources = [], {}
+    for (_, reliability_note), out in zip(prepared, outs):
+        item = _narrative_response(out.narrative, reliability_note)
+        item.update(
+            source=out.source,
+            fallback_reason=out.fallback_reason,
+            duplicate_of=out.duplicate_of,
+            elapsed_ms=out.elapsed_ms,
+        )
+        results.append(item)
+        sources[out.source] = sources.get(out.source, 0) + 1
+
+    await run_in_threadpool(
+        write_event,
+        user_id=role,
+        action="ai_narrative_batch_request",
+        payload={"n": len(reqs), "sources": sources, "llm_enabled": is_llm_configured()},
+    )
+    incr("ai_narrative_batch_requests")
+    incr("ai_narrative_batch_items", len(reqs))
+
+    return {
+        "results": results,
+        "count": len(reqs),
+        "unique": sum(out.duplicate_of is None for out in outs),
+        "sources": sources,
+        "ref_version": pack.version,
+        "elapsed_ms": (time.perf_counter() - t0) * 1000.0,
+    }
+
+
 # ============================================================
 #   Metrics
 # ============================================================
 @app.get("/metrics/usage", response_model=MetricsResponse)
 def metrics(authorization: Optional[str] = Header(default=None)):
     require_role(authorization, ["admin", "clinician"])
-    return snapshot()
\ No newline at end of file
+    return snapshot()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_prometheus(authorization: Optional[str] = Header(default=None)):
+    """
+    Prometheus text exposition of the same counters and latency histograms,
+    aggregated across workers when ECG_METRICS_DIR is set.
+    """
+    require_role(authorization, ["admin", "clinician"])
+    return PlainTextResponse(prometheus_text(), media_type="text/plain; version=0.0.4")
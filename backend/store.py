@@ -0,0 +1,249 @@
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from .tracing import traced
+
+# Embedded reading store: one SQLite database in WAL mode, so readers never
+# block the (single) writer and API workers / import jobs can share it.
+STORE_PATH = os.environ.get("ECG_STORE_PATH", "readings.db")
+
+# Pseudonymous ids only: no names, MRNs with spaces, paths etc.
+SERIES_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    series_id TEXT    NOT NULL,
+    ts_us     INTEGER NOT NULL,  -- UTC epoch microseconds
+    QT_ms     REAL    NOT NULL,
+    RR_ms     REAL    NOT NULL,
+    HR_bpm    REAL,
+    PR_ms     REAL,
+    QRS_ms    REAL,
+    PRIMARY KEY (series_id, ts_us)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS series (
+    series_id TEXT    PRIMARY KEY,
+    digest    INTEGER NOT NULL,  -- multiset hash of (ts_us, QT_ms, RR_ms), see readings_digest
+    n         INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Readings per transaction when persisting an import stream
+WRITE_BATCH = 5000
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MIN_US, _MAX_US = -(2 ** 63), 2 ** 63 - 1
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """
+    One connection per thread (and per process: a forked/spawned child
+    opens its own). Keyed by path so tests can point STORE_PATH elsewhere.
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == STORE_PATH:
+        return conn
+    conn = sqlite3.connect(STORE_PATH, timeout=30.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # durable at checkpoints; WAL keeps it consistent
+    conn.executescript(_SCHEMA)
+    _local.conn, _local.path = conn, STORE_PATH
+    return conn
+
+
+def valid_series_id(series_id: str) -> bool:
+    return bool(SERIES_ID_RE.match(series_id))
+
+
+def to_us(ts: Any) -> int:
+    """
+    datetime or ISO-8601 string -> UTC epoch microseconds. Naive times are
+    taken as UTC.
+    """
+    if not isinstance(ts, datetime):
+        ts = datetime.fromisoformat(str(ts).strip().replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    delta = ts - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def from_us(us: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=us)
+
+
+# ============================================================
+# Content digest: the wrapping sum of a 64-bit hash per reading. Order
+# doesn't matter and it's additive, so appending readings updates it in
+# O(new) and a cached result can check "same readings plus these" cheaply.
+# ============================================================
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+MASK64 = (1 << 64) - 1
+
+
+def _mix64(x: np.ndarray) -> np.ndarray:
+    # splitmix64 finaliser (uint64 arithmetic wraps)
+    x = (x ^ (x >> np.uint64(30))) * _M1
+    x = (x ^ (x >> np.uint64(27))) * _M2
+    return x ^ (x >> np.uint64(31))
+
+
+def readings_digest(ts_us: np.ndarray, qt_ms: np.ndarray, rr_ms: np.ndarray) -> int:
+    """
+    Multiset hash of readings (mod 2**64). Only the fields a trend depends
+    on are included.
+    """
+    if len(ts_us) == 0:
+        return 0
+    qt = np.ascontiguousarray(qt_ms, dtype=np.float64).view(np.uint64)
+    rr = np.ascontiguousarray(rr_ms, dtype=np.float64).view(np.uint64)
+    ts = np.asarray(ts_us, dtype=np.int64).view(np.uint64)
+    h = _mix64(ts ^ _mix64(qt ^ _mix64(rr + _GOLDEN)))
+    return int(h.sum(dtype=np.uint64))
+
+
+def _to_sql(digest: int) -> int:
+    # SQLite integers are signed 64-bit
+    return digest - (1 << 64) if digest >= (1 << 63) else digest
+
+
+@traced("store.add_readings")
+def add_readings(series_id: str, readings: Iterable[Dict[str, Any]]) -> int:
+    """
+    Upsert readings (dicts shaped like the import adapters' output) into a
+    series in one transaction. A reading at an existing timestamp replaces
+    it, so re-importing a file is idempotent. Returns the number written.
+    """
+    rows = {}
+    for r in readings:  # last one wins within a batch, as in the table
+        ts = to_us(r["timestamp"])
+        rows[ts] = (series_id, ts, float(r["QT_ms"]), float(r["RR_ms"]),
+                    r.get("HR_bpm"), r.get("PR_ms"), r.get("QRS_ms"))
+    if not rows:
+        return 0
+    new = list(rows.values())
+    conn = _connect()
+    with conn:  # BEGIN ... COMMIT
+        conn.execute("BEGIN IMMEDIATE")
+        # Readings being replaced leave the digest; for plain appends this
+        # range is past the end of the series and comes back empty
+        replaced = [
+            row for row in conn.execute(
+                "SELECT ts_us, QT_ms, RR_ms FROM readings "
+                "WHERE series_id = ? AND ts_us BETWEEN ? AND ?",
+                (series_id, min(rows), max(rows)),
+            )
+            if row[0] in rows
+        ]
+        conn.executemany(
+            "INSERT OR REPLACE INTO readings VALUES (?, ?, ?, ?, ?, ?, ?)", new
+        )
+        digest, n = _series_row(conn, series_id)
+        digest = (digest + _columns_digest(new, 1) - _columns_digest(replaced, 0)) & MASK64
+        conn.execute(
+            "INSERT OR REPLACE INTO series VALUES (?, ?, ?)",
+            (series_id, _to_sql(digest), n + len(new) - len(replaced)),
+        )
+    return len(new)
+
+
+def _series_row(conn: sqlite3.Connection, series_id: str) -> Tuple[int, int]:
+    row = conn.execute("SELECT digest, n FROM series WHERE series_id = ?", (series_id,)).fetchone()
+    return (row[0] & MASK64, row[1]) if row else (0, 0)
+
+
+def _columns_digest(rows: List[tuple], first: int) -> int:
+    # rows hold (ts_us, QT_ms, RR_ms) starting at index `first`
+    if not rows:
+        return 0
+    cols = np.array([r[first:first + 3] for r in rows], dtype=np.float64)
+    ts = np.fromiter((r[first] for r in rows), dtype=np.int64, count=len(rows))
+    return readings_digest(ts, cols[:, 1], cols[:, 2])
+
+
+class SeriesWindow(NamedTuple):
+    ts_us: np.ndarray  # int64, ascending
+    qt_ms: np.ndarray
+    rr_ms: np.ndarray
+
+
+_EMPTY = SeriesWindow(np.empty(0, dtype=np.int64), np.empty(0), np.empty(0))
+
+
+def _window(conn: sqlite3.Connection, series_id: str, lo: int, hi: int) -> SeriesWindow:
+    rows = conn.execute(
+        "SELECT ts_us, QT_ms, RR_ms FROM readings "
+        "WHERE series_id = ? AND ts_us BETWEEN ? AND ? ORDER BY ts_us",
+        (series_id, lo, hi),
+    ).fetchall()
+    if not rows:
+        return _EMPTY
+    cols = np.array(rows, dtype=np.float64)  # epoch us stays exact below 2**53
+    return SeriesWindow(cols[:, 0].astype(np.int64), cols[:, 1].copy(), cols[:, 2].copy())
+
+
+@traced("store.query_series")
+def query_series(series_id: str, since: Optional[datetime] = None,
+                 until: Optional[datetime] = None) -> SeriesWindow:
+    """
+    Readings of one series in [since, until], oldest first, as columns.
+    Served straight off the (series_id, ts_us) primary key.
+    """
+    lo = to_us(since) if since is not None else _MIN_US
+    hi = to_us(until) if until is not None else _MAX_US
+    return _window(_connect(), series_id, lo, hi)
+
+
+def series_digest(series_id: str) -> Tuple[int, int]:
+    """
+    (digest, count) of a series' stored readings.
+    """
+    return _series_row(_connect(), series_id)
+
+
+@traced("store.series_tail")
+def series_tail(series_id: str, after_us: Optional[int] = None) -> Tuple[int, int, SeriesWindow]:
+    """
+    (digest, count, readings after `after_us`) of a series, read from one
+    snapshot so the three agree. With after_us=None the window is the
+    whole series.
+    """
+    conn = _connect()
+    with conn:
+        conn.execute("BEGIN")
+        digest, n = _series_row(conn, series_id)
+        lo = _MIN_US if after_us is None else after_us + 1
+        return digest, n, _window(conn, series_id, lo, _MAX_US)
+
+
+def persist_stream(series_id: str, items: Iterable[Tuple[Optional[Dict[str, Any]], Optional[str]]]):
+    """
+    Pass an adapter's (reading, error) stream through unchanged while
+    writing its readings to `series_id` in WRITE_BATCH transactions. A
+    reading whose timestamp can't be parsed becomes an error instead.
+    """
+    pending: List[Dict[str, Any]] = []
+    for i, (reading, error) in enumerate(items, start=1):
+        if error is None:
+            try:
+                to_us(reading["timestamp"])
+            except (TypeError, ValueError) as e:
+                reading, error = None, f"record {i}: bad timestamp: {e}"
+            else:
+                pending.append(reading)
+                if len(pending) >= WRITE_BATCH:
+                    add_readings(series_id, pending)
+                    pending = []
+        yield reading, error
+    add_readings(series_id, pending)
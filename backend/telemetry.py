@@ -1,20 +1,462 @@
+import os
+import re
+import mmap
 import time
-from typing import Dict
+import struct
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
-_counters: Dict[str, int] = {}
 _timings: Dict[str, float] = {}
+_gauges: Dict[str, Callable[[], float]] = {}
+_lock = threading.Lock()
+
+# ============================================================
+# Latency histograms
+#
+# HDR-style log-linear buckets over integer microseconds: values below
+# 2*SUB_BUCKETS get one bucket each, above that every power of two is split
+# into SUB_BUCKETS linear sub-buckets, so any recorded value is reported
+# within ~1/SUB_BUCKETS (about 6%) of its true value.
+# ============================================================
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+N_BUCKETS = SUB_BUCKETS * 40  # up to 2**40 us (~12 days); larger values clamp
+
+WINDOW_S = float(os.environ.get("ECG_METRICS_WINDOW_S", "60"))
+WINDOW_SLOTS = 12
+
+# Multi-worker mode: when set, every process keeps its counters and
+# histograms in an mmap'ed file in this directory and snapshot() aggregates
+# all of them. Clear the directory before (re)starting the server.
+METRICS_DIR = os.environ.get("ECG_METRICS_DIR")
+
+
+def bucket_index(us: int) -> int:
+    if us < 2 * SUB_BUCKETS:
+        return max(us, 0)
+    shift = us.bit_length() - SUB_BITS - 1
+    idx = (shift + 1) * SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+    return idx if idx < N_BUCKETS else N_BUCKETS - 1
+
+
+def bucket_bounds(idx: int):
+    """
+    [low, high) of a bucket, in microseconds.
+    """
+    if idx < 2 * SUB_BUCKETS:
+        return idx, idx + 1
+    shift = idx // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + idx % SUB_BUCKETS) << shift
+    return low, low + (1 << shift)
+
+
+# ============================================================
+# Storage
+#
+# Every metric is a run of float64 cells in a flat store:
+#   counter   -> [value]
+#   histogram -> [n, total, max, counts * N_BUCKETS]
+#                + WINDOW_SLOTS * [epoch, n, total, max, counts * N_BUCKETS]
+# The store is a Python list in single-process mode, or an mmap'ed file
+# (cast to float64) per worker in multi-worker mode. Both support
+# `cells[i] += x`, so the update path is identical either way.
+# ============================================================
+
+KIND_COUNTER = 1
+KIND_HISTOGRAM = 2
+
+_HIST_HEAD = 3
+_SLOT_HEAD = 4
+_SLOT_SIZE = _SLOT_HEAD + N_BUCKETS
+HIST_SIZE = _HIST_HEAD + N_BUCKETS + WINDOW_SLOTS * _SLOT_SIZE
+
+_ENTRY = struct.Struct("<IIQ")  # key length, kind, number of cells
+
+
+class _ListStore:
+    def __init__(self):
+        self.cells: List[float] = []
+        self.regions: Dict[Tuple[int, str], Tuple[int, int]] = {}
+
+    def region(self, kind: int, name: str, size: int) -> int:
+        base = len(self.cells)
+        self.cells.extend([0.0] * size)
+        self.regions[(kind, name)] = (base, size)
+        return base
+
+    def entries(self) -> Iterator[Tuple[int, str, List[float]]]:
+        for (kind, name), (base, size) in list(self.regions.items()):
+            yield kind, name, self.cells[base:base + size]
+
+
+class _MmapStore:
+    """
+    Append-only region table in a per-process file:
+
+        [u64 used bytes] then entries of
+        [u32 key length][u32 kind][u64 cells][key, padded to 8][cells * f64]
+
+    Only this process writes the file; other workers read it for
+    aggregation. `used` is bumped after an entry is complete, so readers
+    never see a half-written entry.
+    """
+
+    INITIAL_BYTES = 1 << 22
+
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "w+b")
+        self._size = self.INITIAL_BYTES
+        self._f.truncate(self._size)  # sparse; pages are only allocated when touched
+        self._map()
+        self._used = 8
+        struct.pack_into("<Q", self._mm, 0, self._used)
+
+    def _map(self):
+        self._mm = mmap.mmap(self._f.fileno(), self._size)
+        self.cells = memoryview(self._mm).cast("d")
+
+    def region(self, kind: int, name: str, size: int) -> int:
+        key = name.encode("utf-8")
+        key_padded = len(key) + (-len(key) % 8)
+        need = _ENTRY.size + key_padded + 8 * size
+        if self._used + need > self._size:
+            self.cells.release()
+            self._mm.close()
+            while self._used + need > self._size:
+                self._size *= 2
+            self._f.truncate(self._size)
+            self._map()
+        offset = self._used
+        _ENTRY.pack_into(self._mm, offset, len(key), kind, size)
+        self._mm[offset + _ENTRY.size:offset + _ENTRY.size + len(key)] = key
+        data = offset + _ENTRY.size + key_padded
+        self._used = data + 8 * size
+        struct.pack_into("<Q", self._mm, 0, self._used)
+        return data // 8
+
+    def entries(self) -> Iterator[Tuple[int, str, List[float]]]:
+        return _read_store_file(self.path)
+
+
+def _read_store_file(path: str) -> Iterator[Tuple[int, str, List[float]]]:
+    try:
+        with open(path, "rb") as f:
+            head = f.read(8)
+            if len(head) < 8:
+                return
+            used = struct.unpack("<Q", head)[0]
+            buf = head + f.read(used - 8)
+    except OSError:
+        return
+    pos = 8
+    while pos + _ENTRY.size <= len(buf):
+        key_len, kind, size = _ENTRY.unpack_from(buf, pos)
+        key_start = pos + _ENTRY.size
+        data = key_start + key_len + (-key_len % 8)
+        end = data + 8 * size
+        if end > len(buf):
+            return
+        name = buf[key_start:key_start + key_len].decode("utf-8")
+        yield kind, name, list(memoryview(buf)[data:end].cast("d"))
+        pos = end
+
+
+def _open_store():
+    if not METRICS_DIR:
+        return _ListStore()
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    return _MmapStore(os.path.join(METRICS_DIR, f"metrics-{os.getpid()}.db"))
+
+
+_store = None
+_counters: Dict[str, int] = {}  # counter name -> cell index
+_histograms: Dict[str, "Histogram"] = {}
+
+
+def _ensure_store():
+    global _store
+    if _store is None:
+        _store = _open_store()
+    return _store
+
+
+def _reset_after_fork():
+    # A forked worker must not keep writing into its parent's store
+    global _store, _lock
+    _store = None
+    _lock = threading.Lock()
+    _counters.clear()
+    _histograms.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class Histogram:
+    """
+    Cumulative log-bucketed histogram plus a sliding window made of
+    WINDOW_SLOTS rotating sub-histograms covering the last WINDOW_S seconds.
+    Window epochs use wall-clock time so all workers agree on them.
+    """
+
+    __slots__ = ("base",)
+
+    def __init__(self, base: int):
+        self.base = base
+
+    def record(self, ms: float):
+        idx = bucket_index(int(ms * 1000.0))
+        epoch = int(time.time() / (WINDOW_S / WINDOW_SLOTS))
+        b = self.base
+        s = b + _HIST_HEAD + N_BUCKETS + (epoch % WINDOW_SLOTS) * _SLOT_SIZE
+        with _lock:
+            c = _store.cells
+            c[b + _HIST_HEAD + idx] += 1
+            c[b] += 1
+            c[b + 1] += ms
+            if ms > c[b + 2]:
+                c[b + 2] = ms
+            if c[s] != epoch:
+                for i in range(s + 1, s + _SLOT_SIZE):
+                    c[i] = 0.0
+                c[s] = epoch
+            c[s + _SLOT_HEAD + idx] += 1
+            c[s + 1] += 1
+            c[s + 2] += ms
+            if ms > c[s + 3]:
+                c[s + 3] = ms
+
+
+def _histogram(name: str) -> Histogram:
+    h = _histograms.get(name)
+    if h is None:
+        with _lock:
+            store = _ensure_store()
+            h = _histograms.get(name)
+            if h is None:
+                h = _histograms[name] = Histogram(store.region(KIND_HISTOGRAM, name, HIST_SIZE))
+    return h
+
+
+def _counter_cell(name: str) -> int:
+    store = _ensure_store()
+    idx = _counters.get(name)
+    if idx is None:
+        idx = _counters[name] = store.region(KIND_COUNTER, name, 1)
+    return idx
+
+
+# ============================================================
+# Aggregation
+# ============================================================
+
+class _Agg:
+    __slots__ = ("counts", "n", "total", "max")
+
+    def __init__(self):
+        self.counts = [0.0] * N_BUCKETS
+        self.n = 0.0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, cells: List[float], offset: int):
+        counts = self.counts
+        for i, v in enumerate(cells[offset:offset + N_BUCKETS]):
+            if v:
+                counts[i] += v
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.n:
+            return None
+        rank = max(1, int(q * self.n + 0.999999))
+        seen = 0.0
+        for idx, c in enumerate(self.counts):
+            seen += c
+            if c and seen >= rank:
+                low, high = bucket_bounds(idx)
+                return min((low + high) / 2000.0, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, object]:
+        n = int(self.n)
+        return {
+            "count": n,
+            "mean": self.total / self.n if n else None,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "max": self.max if n else None,
+        }
+
+
+def _store_files() -> List[Tuple[str, int]]:
+    # (path, pid) of every worker store in METRICS_DIR, live or not
+    out = []
+    for name in sorted(os.listdir(METRICS_DIR)):
+        m = re.fullmatch(r"metrics-(\d+)\.db", name)
+        if m:
+            out.append((os.path.join(METRICS_DIR, name), int(m.group(1))))
+    return out
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _all_entries() -> Iterator[Tuple[int, str, List[float]]]:
+    if not METRICS_DIR:
+        with _lock:
+            entries = list(_ensure_store().entries())
+        yield from entries
+        return
+    _ensure_store()
+    for path, _ in _store_files():
+        yield from _read_store_file(path)
+
+
+def _aggregate():
+    """
+    Sum counters and merge histograms across every worker's store (a
+    worker that has exited still counts towards the totals). Returns
+    (counters, {name: (overall _Agg, window _Agg)}, live worker count).
+    """
+    counters: Dict[str, float] = {}
+    hists: Dict[str, Tuple[_Agg, _Agg]] = {}
+    epoch = int(time.time() / (WINDOW_S / WINDOW_SLOTS))
+    workers = sum(_pid_alive(pid) for _, pid in _store_files()) if METRICS_DIR else 1
+    for kind, name, cells in _all_entries():
+        if kind == KIND_COUNTER:
+            counters[name] = counters.get(name, 0.0) + cells[0]
+        elif kind == KIND_HISTOGRAM and len(cells) == HIST_SIZE:
+            overall, window = hists.setdefault(name, (_Agg(), _Agg()))
+            overall.add(cells, _HIST_HEAD)
+            overall.n += cells[0]
+            overall.total += cells[1]
+            overall.max = max(overall.max, cells[2])
+            for slot in range(WINDOW_SLOTS):
+                s = _HIST_HEAD + N_BUCKETS + slot * _SLOT_SIZE
+                if 0 <= epoch - cells[s] < WINDOW_SLOTS:
+                    window.add(cells, s + _SLOT_HEAD)
+                    window.n += cells[s + 1]
+                    window.total += cells[s + 2]
+                    window.max = max(window.max, cells[s + 3])
+    return counters, hists, workers
+
+
+# ============================================================
+# Public API
+# ============================================================
 
 def incr(name: str, by: int = 1):
-    _counters[name] = _counters.get(name, 0) + by
+    with _lock:
+        idx = _counters.get(name)
+        if idx is None:
+            idx = _counter_cell(name)
+        _store.cells[idx] += by
+
+def observe(name: str, ms: float):
+    """
+    Record one latency sample (milliseconds).
+    """
+    _timings[name] = ms
+    _histogram(name).record(ms)
+
+class _TimeBlock:
+    __slots__ = ("name", "t0")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.name, (time.perf_counter() - self.t0) * 1000.0)
 
 def time_block(name: str):
-    class T:
-        def __enter__(self):
-            self.t0 = time.perf_counter()
-        def __exit__(self, exc_type, exc, tb):
-            dt = (time.perf_counter() - self.t0) * 1000.0
-            _timings[name] = dt
-    return T()
+    return _TimeBlock(name)
+
+def register_gauge(name: str, fn: Callable[[], float]):
+    """
+    Register a callable sampled at snapshot time (e.g. a queue depth).
+    Gauges describe the answering worker only.
+    """
+    _gauges[name] = fn
+
+def _sample_gauges() -> Dict[str, float]:
+    gauges = {}
+    for name, fn in list(_gauges.items()):
+        try:
+            gauges[name] = float(fn())
+        except Exception:
+            continue
+    return gauges
 
 def snapshot():
-    return {"counters": dict(_counters), "timings_ms": dict(_timings)}
+    counters, hists, workers = _aggregate()
+    latency = {}
+    for name, (overall, window) in hists.items():
+        latency[name] = overall.summary()
+        latency[name]["window"] = window.summary()
+        latency[name]["window_s"] = WINDOW_S
+    return {
+        "counters": {k: int(v) for k, v in counters.items()},
+        "timings_ms": dict(_timings),
+        "gauges": _sample_gauges(),
+        "latency_ms": latency,
+        "workers": workers,
+    }
+
+
+# ============================================================
+# Prometheus text exposition (format 0.0.4)
+# ============================================================
+
+PROM_PREFIX = "cordea_"
+# Exposed bucket boundaries in milliseconds (the fine HDR buckets are folded in)
+PROM_BUCKETS_MS = (0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_PROM_NAME = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _prom_name(name: str) -> str:
+    return PROM_PREFIX + _PROM_NAME.sub("_", name)
+
+
+def prometheus_text() -> str:
+    counters, hists, _ = _aggregate()
+    out: List[str] = []
+    for name in sorted(counters):
+        metric = _prom_name(name) + "_total"
+        out.append(f"# TYPE {metric} counter")
+        out.append(f"{metric} {int(counters[name])}")
+    for name in sorted(hists):
+        overall = hists[name][0]
+        base = name[:-3] if name.endswith("_ms") else name
+        metric = _prom_name(base) + "_seconds"
+        out.append(f"# TYPE {metric} histogram")
+        cumulative = 0.0
+        idx = 0
+        for le_ms in PROM_BUCKETS_MS:
+            limit_us = le_ms * 1000.0
+            while idx < N_BUCKETS and bucket_bounds(idx)[1] <= limit_us:
+                cumulative += overall.counts[idx]
+                idx += 1
+            out.append(f'{metric}_bucket{{le="{le_ms / 1000.0:g}"}} {int(cumulative)}')
+        out.append(f'{metric}_bucket{{le="+Inf"}} {int(overall.n)}')
+        out.append(f"{metric}_sum {overall.total / 1000.0:.6f}")
+        out.append(f"{metric}_count {int(overall.n)}")
+    for name, value in sorted(_sample_gauges().items()):
+        metric = _prom_name(name)
+        out.append(f"# TYPE {metric} gauge")
+        out.append(f'{metric}{{pid="{os.getpid()}"}} {value:g}')
+    return "\n".join(out) + "\n"
@@ -0,0 +1,229 @@
+from collections import deque
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+
+class Match(NamedTuple):
+    term: str   # the term as compiled (lowercased, whitespace collapsed)
+    start: int  # [start, end) in the scanned text
+    end: int
+
+
+def normalize_term(term: str) -> str:
+    return " ".join(term.lower().split())
+
+
+def _is_word(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+
+class TermScanner:
+    """
+    Aho-Corasick automaton over a fixed list of phrases. Matching is
+    case-insensitive and treats any run of whitespace as one space. A term
+    matches anywhere, like a substring ("diagnos" catches "undiagnosed"),
+    unless it is written with a trailing space: then it must be a whole
+    word, so "vt " doesn't match inside "pivot", nor "refer " inside
+    "reference", but does match "VT." at the end of a sentence.
+
+    One pass over the text finds every term, so cost grows with the text
+    length and the number of matches, not with the number of terms.
+    """
+
+    def __init__(self, terms: Iterable[str]):
+        self.terms: List[str] = []
+        self.whole_word: List[bool] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # term indices ending at each state, including via fail links
+        self._out: List[Tuple[int, ...]] = [()]
+        # state -> length of the path from the root
+        self._depth: List[int] = [0]
+
+        seen = set()
+        for raw in terms:
+            term = normalize_term(raw)
+            if not term or term in seen:
+                continue
+            seen.add(term)
+            self._add(term, len(self.terms))
+            self.terms.append(term)
+            self.whole_word.append(raw != raw.rstrip())
+        self._link()
+
+    def _add(self, term: str, idx: int):
+        state = 0
+        for ch in term:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+                self._depth.append(self._depth[state] + 1)
+                self._goto[state][ch] = nxt
+            state = nxt
+        self._out[state] += (idx,)
+
+    def _link(self):
+        # Breadth-first, so a state's fail target is finished before it
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] += self._out[self._fail[nxt]]
+
+    def step(self, state: int, ch: str) -> int:
+        """
+        Advance the automaton by one normalised character.
+        """
+        goto, fail = self._goto, self._fail
+        while state and ch not in goto[state]:
+            state = fail[state]
+        return goto[state].get(ch, 0)
+
+    def depth(self, state: int) -> int:
+        return self._depth[state]
+
+    def stream(self) -> "StreamScanner":
+        return StreamScanner(self)
+
+    def _normalized(self, text: str) -> Tuple[str, List[int]]:
+        # Lowercased text with whitespace runs collapsed to " ", plus each
+        # character's index in the original
+        chars: List[str] = []
+        pos: List[int] = []
+        prev_space = False
+        for i, ch in enumerate(text):
+            if ch.isspace():
+                if prev_space:
+                    continue
+                prev_space = True
+                chars.append(" ")
+                pos.append(i)
+                continue
+            prev_space = False
+            for c in ch.lower():  # a few characters lowercase to two
+                chars.append(c)
+                pos.append(i)
+        return "".join(chars), pos
+
+    def finditer(self, text: str):
+        """
+        Yield every Match in `text`, in order of where it ends.
+        """
+        if not text or not self.terms:
+            return
+        norm, pos = self._normalized(text)
+        n = len(norm)
+        goto, fail, out, terms, whole = self._goto, self._fail, self._out, self.terms, self.whole_word
+        state = 0
+        for i, ch in enumerate(norm):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if not out[state]:
+                continue
+            for t in out[state]:
+                term = terms[t]
+                s = i - len(term) + 1
+                if whole[t] and (
+                        (s > 0 and _is_word(norm[s - 1]) and _is_word(term[0])) or
+                        (i + 1 < n and _is_word(norm[i + 1]) and _is_word(term[-1]))):
+                    continue
+                yield Match(term, pos[s], pos[i] + 1)
+
+    def find_all(self, text: str) -> List[Match]:
+        return list(self.finditer(text))
+
+    def search(self, text: str) -> Optional[Match]:
+        """
+        First match (by end position), or None; stops scanning there.
+        """
+        return next(self.finditer(text), None)
+
+
+class StreamScanner:
+    """
+    The same scan over text that arrives in pieces (e.g. model tokens),
+    with terms split across pieces handled. feed() returns the part of the
+    text seen so far that can no longer turn out to be in a match: whatever
+    could still be the start of a term, or a whole-word term whose
+    right-hand boundary hasn't been seen yet, is held back. Once a term is
+    found, `match` is set (offsets count from the start of the stream) and
+    nothing more is released.
+    """
+
+    def __init__(self, scanner: TermScanner):
+        self._sc = scanner
+        self._max_len = max((len(t) for t in scanner.terms), default=0)
+        self._state = 0
+        self._base = 0        # stream offset of _held[0]
+        self._held = ""       # text not yet released
+        self._offs: List[int] = []  # stream offsets of the held normalised chars
+        self._hist = ""       # last normalised chars, for left-hand boundaries
+        self._space = False   # previous char was whitespace (runs count once)
+        self._waiting: List[Match] = []  # matched, right boundary not yet seen
+        self.match: Optional[Match] = None
+
+    def feed(self, text: str) -> str:
+        if self.match is not None:
+            return ""
+        sc = self._sc
+        pos = self._base + len(self._held)
+        self._held += text
+        for i, ch in enumerate(text, pos):
+            if ch.isspace():
+                if self._space:
+                    continue
+                self._space, chars = True, " "
+            else:
+                self._space, chars = False, ch.lower()
+            for c in chars:
+                for m in self._waiting:
+                    if not (_is_word(c) and _is_word(m.term[-1])):
+                        self.match = m
+                        return ""
+                self._waiting = []
+                self._state = sc.step(self._state, c)
+                self._offs.append(i)
+                self._hist = (self._hist + c)[-(self._max_len + 1):]
+                for t in sc._out[self._state]:
+                    term = sc.terms[t]
+                    n = len(term)
+                    m = Match(term, self._offs[-n], i + 1)
+                    if not sc.whole_word[t]:
+                        self.match = m
+                        return ""
+                    if len(self._hist) > n and _is_word(self._hist[-n - 1]) and _is_word(term[0]):
+                        continue
+                    self._waiting.append(m)
+        return self._release(sc.depth(self._state))
+
+    def close(self) -> str:
+        """
+        End of stream: the rest of the text, unless it ends in a term.
+        """
+        if self.match is None and self._waiting:
+            self.match = self._waiting[0]
+        if self.match is not None:
+            return ""
+        return self._release(0)
+
+    def _release(self, keep: int) -> str:
+        # `keep` normalised chars (the automaton's depth) may still be part
+        # of a match; everything before the first of them is safe
+        if keep:
+            self._offs = self._offs[-keep:]
+            cut = self._offs[0] - self._base
+        else:
+            self._offs = []
+            cut = len(self._held)
+        out, self._held = self._held[:cut], self._held[cut:]
+        self._base += cut
+        return out
@@ -0,0 +1,260 @@
+import os
+import json
+import time
+import random
+import logging
+import inspect
+import functools
+import contextvars
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from queue import SimpleQueue
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================================
+# Config
+# ============================================================
+
+# Fraction of requests traced (head-based: decided once, at the edge)
+SAMPLE_RATE = float(os.environ.get("ECG_TRACE_SAMPLE_RATE", "0"))
+TRACE_PATH = os.environ.get("ECG_TRACE_PATH", "traces.jsonl")
+TRACE_MAX_BYTES = int(os.environ.get("ECG_TRACE_MAX_BYTES", str(10 * 1024 * 1024)))
+TRACE_BACKUPS = int(os.environ.get("ECG_TRACE_BACKUPS", "5"))
+SERVICE_NAME = "cordea-backend"
+
+
+# ============================================================
+# Spans
+# ============================================================
+
+class _Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans: List[Dict[str, Any]] = []
+
+
+class Span:
+    """
+    A timed section of a sampled trace. Use via span(...) / traced(...),
+    which return a shared no-op when the current request isn't sampled.
+    """
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "attrs", "start_ns", "_token")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[str], attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, key: str, value: Any):
+        self.attrs[key] = value
+
+    def __enter__(self):
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.time_ns()
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.trace.spans.append(_otlp_span(self, end_ns))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, key: str, value: Any):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpan()
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("cordea_span", default=None)
+
+
+def span(name: str, **attrs: Any):
+    """
+    Context manager timing one stage of the current request. Costs a
+    single contextvar read when the request isn't being traced.
+    """
+    parent = _current.get()
+    if parent is None:
+        return _NOOP
+    return Span(parent.trace, name, parent.span_id, attrs)
+
+
+def traced(name: str):
+    """
+    Decorator form of span() for whole functions (sync or async).
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                if _current.get() is None:
+                    return await fn(*args, **kwargs)
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_span(s: Span, end_ns: int) -> Dict[str, Any]:
+    """
+    One span in OTLP/JSON field naming, so the file can be replayed into
+    an OpenTelemetry collector.
+    """
+    out = {
+        "traceId": s.trace.trace_id,
+        "spanId": s.span_id,
+        "name": s.name,
+        "startTimeUnixNano": str(s.start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in s.attrs.items()],
+        "resource": {"service.name": SERVICE_NAME},
+    }
+    if s.parent_id:
+        out["parentSpanId"] = s.parent_id
+    if "error" in s.attrs:
+        out["status"] = {"code": "STATUS_CODE_ERROR"}
+    return out
+
+
+# ============================================================
+# Export: spans go through a queue to a rotating JSONL file, so the
+# request only pays for an enqueue.
+# ============================================================
+
+_export_logger = logging.getLogger("cordea.traces")
+_export_logger.propagate = False
+_listener: Optional[QueueListener] = None
+
+
+def start_exporter(path: Optional[str] = None):
+    """
+    Start the background exporter. A no-op unless tracing is enabled
+    (ECG_TRACE_SAMPLE_RATE > 0) or an explicit path is given.
+    """
+    global _listener
+    if _listener is not None or (SAMPLE_RATE <= 0 and path is None):
+        return
+    handler = RotatingFileHandler(path or TRACE_PATH, maxBytes=TRACE_MAX_BYTES, backupCount=TRACE_BACKUPS)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    q: SimpleQueue = SimpleQueue()
+    _export_logger.addHandler(QueueHandler(q))
+    _export_logger.setLevel(logging.INFO)
+    _listener = QueueListener(q, handler)
+    _listener.start()
+
+
+def stop_exporter():
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()  # flushes queued spans
+    for h in list(_export_logger.handlers):
+        _export_logger.removeHandler(h)
+    for h in _listener.handlers:
+        h.close()
+    _listener = None
+
+
+def _export(trace: _Trace):
+    if _listener is None:
+        return
+    _export_logger.info("\n".join(json.dumps(s, separators=(",", ":")) for s in trace.spans))
+
+
+# ============================================================
+# ASGI middleware: root span + sampling decision per HTTP request
+# ============================================================
+
+def _parse_traceparent(value: str):
+    """
+    W3C traceparent -> (trace_id, parent_span_id, sampled) or None.
+    """
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = bool(int(parts[3], 16) & 1)
+    except ValueError:
+        return None
+    return parts[1], parts[2], sampled
+
+
+class TracingMiddleware:
+    """
+    Samples SAMPLE_RATE of requests (or honours an upstream W3C
+    traceparent's sampled flag) and wraps them in a root span. Time in the
+    root span outside the "handler" child is framework work: body parsing,
+    Pydantic validation and response serialisation.
+    """
+
+    def __init__(self, app, sample_rate: Optional[float] = None):
+        self.app = app
+        self.sample_rate = SAMPLE_RATE if sample_rate is None else sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _listener is None:
+            return await self.app(scope, receive, send)
+
+        trace_id, parent_id, sampled = None, None, None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                parsed = _parse_traceparent(value.decode("latin-1"))
+                if parsed:
+                    trace_id, parent_id, sampled = parsed
+                break
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        if not sampled:
+            return await self.app(scope, receive, send)
+
+        trace = _Trace(trace_id or os.urandom(16).hex())
+        root = Span(trace, f"{scope['method']} {scope['path']}", parent_id, {
+            "http.method": scope["method"],
+            "http.route": scope["path"],
+        })
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _export(trace)
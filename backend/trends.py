@@ -0,0 +1,170 @@
+import os
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import numpy as np
+
+from . import store
+from .cache import LRUCache
+from .logic import compute_qtc_batch, QTC_CATEGORIES
+from .references import ReferencePack
+from .telemetry import incr
+from .tracing import traced
+
+# Computed trends kept per (series_id, age_band, sex)
+TREND_CACHE_SIZE = int(os.environ.get("ECG_TREND_CACHE_SIZE", "256"))
+
+
+class SeriesTrend(NamedTuple):
+    """
+    A stored series with QTc computed for every reading, in time order.
+    `digest` is store.readings_digest of the readings it was built from and
+    `ref_version` the reference pack used for percentiles/categories.
+    """
+    ref_version: str
+    digest: int
+    ts_us: np.ndarray
+    qt_ms: np.ndarray
+    rr_ms: np.ndarray
+    qtc_ms: np.ndarray
+    percentile: np.ndarray  # codes into logic.PERCENTILE_LABELS
+    category: np.ndarray    # codes into logic.QTC_CATEGORIES
+
+
+_cache = LRUCache(TREND_CACHE_SIZE, name="trend")
+
+
+def _build(window: store.SeriesWindow, digest: int, age_band: str, sex: str,
+           pack: ReferencePack) -> SeriesTrend:
+    batch = compute_qtc_batch(qt_ms=window.qt_ms, rr_ms=window.rr_ms, age_band=age_band, sex=sex, pack=pack)
+    return SeriesTrend(pack.version, digest, window.ts_us, window.qt_ms, window.rr_ms,
+                       batch.primary_qtc_ms, batch.percentile, batch.category)
+
+
+def _merge(base: SeriesTrend, window: store.SeriesWindow, age_band: str, sex: str,
+           pack: ReferencePack) -> SeriesTrend:
+    """
+    Upsert `window` (sorted, unique timestamps) into `base`, computing QTc
+    only for the new readings. The result's digest is what the store's
+    should be if these were the only changes.
+    """
+    new = _build(window, store.readings_digest(window.ts_us, window.qt_ms, window.rr_ms),
+                 age_band, sex, pack)
+    fields = range(2, len(SeriesTrend._fields))
+
+    if len(base.ts_us) == 0 or window.ts_us[0] > base.ts_us[-1]:
+        # The common case: readings arrive after everything we have
+        digest = (base.digest + new.digest) & store.MASK64
+        return SeriesTrend(pack.version, digest, *(np.concatenate((base[f], new[f])) for f in fields))
+
+    idx = np.searchsorted(base.ts_us, window.ts_us)
+    hit = idx < len(base.ts_us)
+    hit[hit] = base.ts_us[idx[hit]] == window.ts_us[hit]
+    replaced = idx[hit]
+    digest = base.digest + new.digest - store.readings_digest(
+        base.ts_us[replaced], base.qt_ms[replaced], base.rr_ms[replaced]
+    )
+    keep = np.ones(len(base.ts_us), dtype=bool)
+    keep[replaced] = False
+    merged = [np.concatenate((base[f][keep], new[f])) for f in fields]
+    order = np.argsort(merged[0], kind="stable")
+    return SeriesTrend(pack.version, digest & store.MASK64, *(col[order] for col in merged))
+
+
+@traced("trends.series_trend")
+def series_trend(series_id: str, age_band: str, sex: str, pack: ReferencePack) -> SeriesTrend:
+    """
+    The whole series' trend, reusing the cached one when the stored
+    readings are unchanged and computing only readings appended since.
+    Anything else (other edits, a new reference pack) recomputes it.
+    """
+    key = (series_id, age_band, sex)
+    cached: Optional[SeriesTrend] = _cache.get(key)
+    if cached is not None and cached.ref_version == pack.version and len(cached.ts_us):
+        digest, n, tail = store.series_tail(series_id, int(cached.ts_us[-1]))
+        if digest == cached.digest and n == len(cached.ts_us):
+            return cached
+        if len(tail):
+            merged = _merge(cached, tail, age_band, sex, pack)
+            if merged.digest == digest and len(merged.ts_us) == n:
+                incr("trend_cache_incremental")
+                _cache.put(key, merged)
+                return merged
+
+    digest, _, window = store.series_tail(series_id)
+    trend = _build(window, digest, age_band, sex, pack)
+    incr("trend_cache_rebuilds")
+    _cache.put(key, trend)
+    return trend
+
+
+@traced("trends.append")
+def append(series_id: str, readings: List[Dict[str, Any]], age_band: str, sex: str,
+           pack: ReferencePack) -> SeriesTrend:
+    """
+    Store `readings` and fold them into the cached trend for (age_band,
+    sex), computing QTc for the new readings only. Back-filled readings and
+    ones replacing an existing timestamp are merged in place.
+    """
+    store.add_readings(series_id, readings)
+    key = (series_id, age_band, sex)
+    cached: Optional[SeriesTrend] = _cache.get(key)
+    if cached is not None and cached.ref_version == pack.version and readings:
+        by_ts = {store.to_us(r["timestamp"]): r for r in readings}  # last one wins, as in the store
+        ts = np.array(sorted(by_ts), dtype=np.int64)
+        window = store.SeriesWindow(
+            ts,
+            np.array([float(by_ts[t]["QT_ms"]) for t in ts.tolist()]),
+            np.array([float(by_ts[t]["RR_ms"]) for t in ts.tolist()]),
+        )
+        merged = _merge(cached, window, age_band, sex, pack)
+        digest, n = store.series_digest(series_id)
+        if merged.digest == digest and len(merged.ts_us) == n:
+            incr("trend_cache_incremental")
+            _cache.put(key, merged)
+            return merged
+    # Not cached, or someone else wrote to the series meanwhile
+    return series_trend(series_id, age_band, sex, pack)
+
+
+def window(trend: SeriesTrend, since_us: Optional[int], until_us: Optional[int]) -> slice:
+    lo = 0 if since_us is None else int(np.searchsorted(trend.ts_us, since_us, side="left"))
+    hi = len(trend.ts_us) if until_us is None else int(np.searchsorted(trend.ts_us, until_us, side="right"))
+    return slice(lo, hi)
+
+
+_HIGH_RISK = QTC_CATEGORIES.index("high_risk")
+
+
+def downsample(ts: np.ndarray, qtc_ms: np.ndarray, category: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Indices (ascending) of at most about `max_points` points that keep the
+    shape of a series: the min and max QTc of each equal-time bucket.
+
+    Points that matter clinically are always kept, even past the budget:
+    every high_risk point, both sides of every category change (a
+    threshold crossing) and the first and last points.
+    """
+    n = len(ts)
+    if n <= max_points:
+        return np.arange(n)
+
+    keep = category == _HIGH_RISK
+    change = category[1:] != category[:-1]
+    keep[1:] |= change
+    keep[:-1] |= change
+    keep[[0, -1]] = True
+
+    n_buckets = (max_points - int(keep.sum())) // 2
+    if n_buckets > 0:
+        span = float(ts[-1] - ts[0]) or 1.0
+        bucket = np.minimum(((ts - ts[0]) / span * n_buckets).astype(np.int64), n_buckets - 1)
+        # Sort by (bucket, QTc): each bucket's first entry is its min, last its max
+        order = np.lexsort((qtc_ms, bucket))
+        edges = np.flatnonzero(np.diff(bucket[order])) + 1
+        keep[order[np.r_[0, edges]]] = True
+        keep[order[np.r_[edges - 1, n - 1]]] = True
+    return np.flatnonzero(keep)
+
+
+def clear():
+    _cache.clear()
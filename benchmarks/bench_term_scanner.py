@@ -0,0 +1,72 @@
+"""
+Guardrail scan cost against text length and number of banned terms.
+
+    python -m benchmarks.bench_term_scanner
+
+The automaton's time per character should stay flat down both tables;
+the old per-term substring loop grows with the number of terms.
+"""
+import random
+import string
+import time
+
+from backend.llm_client import BANNED_TERMS
+from backend.term_scanner import TermScanner
+
+WORDS = ("qtc interval within the reference range used by this tool heart rate "
+         "measured corrected value percentile band adult female male").split()
+
+
+def _text(n_chars: int, rnd: random.Random) -> str:
+    out, size = [], 0
+    while size < n_chars:
+        w = rnd.choice(WORDS)
+        out.append(w)
+        size += len(w) + 1
+    return " ".join(out)[:n_chars]
+
+
+def _terms(n: int, rnd: random.Random):
+    extra = ["".join(rnd.choices(string.ascii_lowercase, k=rnd.randint(4, 12))) for _ in range(n)]
+    return (list(BANNED_TERMS) + extra)[:n]
+
+
+def _best_of(fn, repeat=5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _naive(terms, text):
+    lowered = text.lower()
+    return [t for t in terms if t in lowered]
+
+
+def main():
+    rnd = random.Random(0)
+
+    print("text length (banned terms as shipped)")
+    print(f"{'chars':>10} {'automaton ms':>14} {'ns/char':>10}")
+    scanner = TermScanner(BANNED_TERMS)
+    for n in (1_000, 10_000, 100_000, 1_000_000):
+        text = _text(n, rnd)
+        t = _best_of(lambda: scanner.find_all(text))
+        print(f"{n:>10} {t * 1e3:>14.2f} {t / n * 1e9:>10.0f}")
+
+    print()
+    print("number of terms (100k chars)")
+    print(f"{'terms':>10} {'automaton ms':>14} {'substring ms':>14}")
+    text = _text(100_000, rnd)
+    for k in (10, 100, 1_000, 10_000):
+        terms = _terms(k, rnd)
+        scanner = TermScanner(terms)
+        t_ac = _best_of(lambda: scanner.find_all(text))
+        t_naive = _best_of(lambda: _naive(terms, text), repeat=3)
+        print(f"{k:>10} {t_ac * 1e3:>14.2f} {t_naive * 1e3:>14.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -162,12 +162,24 @@ async function handleAIGenerate(event) {
 
   try {
     setBusy(aiGenerateBtn, true);
-    const result = await jsonPost("/ai/narrative", payload);
 
     // Display source data
     displaySourceData(payload);
 
-    // Display AI result
+    // Show the narrative as it is written, then the full result
+    let streamed = "";
+    const result = await streamNarrative(payload, text => {
+      if (!narrativeContent) return;
+      if (!streamed) {
+        show(aiResult);
+        hide(keyPointsSection);
+        hide(cautionSection);
+      }
+      streamed += text;
+      narrativeContent.textContent = streamed;
+    });
+
+    // Display AI result (a fallback replaces whatever was streamed)
     displayAIResult(result);
 
     const backendBanner = document.getElementById("backend-warning");
@@ -179,6 +191,61 @@ async function handleAIGenerate(event) {
   }
 }
 
+// ===== STREAMED NARRATIVE =====
+// Reads /ai/narrative as server-sent events: "delta" events carry narrative
+// text as the model writes it, then "result" or "fallback" the full response.
+async function streamNarrative(payload, onDelta) {
+  const url = `${normaliseBase(API_BASE)}/ai/narrative`;
+  const response = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json", "Accept": "text/event-stream" },
+    body: JSON.stringify(payload)
+  });
+
+  if (!response.ok) {
+    const detail = await response.text();
+    throw new ApiError(`HTTP ${response.status}: ${response.statusText}`, {
+      status: response.status,
+      statusText: response.statusText,
+      detail: detail
+    });
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    let end;
+    while ((end = buffer.indexOf("\n\n")) !== -1) {
+      const block = buffer.slice(0, end);
+      buffer = buffer.slice(end + 2);
+
+      let event = "message";
+      let data = "";
+      block.split("\n").forEach(line => {
+        if (line.startsWith("event: ")) event = line.slice(7);
+        else if (line.startsWith("data: ")) data += line.slice(6);
+      });
+      if (!data) continue;
+
+      const parsed = JSON.parse(data);
+      if (event === "delta") {
+        onDelta(parsed.text);
+      } else {
+        if (event === "fallback") console.log("Narrative replaced by the deterministic fallback");
+        reader.cancel();
+        return parsed;
+      }
+    }
+  }
+  throw new Error("The narrative stream ended without a result.");
+}
+
 // ===== DISPLAY SOURCE DATA =====
 function displaySourceData(payload) {
   show(sourceData);
@@ -7,6 +7,10 @@ window._lastTrendPayload = null;
 window._lastTrendResult = null;
 window._latestSeries = [];
 
+// More points than the chart has pixels for are downsampled server-side
+// (high-risk points and category changes are always kept)
+const TREND_MAX_POINTS = 2000;
+
 // ===== DOM ELEMENTS =====
 const trendForm = document.getElementById("trend-form");
 const trendSubmit = document.getElementById("trend-submit");
@@ -205,7 +209,8 @@ async function handleTrendSubmit(event) {
     age_band: ageBand,
     sex: sex,
     readings: series,
-    qtc_method: "fridericia"
+    qtc_method: "fridericia",
+    max_points: TREND_MAX_POINTS
   };
 
   try {
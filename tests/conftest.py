@@ -1,6 +1,13 @@
 import os
 import sys
+import tempfile
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 if ROOT not in sys.path:
     sys.path.insert(0, ROOT)
+
+# Keep test runs from appending to the working-directory audit log
+os.environ.setdefault("ECG_AUDIT_PATH", os.path.join(tempfile.mkdtemp(), "audit.jsonl"))
+os.environ.setdefault("ECG_IMPORT_JOBS_DIR", os.path.join(tempfile.mkdtemp(), "import_jobs"))
+os.environ.setdefault("ECG_STORE_PATH", os.path.join(tempfile.mkdtemp(), "readings.db"))
+os.environ.setdefault("ECG_NARRATIVE_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "narratives.db"))
@@ -1,3 +1,6 @@
+import json
+import os
+
 from fastapi.testclient import TestClient
 from backend.server import app
 
@@ -6,3 +9,208 @@ client = TestClient(app)
 def test_healthz():
     r = client.get("/healthz")
     assert r.status_code == 200 and r.json()["ok"] is True
+
+
+def test_trend_series_sorted_and_classified():
+    r = client.post("/trend/series", json={
+        "age_band": "adult_40_64",
+        "sex": "female",
+        "readings": [
+            {"timestamp": "2025-01-02T00:00:00", "QT_ms": 520, "RR_ms": 1000},
+            {"timestamp": "2025-01-01T00:00:00", "QT_ms": 400, "RR_ms": 1000},
+        ],
+    })
+    assert r.status_code == 200
+    series = r.json()["series"]
+    assert [p["QTc_ms"] for p in series] == [400.0, 520.0]
+    assert [p["category"] for p in series] == ["normal", "high_risk"]
+
+
+def test_score_batch_matches_single_scores_in_order():
+    items = [
+        {"age_band": "adult_65_plus", "sex": "male",
+         "intervals": {"HR_bpm": 68, "PR_ms": 180, "QRS_ms": 104, "QT_ms": 460, "RR_ms": 900}},
+        {"age_band": "adult_18_39", "sex": "female",
+         "intervals": {"HR_bpm": 45, "PR_ms": 100, "QRS_ms": 130, "QT_ms": 520, "RR_ms": 1300}},
+        {"age_band": "adult_65_plus", "sex": "male", "intervals": {"PR_ms": 150}},
+    ]
+    r = client.post("/guardrail/score/batch", json=items)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["count"] == 3
+    singles = [client.post("/guardrail/score", json=i).json() for i in items]
+    assert body["results"] == singles
+
+    ndjson = "\n".join(json.dumps(i) for i in items)
+    r = client.post(
+        "/guardrail/score/batch",
+        content=ndjson,
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.json()["results"] == singles
+
+
+def test_score_batch_reports_bad_ndjson_line():
+    r = client.post(
+        "/guardrail/score/batch",
+        content='{"age_band": "a", "sex": "male", "intervals": {}}\n{"sex": "x"}',
+        headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert r.status_code == 422
+    assert r.json()["detail"]["line"] == 2
+
+
+def test_imports_stream_readings_and_cap_errors(monkeypatch):
+    import backend.server as server
+    monkeypatch.setattr(server, "IMPORT_MAX_ERRORS", 2)
+    monkeypatch.setattr(server, "IMPORT_FLUSH_BYTES", 64)
+    rows = ["timestamp,QT_ms,RR_ms,HR_bpm"]
+    rows += [f"2025-01-01T00:{i:02d}:00,{400 + i},1000," for i in range(50)]
+    rows += ["2025-01-02T00:00:00,bad,1000,"] * 5
+    csv_body = ("\n".join(rows) + "\n").encode()
+    auth = {"Authorization": "clinician-token"}
+
+    r = client.post("/imports/csv", files={"file": ("r.csv", csv_body)}, headers=auth)
+    body = r.json()
+    assert len(body["readings"]) == 50 and body["readings"][3]["QT_ms"] == 403.0
+    assert len(body["errors"]) == 2 and body["errors_truncated"] == 3
+
+    r = client.post("/imports/csv?format=ndjson", files={"file": ("r.csv", csv_body)}, headers=auth)
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert lines[-1] == {"summary": {"rows": 50, "errors": 5, "errors_truncated": 3}}
+    assert sum("error" in l for l in lines) == 2
+
+    items = [{"timestamp": f"t{i}", "QT_ms": 400, "RR_ms": 1000} for i in range(30)] + [{"QT_ms": 1}]
+    r = client.post("/imports/json", files={"file": ("r.json", json.dumps(items).encode())}, headers=auth)
+    body = r.json()
+    assert [x["timestamp"] for x in body["readings"]] == [f"t{i}" for i in range(30)]
+    assert body["errors"] == ["item 31: 'timestamp'"]
+
+
+def test_import_failing_mid_stream_ends_with_an_error_record(monkeypatch):
+    import backend.server as server
+
+    def parse(_text):
+        yield {"timestamp": "t0", "QT_ms": 400, "RR_ms": 1000}, None
+        raise OSError("store unavailable")
+
+    monkeypatch.setattr(server, "iter_csv", parse)
+    auth = {"Authorization": "clinician-token"}
+    r = client.post("/imports/csv", files={"file": ("r.csv", b"x")}, headers=auth)
+    body = r.json()
+    assert r.status_code == 200 and len(body["readings"]) == 1
+    assert body["error"] == "import aborted after 1 row(s): store unavailable"
+
+    r = client.post("/imports/csv?format=ndjson", files={"file": ("r.csv", b"x")}, headers=auth)
+    lines = [json.loads(l) for l in r.text.splitlines()]
+    assert lines[-1] == {"error": "import aborted after 1 row(s): store unavailable", "fatal": True}
+    assert not any("summary" in l for l in lines)
+
+
+def test_json_array_parser_handles_chunk_boundaries():
+    import io
+    from backend.adapters.json_adapter import iter_json_array, load_json
+    doc = json.dumps([{"a": i, "s": "x,]" * i} for i in range(40)] + [12345])
+    for chunk in (1, 7, 64):
+        got = list(iter_json_array(io.StringIO(doc), chunk_chars=chunk))
+        assert got == json.loads(doc)
+    assert load_json('{"a": 1}')["errors"] == ["payload must be a JSON array of readings"]
+    assert load_json('[{"timestamp": "t", "QT_ms": 1, "RR_ms": 2}, {')["errors"][0].startswith("item 2")
+
+
+def test_import_job_runs_in_pool_and_serves_result(monkeypatch):
+    import time
+    from backend import jobs
+    monkeypatch.setattr(jobs, "IMPORT_WORKERS", 1)
+    auth = {"Authorization": "clinician-token"}
+    csv_body = b"timestamp,QT_ms,RR_ms\n2025-01-01T00:00:00,520,1000\n2025-01-01T01:00:00,x,1000\n"
+
+    r = client.post("/imports/csv?job=true&age_band=adult_40_64&sex=female&series_id=job-1",
+                    files={"file": ("r.csv", csv_body)}, headers=auth)
+    assert r.status_code == 202 and r.json()["status"] == "PENDING"
+    job_id = r.json()["job_id"]
+
+    deadline = time.time() + 60
+    while (status := client.get(f"/imports/jobs/{job_id}", headers=auth).json())["status"] in ("PENDING", "RUNNING"):
+        assert time.time() < deadline
+        time.sleep(0.1)
+    assert status["status"] == "COMPLETED" and status["progress"] == 1.0
+    assert status["rows"] == 1 and status["error_count"] == 1
+
+    lines = [json.loads(l) for l in client.get(f"/imports/jobs/{job_id}/result", headers=auth).text.splitlines()]
+    assert lines[0]["reading"]["QTc_ms"] == 520.0 and lines[0]["reading"]["category"] == "high_risk"
+    assert "error" in lines[1] and lines[2]["summary"]["rows"] == 1
+    stored = client.get("/trend/series/job-1", params={"age_band": "adult_40_64", "sex": "female"}, headers=auth)
+    assert [p["QTc_ms"] for p in stored.json()["series"]] == [520.0]
+
+    assert client.get(f"/imports/jobs/{'0' * 32}", headers=auth).status_code == 404
+    monkeypatch.setattr(jobs, "IMPORT_QUEUE_MAX", 0)
+    r = client.post("/imports/csv?job=true", files={"file": ("r.csv", csv_body)}, headers=auth)
+    assert r.status_code == 429
+
+
+def test_import_job_pool_is_replaced_after_a_worker_dies(monkeypatch):
+    import io
+    import signal
+    import time
+    from backend import jobs
+    monkeypatch.setattr(jobs, "IMPORT_WORKERS", 1)
+    jobs.shutdown()
+    csv_body = b"timestamp,QT_ms,RR_ms\n2025-01-01T00:00:00,420,1000\n"
+
+    def wait(job_id):
+        deadline = time.time() + 60
+        while (status := jobs.get_status(job_id))["status"] in ("PENDING", "RUNNING"):
+            assert time.time() < deadline
+            time.sleep(0.05)
+        return status
+
+    try:
+        doomed = jobs.submit("csv", io.BytesIO(csv_body))
+        for proc in list(jobs._pool._processes.values()):  # e.g. the OOM killer
+            os.kill(proc.pid, signal.SIGKILL)
+        failed = wait(doomed["job_id"])
+        assert failed["status"] == "FAILED" and "BrokenProcessPool" in failed["errors"][0]
+
+        again = jobs.submit("csv", io.BytesIO(csv_body))
+        assert wait(again["job_id"])["status"] == "COMPLETED"
+    finally:
+        jobs.shutdown()
+
+
+def test_imported_series_is_stored_and_trended_by_window():
+    auth = {"Authorization": "clinician-token"}
+    csv_body = (
+        "timestamp,QT_ms,RR_ms\n"
+        "2025-03-02T00:00:00Z,520,1000\n"
+        "2025-03-01T00:00:00Z,400,1000\n"
+        "not-a-time,400,1000\n"
+        "2025-03-03T00:00:00Z,410,1000\n"
+    ).encode()
+    for _ in range(2):  # re-importing replaces rather than duplicates
+        r = client.post("/imports/csv?series_id=pt-42", files={"file": ("r.csv", csv_body)}, headers=auth)
+        assert len(r.json()["readings"]) == 3
+        assert r.json()["errors"] == ["record 3: bad timestamp: Invalid isoformat string: 'not-a-time'"]
+
+    params = {"age_band": "adult_40_64", "sex": "female"}
+    series = client.get("/trend/series/pt-42", params=params, headers=auth).json()["series"]
+    assert [p["QTc_ms"] for p in series] == [400.0, 520.0, 410.0]
+    assert series[1]["category"] == "high_risk"
+
+    window = dict(params, since="2025-03-02T00:00:00Z", until="2025-03-02T12:00:00+00:00")
+    series = client.get("/trend/series/pt-42", params=window, headers=auth).json()["series"]
+    assert [p["timestamp"] for p in series] == ["2025-03-02T00:00:00Z"]
+
+    assert client.get("/trend/series/bad id", params=params, headers=auth).status_code == 400
+
+
+def test_trend_series_max_points_downsamples():
+    readings = [{"timestamp": f"2025-01-01T{i // 60:02d}:{i % 60:02d}:00", "QT_ms": 400 + i % 7, "RR_ms": 1000}
+                for i in range(600)]
+    readings[300]["QT_ms"] = 530
+    r = client.post("/trend/series", json={
+        "age_band": "adult_40_64", "sex": "female", "readings": readings, "max_points": 50,
+    })
+    body = r.json()
+    assert body["total_points"] == 600 and len(body["series"]) <= 50
+    assert "high_risk" in [p["category"] for p in body["series"]]
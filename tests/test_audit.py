@@ -0,0 +1,216 @@
+import json
+import threading
+
+import pytest
+
+from backend import audit
+
+
+@pytest.fixture
+def audit_path(tmp_path, monkeypatch):
+    path = tmp_path / "audit.jsonl"
+    monkeypatch.setattr(audit, "AUDIT_PATH", str(path))
+    monkeypatch.setattr(audit, "_tail", None)
+    return path
+
+
+def _records(path):
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def test_chain_links_each_event_to_the_previous(audit_path):
+    for i in range(50):
+        audit.write_event("admin", "test", {"i": i})
+    recs = _records(audit_path)
+    assert recs[0]["prev_hash"] == "GENESIS"
+    for prev, cur in zip(recs, recs[1:]):
+        assert cur["prev_hash"] == prev["payload_hash"]
+
+
+def test_tail_reread_when_another_writer_appended(audit_path):
+    audit.write_event("admin", "test", {"i": 0})
+    # simulate a second worker appending behind our back
+    other = {"payload_hash": "f" * 64, "prev_hash": "x"}
+    with open(audit_path, "a") as f:
+        f.write(json.dumps(other) + "\n")
+    evt = audit.write_event("admin", "test", {"i": 1})
+    assert evt["prev_hash"] == "f" * 64
+
+
+def test_recovery_skips_torn_last_line(audit_path):
+    audit.write_event("admin", "test", {"i": 0})
+    good = _records(audit_path)[-1]["payload_hash"]
+    with open(audit_path, "a") as f:
+        f.write('{"payload_hash": "tor')
+    audit._tail = None
+    evt = audit.write_event("admin", "test", {"i": 1})
+    assert evt["prev_hash"] == good
+    assert audit_path.read_text().splitlines()[-1] == json.dumps(evt)
+
+
+def test_concurrent_writers_keep_a_single_chain(audit_path):
+    def worker(n):
+        for i in range(25):
+            audit.write_event("admin", "test", {"t": n, "i": i})
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    recs = _records(audit_path)
+    assert len(recs) == 200
+    for prev, cur in zip(recs, recs[1:]):
+        assert cur["prev_hash"] == prev["payload_hash"]
+
+
+def test_group_commit_writer_preserves_chain_and_drains_on_stop(audit_path):
+    w = audit.AuditWriter(max_queue=1000, batch_max=16, batch_ms=5)
+    w.start()
+    try:
+        events = []
+        for i in range(100):
+            evt = audit._new_event("admin", "test")
+            assert w.submit(evt, {"i": i})
+            events.append(evt)
+        w.flush()
+        assert all("payload_hash" in e for e in events)
+        audit.write_event("admin", "after", {})  # module writer not running: sync
+    finally:
+        w.stop()
+    recs = _records(audit_path)
+    assert [r["event_id"] for r in recs[:100]] == [e["event_id"] for e in events]
+    for prev, cur in zip(recs, recs[1:]):
+        assert cur["prev_hash"] == prev["payload_hash"]
+
+
+def test_failed_group_commit_is_retried_not_dropped(audit_path, monkeypatch):
+    monkeypatch.setattr(audit, "RETRY_BASE_S", 0.001)
+    real, failures = audit._append, [3]
+
+    def flaky(batch):
+        if failures[0]:
+            failures[0] -= 1
+            raise OSError("disk full")
+        real(batch)
+
+    monkeypatch.setattr(audit, "_append", flaky)
+    w = audit.AuditWriter(max_queue=100, batch_max=8, batch_ms=5)
+    w.start()
+    try:
+        for i in range(20):
+            assert w.submit(audit._new_event("admin", "test"), {"i": i})
+        w.flush()
+    finally:
+        w.stop()
+    recs = _records(audit_path)
+    assert len(recs) == 20
+    for prev, cur in zip(recs, recs[1:]):
+        assert cur["prev_hash"] == prev["payload_hash"]
+
+
+@pytest.mark.parametrize("truncate_fails", [False, True])
+def test_commit_failing_after_the_write_leaves_no_duplicates(audit_path, monkeypatch, truncate_fails):
+    monkeypatch.setattr(audit, "RETRY_BASE_S", 0.001)
+    real_fsync, real_truncate = audit._maybe_fsync, audit.os.ftruncate
+    failures = {"fsync": 1, "truncate": 1 if truncate_fails else 0}
+
+    def fsync(fd):
+        if failures["fsync"]:
+            failures["fsync"] -= 1
+            raise OSError("fsync: I/O error")
+        real_fsync(fd)
+
+    def truncate(fd, size):
+        if failures["truncate"]:
+            failures["truncate"] -= 1
+            raise OSError("truncate: I/O error")
+        real_truncate(fd, size)
+
+    monkeypatch.setattr(audit, "_maybe_fsync", fsync)
+    monkeypatch.setattr(audit.os, "ftruncate", truncate)
+    w = audit.AuditWriter(max_queue=100, batch_max=8, batch_ms=5)
+    w.start()
+    try:
+        for i in range(8):
+            assert w.submit(audit._new_event("admin", "test"), {"i": i})
+        w.flush()
+    finally:
+        w.stop()
+    recs = _records(audit_path)
+    assert len(recs) == 8 and len({r["payload_hash"] for r in recs}) == 8
+    for prev, cur in zip(recs, recs[1:]):
+        assert cur["prev_hash"] == prev["payload_hash"]
+
+
+def test_synchronous_fallback_writes_behind_queued_events(audit_path):
+    w = audit.AuditWriter(max_queue=5, batch_max=8, batch_ms=5)
+    queued = [audit._new_event("admin", "queued") for _ in range(5)]
+    for i, evt in enumerate(queued):  # writer not started: the queue fills up
+        assert w.submit(evt, {"i": i})
+    assert not w.submit(audit._new_event("admin", "late"), {})
+    late = audit._new_event("admin", "late")
+    w.append_sync(late, {})
+    assert [r["event_id"] for r in _records(audit_path)] == [e["event_id"] for e in queued + [late]]
+    assert w.depth() == 0
+
+
+def test_segments_seal_and_verify(audit_path, monkeypatch):
+    monkeypatch.setattr(audit, "SEGMENT_BYTES", 2000)
+    monkeypatch.setattr(audit, "CHECKPOINT_EVERY", 3)
+    for i in range(40):
+        audit.write_event("admin", "test", {"i": i})
+
+    sealed = audit.sealed_segments()
+    assert len(sealed) >= 3
+    first = audit.verify(workers=1)
+    assert first["ok"], first["errors"]
+    assert first["records_checked"] == 40
+
+    # resume only looks at what was appended since
+    audit.write_event("admin", "test", {"i": 40})
+    resumed = audit.verify(resume=True, workers=1)
+    assert resumed["ok"] and resumed["segments_skipped"] >= len(sealed)
+    assert resumed["records_checked"] < 40
+
+    # flip one byte in the middle of a sealed segment
+    path = sealed[1][1]
+    data = bytearray(open(path, "rb").read())
+    data[len(data) // 2] ^= 0x01
+    open(path, "wb").write(bytes(data))
+    broken = audit.verify(workers=1)
+    assert not broken["ok"]
+    assert any(e.startswith(f"segment {sealed[1][0]}:") for e in broken["errors"])
+
+
+def test_read_events_paginates_across_segments_and_filters(audit_path, monkeypatch):
+    monkeypatch.setattr(audit, "SEGMENT_BYTES", 3000)
+    monkeypatch.setattr(audit, "CHECKPOINT_EVERY", 4)
+    monkeypatch.setattr(audit, "INDEX_EVERY", 4)
+    for i in range(60):
+        audit.write_event("clinician" if i % 3 else "admin", f"act{i % 2}", {"i": i})
+    assert len(audit.sealed_segments()) >= 2
+
+    seen, cursor = [], None
+    while True:
+        page, cursor = audit.read_events(limit=7, cursor=cursor)
+        seen.extend(page)
+        if cursor is None:
+            break
+    assert seen == [json.dumps(r) for r in _all_records(audit_path)]
+
+    admin = audit.read_events(limit=100, user_id="admin", action="act0")[0]
+    assert len(admin) == 10
+    assert all('"user_id": "admin"' in e and '"action": "act0"' in e for e in admin)
+
+    recs = _all_records(audit_path)
+    since = audit._parse_ts(recs[45]["ts"])
+    later = audit.read_events(limit=100, since=since)[0]
+    assert later and all(audit._parse_ts(json.loads(e)["ts"]) >= since for e in later)
+
+
+def _all_records(path):
+    out = []
+    for _, seg in audit.sealed_segments():
+        out.extend(json.loads(line) for line in open(seg))
+    return out + _records(path)
@@ -0,0 +1,37 @@
+from fastapi.testclient import TestClient
+
+from backend import cache, server, telemetry
+from backend.server import app
+
+client = TestClient(app)
+
+
+def test_lru_evicts_least_recent_and_expires(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    c = cache.LRUCache(2, name="t", ttl_s=10)
+    c.put("a", 1)
+    c.put("b", 2)
+    assert c.get("a") == 1  # "b" is now least recent
+    c.put("c", 3)
+    assert c.get("b") is None and c.get("a") == 1 and len(c) == 2
+    now[0] += 11
+    assert c.get("a", "gone") == "gone" and len(c) == 1
+    counters = telemetry.snapshot()["counters"]
+    assert counters["t_cache_evictions"] == 1 and counters["t_cache_expirations"] == 1
+
+
+def test_score_cache_hits_and_is_cleared_on_reference_swap():
+    req = {"age_band": "adult_18_39", "sex": "male",
+           "intervals": {"HR_bpm": 61, "PR_ms": 151, "QRS_ms": 91, "QT_ms": 401, "RR_ms": 983}}
+    server._score_cache.clear()
+    hits = telemetry.snapshot()["counters"].get("score_cache_hits", 0)
+    first = client.post("/guardrail/score", json=req).json()
+    # same request with the numbers as floats
+    req["intervals"] = {k: float(v) for k, v in req["intervals"].items()}
+    assert client.post("/guardrail/score", json=req).json() == first
+    assert telemetry.snapshot()["counters"]["score_cache_hits"] == hits + 1
+    assert len(server._score_cache) == 1
+
+    server.reference_manager.reload()
+    assert len(server._score_cache) == 0
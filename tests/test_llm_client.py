@@ -0,0 +1,306 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from fastapi.testclient import TestClient
+
+from backend import llm_client
+from backend.server import app
+
+client = TestClient(app)
+
+# What the stub completions endpoint does next
+STUB = {"delay_s": 0.0, "calls": 0, "status": 200, "probe_status": None,
+        "narrative": "QTc is within the reference range used by this tool."}
+
+
+class _Completions(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        STUB["calls"] += 1
+        STUB["body"] = body
+        time.sleep(STUB["delay_s"])
+        if STUB["status"] != 200:
+            return self._reply(STUB["status"], {"error": {"message": "upstream down", "type": "server_error"}})
+        content = json.dumps({
+            "narrative": STUB["narrative"],
+            "key_points": ["QTc restated"],
+            "caution_flags": [],
+            "disclaimer": "DEMONSTRATION ONLY — NOT FOR CLINICAL USE.",
+        })
+        if body.get("stream"):
+            return self._stream(body, content)
+        reply = json.dumps({
+            "id": "chatcmpl-stub", "object": "chat.completion", "created": 0, "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": 300, "completion_tokens": 60, "total_tokens": 360,
+                      "prompt_tokens_details": {"cached_tokens": 256}},
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client gave up (budget exceeded)
+
+    def do_GET(self):
+        # models.retrieve, used by the circuit breaker's probe
+        STUB["calls"] += 1
+        status = STUB["probe_status"] or STUB["status"]
+        if status != 200:
+            return self._reply(status, {"error": {"message": "probe refused", "type": "invalid_request_error"}})
+        self._reply(200, {"id": self.path.rsplit("/", 1)[-1], "object": "model", "created": 0, "owned_by": "stub"})
+
+    def _reply(self, status, obj):
+        reply = json.dumps(obj).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def _stream(self, body, content):
+        # a few characters per chunk, so terms get split across chunks
+        pieces = [content[i:i + 3] for i in range(0, len(content), 3)]
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            for piece in pieces:
+                chunk = {
+                    "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": 0,
+                    "model": body["model"],
+                    "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client aborted the stream
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_llm():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Completions)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_client.configure(api_key="test-key", base_url=f"http://127.0.0.1:{server.server_port}/v1", budget_s=2.0)
+    STUB.update(delay_s=0.0, calls=0, status=200, probe_status=None, narrative="QTc is within the reference range used by this tool.")
+    yield STUB
+    llm_client.configure(api_key="", base_url="", budget_s=8.0)
+    server.shutdown()
+    server.server_close()
+
+
+def _narrative(qt):
+    return client.post("/ai/narrative", json={
+        "age_band": "adult_40_64", "sex": "female",
+        "intervals": {"HR_bpm": 70, "PR_ms": 160, "QRS_ms": 90, "QT_ms": qt, "RR_ms": 857},
+    })
+
+
+def test_narrative_comes_from_the_model_and_is_then_cached(stub_llm):
+    r = _narrative(401)
+    assert r.status_code == 200 and r.json()["narrative"] == stub_llm["narrative"]
+    assert _narrative(401).json() == r.json()
+    assert stub_llm["calls"] == 1
+
+
+def test_cached_narrative_is_rechecked_against_new_banned_terms(stub_llm, monkeypatch):
+    assert _narrative(409).json()["narrative"] == stub_llm["narrative"]
+    monkeypatch.setattr(llm_client, "_BANNED", llm_client.TermScanner(llm_client.BANNED_TERMS + ["reference range"]))
+    r = _narrative(409)
+    assert stub_llm["calls"] == 2  # the cached copy no longer passes, so the model is asked again
+    assert "deterministic template" in r.json()["key_points"][0]
+
+
+def test_budget_exceeded_returns_the_fallback(stub_llm):
+    llm_client.configure(budget_s=0.3)
+    stub_llm["delay_s"] = 1.5
+    t0 = time.perf_counter()
+    r = _narrative(402)
+    assert time.perf_counter() - t0 < 1.2
+    assert r.status_code == 200 and r.json()["narrative"] != stub_llm["narrative"]
+    assert "deterministic template" in r.json()["key_points"][0]
+
+
+def test_concurrency_limit_queues_within_the_budget(stub_llm):
+    import asyncio
+    llm_client.configure(budget_s=0.6, max_concurrency=1)
+    stub_llm["delay_s"] = 0.4
+
+    async def two():
+        return await asyncio.gather(*(
+            llm_client.generate_qtc_narrative({"qtc_ms": 440.0 + i, "intervals_ms": {}}) for i in range(2)
+        ))
+
+    try:
+        results = asyncio.run(two())
+    finally:
+        llm_client.configure(max_concurrency=8)
+    # the second call waits 0.4s for the slot and then can't finish in time
+    assert sorted(r["narrative"] == stub_llm["narrative"] for r in results) == [False, True]
+
+
+def test_identical_concurrent_requests_share_one_upstream_call(stub_llm):
+    import asyncio
+    from backend import telemetry
+    stub_llm["delay_s"] = 0.2
+    coalesced = telemetry.snapshot()["counters"].get("llm_coalesced", 0)
+    payload = {"qtc_ms": 471.0, "intervals_ms": {"QT_ms": 430.0}}
+
+    async def five():
+        return await asyncio.gather(*(llm_client.generate_qtc_narrative(payload) for _ in range(5)))
+
+    results = asyncio.run(five())
+    assert stub_llm["calls"] == 1
+    assert telemetry.snapshot()["counters"]["llm_coalesced"] == coalesced + 4
+    assert all(r == results[0] for r in results)
+    results[0]["caution_flags"].append("local edit")
+    assert results[1]["caution_flags"] == []
+
+
+def _narrative_events(qt):
+    r = client.post("/ai/narrative", headers={"Accept": "text/event-stream"}, json={
+        "age_band": "adult_40_64", "sex": "female",
+        "intervals": {"HR_bpm": 70, "PR_ms": 160, "QRS_ms": 90, "QT_ms": qt, "RR_ms": 857},
+    })
+    assert r.status_code == 200 and r.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in r.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return events
+
+
+def test_narrative_streams_as_server_sent_events(stub_llm):
+    events = _narrative_events(403)
+    deltas = [data["text"] for event, data in events if event == "delta"]
+    assert len(deltas) > 1 and "".join(deltas) == stub_llm["narrative"]
+    assert events[-1][0] == "result" and events[-1][1]["narrative"] == stub_llm["narrative"]
+    # cached like the non-streamed answer
+    assert _narrative_events(403) == [events[-1]] and stub_llm["calls"] == 1
+
+
+def test_banned_term_split_across_chunks_is_never_shown(stub_llm):
+    stub_llm["narrative"] = "QTc values are listed. This suggests Long QT syndrome in this case."
+    events = _narrative_events(404)
+    shown = "".join(data["text"] for event, data in events if event == "delta")
+    assert events[-1][0] == "fallback"
+    assert "deterministic template" in events[-1][1]["key_points"][0]
+    assert shown.startswith("QTc values") and "Long" not in shown
+
+
+def test_inflected_banned_word_split_across_chunks_is_never_shown(stub_llm):
+    stub_llm["narrative"] = "QTc values are listed. The agent was discontinued earlier."
+    events = _narrative_events(407)
+    shown = "".join(data["text"] for event, data in events if event == "delta")
+    assert events[-1][0] == "fallback"
+    assert shown == "QTc values are listed. The agent was "
+
+
+def _case(qt):
+    return {
+        "age_band": "adult_40_64", "sex": "female",
+        "intervals": {"HR_bpm": 70, "PR_ms": 160, "QRS_ms": 90, "QT_ms": qt, "RR_ms": 857},
+    }
+
+
+def test_batch_dedupes_and_gives_each_item_its_own_budget(stub_llm):
+    llm_client.configure(budget_s=0.5, max_concurrency=1)
+    stub_llm["delay_s"] = 0.3
+    try:
+        r = client.post("/ai/narrative/batch", json=[_case(q) for q in (411, 412, 411, 413, 412)])
+    finally:
+        llm_client.configure(max_concurrency=8)
+    body = r.json()
+    assert r.status_code == 200 and body["count"] == 5 and body["unique"] == 3
+    # one at a time, ~0.9s in all, yet none ran out of its 0.5s budget
+    assert stub_llm["calls"] == 3 and body["sources"] == {"llm": 5}
+    assert body["elapsed_ms"] >= 900
+    assert [item["duplicate_of"] for item in body["results"]] == [None, None, 0, None, 1]
+    assert all(item["narrative"] == stub_llm["narrative"] for item in body["results"])
+
+
+def test_batch_items_fall_back_individually():
+    r = client.post("/ai/narrative/batch", json=[_case(420), _case(421)])
+    body = r.json()
+    assert r.status_code == 200 and body["sources"] == {"fallback": 2}
+    assert {item["fallback_reason"] for item in body["results"]} == {"not_configured"}
+    assert client.post("/ai/narrative/batch", json=[_case(420)] * 501).status_code == 413
+
+
+def test_circuit_opens_on_failures_and_a_probe_closes_it(stub_llm, monkeypatch):
+    import asyncio
+    breaker = llm_client.CircuitBreaker(window=4, min_calls=2, open_s=0.3)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    stub_llm["status"] = 500
+
+    async def scenario():
+        for i in range(2):
+            await llm_client.generate_qtc_narrative({"qtc_ms": 480.0 + i, "intervals_ms": {}})
+        assert breaker.state == "open" and llm_client.llm_health()["circuit"]["state"] == "open"
+        calls = stub_llm["calls"]
+        _, source, reason = await llm_client._generate({"qtc_ms": 482.0, "intervals_ms": {}}, None)
+        assert (source, reason) == ("fallback", "circuit_open") and stub_llm["calls"] == calls
+
+        # the probe fails once, then the upstream recovers
+        await asyncio.sleep(0.4)
+        assert breaker.state == "open" and stub_llm["calls"] == calls + 1
+        stub_llm["status"] = 200
+        await asyncio.sleep(0.4)
+        assert breaker.state == "closed"
+        return await llm_client._generate({"qtc_ms": 483.0, "intervals_ms": {}}, None)
+
+    assert asyncio.run(scenario())[1] == "llm"
+    assert client.get("/healthz").json()["llm"]["circuit"]["state"] == "closed"
+
+
+def test_prompt_is_compact_json_after_a_stable_prefix(stub_llm):
+    from backend import telemetry
+    before = telemetry.snapshot()["counters"]
+    _narrative(405)
+    first = stub_llm["body"]["messages"]
+    _narrative(406)
+    second = stub_llm["body"]["messages"]
+
+    prefix = llm_client._USER_PREFIX
+    assert first[0] == second[0] and first[1]["content"].startswith(prefix) and second[1]["content"].startswith(prefix)
+    text = first[1]["content"][len(prefix):]
+    payload = json.loads(text)
+    assert text == json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    assert payload["intervals_ms"] == {"HR_bpm": 70, "PR_ms": 160, "QRS_ms": 90, "QT_ms": 405, "RR_ms": 857}
+    assert payload["vs_reference"]["QRS_ms"] == "within"
+    assert not {"reference_ranges", "reference_flags", "llm_model", "llm_enabled"} & set(payload)
+
+    after = telemetry.snapshot()["counters"]
+    for name, per_call in (("llm_prompt_tokens", 300), ("llm_completion_tokens", 60), ("llm_cached_prompt_tokens", 256)):
+        assert after[name] - before.get(name, 0) == 2 * per_call
+
+
+@pytest.mark.parametrize("probe_status, recovers", [
+    (404, True), (405, True),  # reachable, just no /models endpoint
+    (401, False), (403, False), (429, False),  # every completion would fail too
+])
+def test_probe_closes_the_circuit_only_if_the_upstream_can_answer(stub_llm, monkeypatch, probe_status, recovers):
+    import asyncio
+    breaker = llm_client.CircuitBreaker(window=4, min_calls=2, open_s=0.2)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    stub_llm["status"] = 500
+    stub_llm["probe_status"] = probe_status
+
+    async def scenario():
+        for i in range(2):
+            await llm_client.generate_qtc_narrative({"qtc_ms": 490.0 + i, "intervals_ms": {}})
+        assert breaker.state == "open"
+        await asyncio.sleep(0.4)
+        return breaker.state
+
+    assert (asyncio.run(scenario()) == "closed") == recovers
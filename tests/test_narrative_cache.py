@@ -0,0 +1,38 @@
+from backend import narrative_cache
+
+
+def test_key_is_canonical_and_covers_model_prompt_and_refs():
+    a = {"qtc_ms": 440.0, "intervals_ms": {"QT_ms": 400, "RR_ms": 826.5}}
+    b = {"intervals_ms": {"RR_ms": 826.5, "QT_ms": 400.0}, "qtc_ms": 440}
+    key = narrative_cache.cache_key(a, "m1", "p1", "v1")
+    assert key == narrative_cache.cache_key(b, "m1", "p1", "v1")
+    assert len({key,
+                narrative_cache.cache_key(a, "m2", "p1", "v1"),
+                narrative_cache.cache_key(a, "m1", "p2", "v1"),
+                narrative_cache.cache_key(a, "m1", "p1", "v2")}) == 4
+
+
+def test_put_get_expiry_and_size_bound(monkeypatch):
+    narrative_cache.put("k1", {"narrative": "first", "key_points": ["é"]})
+    assert narrative_cache.get("k1") == {"narrative": "first", "key_points": ["é"]}
+    assert narrative_cache.get("missing") is None
+
+    monkeypatch.setattr(narrative_cache, "TTL_S", -1)
+    assert narrative_cache.get("k1") is None
+    monkeypatch.undo()
+
+    monkeypatch.setattr(narrative_cache, "MAX_BYTES", 300)
+    for i in range(10):
+        narrative_cache.put(f"n{i}", {"narrative": "x" * 50})
+    kept = [i for i in range(10) if narrative_cache.get(f"n{i}") is not None]
+    assert kept == list(range(10 - len(kept), 10)) and 3 <= len(kept) <= 5
+
+
+def test_running_total_matches_the_table(monkeypatch):
+    monkeypatch.setattr(narrative_cache, "MAX_BYTES", 400)
+    for i in range(12):
+        narrative_cache.put(f"t{i % 5}", {"narrative": "y" * (10 * i)})  # replaces and evicts
+    conn = narrative_cache._connect()
+    total = conn.execute("SELECT total FROM narratives_bytes").fetchone()[0]
+    assert total == conn.execute("SELECT COALESCE(SUM(size), 0) FROM narratives").fetchone()[0]
+    assert 0 < total <= 400
@@ -0,0 +1,56 @@
+import math
+
+import numpy as np
+
+from backend.logic import (
+    compute_qtc_batch,
+    compute_qtc_multi,
+    percentile_label,
+    qtc_classification,
+    PERCENTILE_LABELS,
+    PRIMARY_FORMULAS,
+    QTC_CATEGORIES,
+    RATE_WARNING,
+)
+
+
+def _same(a, b):
+    return (math.isnan(a) and math.isnan(b)) or a == b
+
+
+def test_batch_matches_scalar_functions():
+    rng = np.random.default_rng(7)
+    n = 2000
+    qt = rng.uniform(250, 650, n)
+    rr = rng.uniform(300, 2000, n)
+    hr = rng.uniform(30, 180, n)
+    # sprinkle the edge cases the scalar functions special-case
+    qt[::17] = 0.0
+    qt[::19] = -5.0
+    qt[::23] = np.nan
+    rr[::5] = 0.0
+    rr[::7] = np.nan
+    rr[::11] = -1.0
+    hr[::13] = np.nan
+    hr[::3] = 0.0
+
+    for sex in ("male", "female"):
+        b = compute_qtc_batch(qt, rr_ms=rr, hr_bpm=hr, age_band="adult_40_64", sex=sex)
+        for i in range(n):
+            ref = compute_qtc_multi(qt[i], hr_bpm=hr[i], rr_ms=rr[i])["qtc"]
+            primary = ref["primary_qtc_ms"]
+            assert _same(b.bazett_ms[i], ref["bazett_ms"])
+            assert _same(b.fridericia_ms[i], ref["fridericia_ms"])
+            assert _same(b.framingham_ms[i], ref["framingham_ms"])
+            assert _same(b.primary_qtc_ms[i], primary)
+            assert PRIMARY_FORMULAS[b.primary_formula[i]] == ref["primary_formula"]
+            assert (RATE_WARNING if b.rate_warning[i] else None) == ref["rate_warning"]
+            assert PERCENTILE_LABELS[b.percentile[i]] == percentile_label(primary, "adult_40_64", sex)
+            assert QTC_CATEGORIES[b.category[i]] == qtc_classification(primary, sex)["category"]
+
+
+def test_batch_accepts_lists_with_none():
+    b = compute_qtc_batch([460, None], rr_ms=[900, 900])
+    assert b.primary_qtc_ms[0] == 485.0
+    assert math.isnan(b.primary_qtc_ms[1]) and PRIMARY_FORMULAS[b.primary_formula[1]] is None
+    assert PERCENTILE_LABELS[b.percentile[0]] is None
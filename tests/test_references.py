@@ -0,0 +1,63 @@
+import json
+
+from backend import references
+from backend.logic import _range_for, _percentile_for
+
+
+def _write_pack(base, version, ranges):
+    pack = base / version
+    pack.mkdir(exist_ok=True)
+    (pack / "ranges.json").write_text(json.dumps(ranges))
+
+
+def test_compiled_index_matches_ranges_json():
+    pack = references.current_pack()
+    raw = references.load_ranges(pack.version)
+    for key, rng in raw.items():
+        age_band, sex, metric = key.split(":")
+        rec = pack.index[(age_band, sex, metric)]
+        assert (rec.low, rec.high) == (rng.get("low"), rng.get("high"))
+        assert dict(rec.percentiles) == rng.get("percentiles", {})
+
+
+def test_lookup_misses_return_placeholders():
+    low, high = _range_for("QTc_ms", "no_such_band", "male")
+    assert str(low) == "nan" and str(high) == "nan"
+    assert not _percentile_for("QTc_ms", "no_such_band", "male")
+
+
+def test_poll_swaps_in_new_pack_and_rejects_bad_ones(tmp_path, monkeypatch):
+    _write_pack(tmp_path, "1.0.0", {"a:male:QTc_ms": {"low": 1, "high": 2}})
+    monkeypatch.setattr(references, "BASE_PATH", str(tmp_path))
+    monkeypatch.delenv("ECG_REF_VERSION", raising=False)
+    try:
+        assert references.reload() == "1.0.0"
+        old = references.current_pack()
+        assert _range_for("QTc_ms", "a", "male") == (1, 2)
+        assert not references.manager.poll()
+
+        # invalid pack: keep serving the last good snapshot
+        _write_pack(tmp_path, "2.0.0", {"a:male:QTc_ms": {"low": 9, "high": 1}})
+        assert not references.manager.poll()
+        assert references.current_pack() is old
+
+        _write_pack(tmp_path, "2.0.0", {"a:male:QTc_ms": {"low": 3, "high": 4}})
+        assert references.manager.poll()
+        assert references.active_version() == "2.0.0"
+        assert _range_for("QTc_ms", "a", "male") == (3, 4)
+        # a snapshot taken earlier still answers consistently
+        assert _range_for("QTc_ms", "a", "male", old) == (1, 2)
+
+        # the newest version directory exists before its ranges.json does,
+        # or the file is still empty: keep serving 2.0.0
+        current = references.current_pack()
+        (tmp_path / "3.0.0").mkdir()
+        assert not references.manager.poll()
+        assert references.current_pack() is current
+        (tmp_path / "3.0.0" / "ranges.json").write_text("{}")
+        assert not references.manager.poll()
+        assert references.current_pack() is current
+        assert _range_for("QTc_ms", "a", "male") == (3, 4)
+    finally:
+        monkeypatch.undo()
+        references.reload()
@@ -0,0 +1,61 @@
+import os
+import random
+import subprocess
+import sys
+
+from backend import telemetry
+
+
+def test_bucket_bounds_contain_value_within_resolution():
+    for us in [0, 1, 31, 32, 33, 1000, 123456, 10**9]:
+        low, high = telemetry.bucket_bounds(telemetry.bucket_index(us))
+        assert low <= us < high
+        assert (high - low) <= max(1, us / telemetry.SUB_BUCKETS)
+
+
+def test_histogram_percentiles_track_distribution():
+    samples = [random.uniform(1, 100) for _ in range(10000)] + [500.0] * 50
+    for ms in samples:
+        telemetry.observe("test_dist_ms", ms)
+    s = telemetry.snapshot()["latency_ms"]["test_dist_ms"]
+    samples.sort()
+    assert s["count"] == len(samples) and s["max"] == 500.0
+    for q in ("p50", "p95", "p99"):
+        exact = samples[int(float(q[1:]) / 100 * len(samples)) - 1]
+        assert abs(s[q] - exact) <= exact * 0.07
+    assert s["window"]["count"] == len(samples)
+
+
+def test_mmap_stores_aggregate_across_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(telemetry, "METRICS_DIR", str(tmp_path))
+    # another (live) worker's store, written before ours exists
+    other = telemetry._MmapStore(str(tmp_path / f"metrics-{os.getppid()}.db"))
+    other.cells[other.region(telemetry.KIND_COUNTER, "reqs", 1)] += 5
+    base = other.region(telemetry.KIND_HISTOGRAM, "score_ms", telemetry.HIST_SIZE)
+    other.cells[base] = 1
+    other.cells[base + 1] = 2.0
+    other.cells[base + 2] = 2.0
+    other.cells[base + 3 + telemetry.bucket_index(2000)] = 1
+
+    monkeypatch.setattr(telemetry, "_store", None)
+    monkeypatch.setattr(telemetry, "_counters", {})
+    monkeypatch.setattr(telemetry, "_histograms", {})
+    telemetry.incr("reqs", 2)
+    telemetry.observe("score_ms", 4.0)
+    # a worker that has exited (its counts stay) and a file that isn't a store
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    gone = telemetry._MmapStore(str(tmp_path / f"metrics-{dead.pid}.db"))
+    gone.cells[gone.region(telemetry.KIND_COUNTER, "reqs", 1)] += 1
+    (tmp_path / "notes.txt").write_text("x")
+
+    snap = telemetry.snapshot()
+    assert snap["counters"]["reqs"] == 8
+    assert snap["latency_ms"]["score_ms"]["count"] == 2
+    assert snap["latency_ms"]["score_ms"]["max"] == 4.0
+    assert snap["workers"] == 2
+
+    text = telemetry.prometheus_text()
+    assert "cordea_reqs_total 8" in text
+    assert 'cordea_score_seconds_bucket{le="+Inf"} 2' in text
+    assert 'cordea_score_seconds_bucket{le="0.0025"} 1' in text
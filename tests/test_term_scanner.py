@@ -0,0 +1,76 @@
+from backend.llm_client import BANNED_TERMS, _contains_banned, banned_matches
+from backend.term_scanner import Match, TermScanner
+
+
+def test_reports_every_term_and_where():
+    text = "Ushers! She said his."
+    whole = TermScanner(["he ", "she ", "his ", "hers "])
+    assert [(m.term, text[m.start:m.end]) for m in whole.find_all(text)] == [
+        ("she", "She"), ("his", "his"),
+    ]
+    anywhere = TermScanner(["he", "she", "his", "hers"])
+    assert [(m.term, m.start) for m in anywhere.find_all(text)] == [
+        ("she", 1), ("he", 2), ("hers", 2), ("she", 8), ("he", 9), ("his", 17),
+    ]
+    # overlapping terms are all found once the boundaries allow them
+    assert [m.term for m in TermScanner(["heart failure", "failure"]).find_all("Heart  failure.")] == [
+        "heart failure", "failure",
+    ]
+
+
+def test_short_terms_need_whole_words():
+    assert not _contains_banned("The pivot of the trace is at the restarted baseline reference.")
+    assert not _contains_banned("A treatise on restarting measurement.")
+    assert [m.term for m in banned_matches("Consider VT; start\nmonitoring.")] == ["vt", "start"]
+    assert banned_matches("Go to A&E now.") == [Match("a&e", 6, 9)]
+    assert _contains_banned("This is a non-diagnostic summary.")  # hyphen is a word boundary
+    assert _contains_banned("Stop")
+
+
+def test_other_terms_still_catch_inflected_forms():
+    for text in ("The condition was diagnosed.", "An undiagnosed finding.", "Treatments vary.",
+                 "The drug was discontinued.", "Monitoring commenced today.", "Reassuringly normal.",
+                 "No ventricular tachycardias seen."):
+        assert _contains_banned(text), text
+    assert [m.term for m in banned_matches("It was discontinued.")] == ["discontinue"]
+
+
+def test_agrees_with_a_naive_scan():
+    import re
+    whole = [re.escape(t.strip()) for t in BANNED_TERMS if t.endswith(" ")]
+    anywhere = [re.escape(t) for t in BANNED_TERMS if not t.endswith(" ")]
+    naive = re.compile(r"(?<!\w)(?:" + "|".join(whole) + r")(?!\w)|" + "|".join(anywhere), re.I)
+    texts = [
+        "QTc is within the reference range used by this tool.",
+        "Findings suggest long QT syndrome; urgent review and referral advised.",
+        "High risk: discontinue therapy, admit, then discharge.",
+        "LQTS vs torsade de pointes (torsades) after treatment.",
+        "Undiagnosed, then commenced; the pivot was restarted.",
+    ]
+    for text in texts:
+        assert _contains_banned(text) == bool(naive.search(text)), text
+
+
+def test_stream_holds_back_partial_terms():
+    scanner = TermScanner(BANNED_TERMS)
+    text = "The QT interval is noted;  Ventricular\ntachycardia is not assessed."
+    for size in (1, 2, 5, 13):
+        stream, shown = scanner.stream(), ""
+        for i in range(0, len(text), size):
+            shown += stream.feed(text[i:i + size])
+        assert stream.match == scanner.search(text) == Match("ventricular tachycardia", 27, 50)
+        assert shown == text[:27]
+        assert stream.close() == "" and stream.feed("more") == ""
+
+    clean, stream = "A pivot, a reference, a restart.", scanner.stream()
+    shown = "".join(stream.feed(c) for c in clean) + stream.close()
+    assert shown == clean and stream.match is None
+
+
+def test_stream_catches_inflected_forms_split_across_pieces():
+    scanner = TermScanner(BANNED_TERMS)
+    text = "The medication was discontinued yesterday."
+    stream, shown = scanner.stream(), ""
+    for piece in ("The medication was disc", "ontin", "ued yesterday."):
+        shown += stream.feed(piece)
+    assert stream.match == Match("discontinue", 19, 30) and shown == text[:19]
@@ -0,0 +1,44 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from backend import tracing
+from backend.server import app
+
+client = TestClient(app)
+
+SCORE = {"age_band": "adult_40_64", "sex": "female",
+         "intervals": {"HR_bpm": 70, "PR_ms": 160, "QRS_ms": 90, "QT_ms": 400, "RR_ms": 900}}
+
+
+def test_span_is_noop_outside_a_sampled_request():
+    assert tracing.span("anything") is tracing._NOOP
+
+
+def test_sampled_request_exports_nested_stage_spans(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    tracing.start_exporter(str(path))
+    try:
+        trace_id = "0af7651916cd43dd8448eb211c80319c"
+        r = client.post("/guardrail/score", json=SCORE,
+                        headers={"traceparent": f"00-{trace_id}-b7ad6b7169203331-01"})
+        assert r.status_code == 200
+        # unsampled upstream decision is honoured too
+        client.post("/guardrail/score", json=SCORE,
+                    headers={"traceparent": f"00-{'1' * 32}-{'2' * 16}-00"})
+    finally:
+        tracing.stop_exporter()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert {s["traceId"] for s in spans} == {trace_id}
+    by_name = {s["name"]: s for s in spans}
+    root = by_name["POST /guardrail/score"]
+    handler = by_name["handler"]
+    assert root["parentSpanId"] == "b7ad6b7169203331"
+    assert handler["parentSpanId"] == root["spanId"]
+    for stage in ("logic.describe_qtc_for_patient", "references.lookup",
+                  "score.assemble", "audit.write_event"):
+        assert by_name[stage]["parentSpanId"] == handler["spanId"]
+    assert by_name["logic.red_flags"]["parentSpanId"] == by_name["score.assemble"]["spanId"]
+    assert {"key": "http.status_code", "value": {"intValue": "200"}} in root["attributes"]
+    assert int(root["endTimeUnixNano"]) >= int(handler["endTimeUnixNano"])
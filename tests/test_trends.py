@@ -0,0 +1,75 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from backend import store, telemetry, trends
+from backend.references import current_pack
+
+
+T0 = datetime(2025, 5, 1, tzinfo=timezone.utc)
+
+
+def _readings(start, n, seed):
+    rnd = random.Random(seed)
+    return [
+        {"timestamp": T0 + timedelta(minutes=start + i),
+         "QT_ms": rnd.uniform(330, 540), "RR_ms": rnd.uniform(500, 1300)}
+        for i in range(n)
+    ]
+
+
+def _assert_same(a, b):
+    assert a.digest == b.digest and a.ref_version == b.ref_version
+    for f in ("ts_us", "qt_ms", "rr_ms", "qtc_ms", "percentile", "category"):
+        np.testing.assert_array_equal(getattr(a, f), getattr(b, f))
+
+
+def test_digest_is_order_independent_and_additive():
+    win = store.SeriesWindow(np.array([1, 2, 3]), np.array([400.0, 410.0, 420.0]), np.array([900.0, 1000.0, 800.0]))
+    whole = store.readings_digest(*win)
+    rev = store.readings_digest(win.ts_us[::-1], win.qt_ms[::-1], win.rr_ms[::-1])
+    parts = store.readings_digest(win.ts_us[:1], win.qt_ms[:1], win.rr_ms[:1]) + \
+        store.readings_digest(win.ts_us[1:], win.qt_ms[1:], win.rr_ms[1:])
+    assert whole == rev == parts & store.MASK64
+    assert whole != store.readings_digest(win.ts_us, win.qt_ms, win.rr_ms[::-1])
+
+
+def test_appends_and_backfills_match_a_full_rebuild():
+    pack = current_pack()
+    sid = "trend-incr"
+    store.add_readings(sid, _readings(0, 500, 1))
+    base = trends.series_trend(sid, "adult_40_64", "female", pack)
+    assert trends.series_trend(sid, "adult_40_64", "female", pack) is base  # unchanged: cached
+
+    incremental = telemetry.snapshot()["counters"].get("trend_cache_incremental", 0)
+    appended = trends.append(sid, _readings(500, 20, 2), "adult_40_64", "female", pack)
+    # back-fill plus a replacement of an existing timestamp
+    edited = trends.append(sid, _readings(-10, 10, 3) + _readings(100, 1, 4), "adult_40_64", "female", pack)
+    # written behind the cache's back: picked up as a tail on the next read
+    store.add_readings(sid, _readings(520, 5, 5))
+    tail = trends.series_trend(sid, "adult_40_64", "female", pack)
+
+    assert telemetry.snapshot()["counters"]["trend_cache_incremental"] == incremental + 3
+    assert len(appended.ts_us) == 520 and len(edited.ts_us) == 530 and len(tail.ts_us) == 535
+    trends.clear()
+    _assert_same(tail, trends.series_trend(sid, "adult_40_64", "female", pack))
+    assert tail.digest == store.series_digest(sid)[0]
+
+
+def test_downsample_bounds_size_and_keeps_outliers():
+    rnd = np.random.default_rng(7)
+    n = 20000
+    ts = np.arange(n, dtype=np.int64) * 60_000_000
+    qtc = rnd.normal(420, 8, n)
+    spikes = rnd.choice(n, 5, replace=False)
+    qtc[spikes] = 560.0
+    cat = np.where(qtc >= 500, 5, 2).astype(np.int8)  # high_risk / normal
+
+    idx = trends.downsample(ts, qtc, cat, 500)
+    assert len(idx) <= 500 and np.all(np.diff(idx) > 0)
+    assert set(spikes) <= set(idx.tolist())
+    for s in spikes:  # the readings either side of each crossing too
+        assert {max(s - 1, 0), min(s + 1, n - 1)} <= set(idx.tolist())
+    assert idx[0] == 0 and idx[-1] == n - 1
+    np.testing.assert_array_equal(trends.downsample(ts[:100], qtc[:100], cat[:100], 500), np.arange(100))